@@ -1,22 +1,57 @@
+import argparse
+import os
+import threading
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import requests
-import time
 import json
 import re
-from getpass import getpass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
-BVID = "BV1xx411c7mD" # 替换成需要爬取评论的 B 站视频 BV 号
-comments_path = Path(f"{BVID}_comments.csv")
+try:
+    from .bili_metrics import inc, timed, timer  # 作为 scripts 包导入（如 notebook）
+    from .bili_storage import COMMENT_DTYPES, find_table, read_table
+    from .bili_store import BiliStore
+    from .rate_limit import AdaptiveThrottle, Backoff, retry_after_seconds
+    from .sentiment_cache import DEFAULT_SENTIMENT_CACHE_PATH, FALLBACK_PREFIXES, SentimentCache, is_fallback, normalize_text
+    from .sentiment_local import DEFAULT_THRESHOLD, LinearSentimentModel, LocalClassifier
+except ImportError:
+    from bili_metrics import inc, timed, timer  # 在 scripts/ 下直接运行
+    from bili_storage import COMMENT_DTYPES, find_table, read_table
+    from bili_store import BiliStore
+    from rate_limit import AdaptiveThrottle, Backoff, retry_after_seconds
+    from sentiment_cache import DEFAULT_SENTIMENT_CACHE_PATH, FALLBACK_PREFIXES, SentimentCache, is_fallback, normalize_text
+    from sentiment_local import DEFAULT_THRESHOLD, LinearSentimentModel, LocalClassifier
 
-df = pd.read_csv(comments_path, encoding="utf_8_sig")
+BVID = "BV1xx411c7mD" # 替换成需要爬取评论的 B 站视频 BV 号
+MAX_IN_FLIGHT = 8 # 同时在途的 API 请求数
+MAX_RETRIES = 5 # 遇到 429 / 5xx / 网络错误时的最大重试次数
+BATCH_SIZE = 1 # 每个请求打包的评论条数，1 为逐条请求
 
 # 1) API_KEY
-API_KEY = Path("api_key.txt").read_text(encoding="utf-8").strip()
+API_KEY_PATH = "api_key.txt"
 
 # 2) DeepSeek API 配置
 BASE_URL = "https://api.deepseek.com/v1"
 MODEL = "deepseek-chat"
+PROMPT_VERSION = "1" # 修改 build_prompt / build_batch_prompt 的指令后请递增，旧的缓存结果随之失效
+
+def load_api_key(path: str = API_KEY_PATH) -> str:
+    # 优先读环境变量 DEEPSEEK_API_KEY，否则读 api_key.txt
+    env = os.getenv("DEEPSEEK_API_KEY")
+    if env and env.strip():
+        return env.strip()
+    return Path(path).read_text(encoding="utf-8").strip()
+
+def build_session(api_key: str) -> requests.Session:
+    # 复用连接（keep-alive），避免每条评论都重新握手
+    s = requests.Session()
+    s.headers.update({
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}",
+    })
+    return s
 
 # 指令工程
 def build_prompt(text: str) -> str:
@@ -35,27 +70,73 @@ def build_prompt(text: str) -> str:
 
 只返回JSON格式结果，不要有其他内容。"""
 
-def extract_json_object(s: str) -> dict:
+def build_batch_prompt(items: Sequence[Tuple[int, str]]) -> str:
+    # 多条评论共用一段指令，每条带 id，要求按 id 逐条返回
+    lines = "\n".join(json.dumps({"id": i, "text": t}, ensure_ascii=False) for i, t in items)
+    return f"""你是一个经常刷B站、擅长理解中文网络语境的评论分析员。请对以下多条“视频评论文本”逐条进行情绪分类，以反映评论者对该视频/UP主内容的态度（注意：只基于文本本身判断，包含反讽/阴阳怪气也要尽量识别）。
+
+评论列表（每行一个JSON，id 为评论编号，text 为文本内容）：
+{lines}
+
+请严格按照以下要求分类：
+1. 积极情绪：夸赞、喜欢、支持、推荐、认为内容有价值/有趣/好看等，标注为 1
+2. 消极情绪：吐槽、批评、反感、攻击、认为内容差/无聊/误导等，标注为 -1
+3. 中性情绪：无明显情绪倾向、客观陈述、提问求资源/时间点、纯表情/刷屏/无意义信息等，标注为 0
+
+请以JSON格式返回结果（json），形如 {{"results": [...]}}，"results" 数组中每条评论对应一个对象，包含三个字段：
+- "id": 评论编号（与输入一致）
+- "sentiment": 情绪标签（1, 0, 或 -1）
+- "reason": 判断理由（简要说明分类原因）
+
+每条评论都必须返回且只返回一次，只返回JSON格式结果，不要有其他内容。"""
+
+def extract_json_object(s: str, expected_ids: Optional[Sequence[int]] = None) -> dict:
+    """
+    从模型输出中解析 JSON 对象。
+    传入 expected_ids 时按批量格式校验：顶层为 {"results": [...]}（直接返回数组也接受），
+    返回 {"results": {id: item}}，只保留 id 在 expected_ids 中、字段齐全且标签合法的条目。
+    """
     s = s.strip()
     try:
-        return json.loads(s)
+        data = json.loads(s)
     except Exception:
-        m = re.search(r"\{.*\}", s, flags=re.S)
+        m = re.search(r"\{.*\}|\[.*\]", s, flags=re.S)
         if not m:
             raise
-        return json.loads(m.group(0))
+        data = json.loads(m.group(0))
 
-def analyze_sentiment(text: str):
-    """
-    返回: (sentiment_label, reason)
-    """
-    prompt = build_prompt(text)
+    if expected_ids is None:
+        return data
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {API_KEY}",
-    }
+    items = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError("批量结果缺少 results 数组")
+    wanted = set(expected_ids)
+    valid = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            i = int(item["id"])
+            sentiment = int(item["sentiment"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if i in wanted and i not in valid and sentiment in (-1, 0, 1):
+            valid[i] = {"sentiment": sentiment, "reason": str(item.get("reason", "")).strip()}
+    return {"results": valid}
 
+def post_chat(
+    prompt: str,
+    session: requests.Session,
+    backoff: Backoff,
+    max_retries: int = MAX_RETRIES,
+    max_tokens: int = 300,
+) -> requests.Response:
+    """
+    发送一次 chat/completions 请求，返回最后一次的响应。
+    遇到 429 / 5xx / 网络错误时按 backoff 退避后重试，最多 max_retries 次；
+    网络错误重试用尽时抛出异常。backoff 也可以是 AdaptiveThrottle（同时自适应限速）。
+    """
     request_data = {
         "model": MODEL,
         "messages": [
@@ -63,62 +144,321 @@ def analyze_sentiment(text: str):
             {"role": "user", "content": prompt},
         ],
         "temperature": 0.1,
-        "max_tokens": 300,
+        "max_tokens": max_tokens,
         "response_format": {"type": "json_object"},
     }
 
+    for attempt in range(max_retries + 1):
+        backoff.wait()
+        try:
+            with timer("http_request", endpoint="/chat/completions"):
+                resp = session.post(
+                    f"{BASE_URL}/chat/completions",
+                    json=request_data,
+                    timeout=20 + max_tokens // 50,
+                )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            inc("retries", endpoint="/chat/completions", reason=type(e).__name__)
+            backoff.failure()
+            continue
+        inc("http_responses", endpoint="/chat/completions", status=resp.status_code)
+        inc("http_bytes", len(resp.content), endpoint="/chat/completions")
+
+        if resp.status_code == 429 or resp.status_code >= 500:
+            if attempt == max_retries:
+                break
+            inc("retries", endpoint="/chat/completions", reason=resp.status_code)
+            backoff.failure(retry_after_seconds(resp))
+            continue
+        backoff.success()
+        break
+    return resp
+
+def response_content(resp: requests.Response) -> str:
+    return resp.json()["choices"][0]["message"]["content"]
+
+@timed("analyze_sentiment")
+def analyze_sentiment(
+    text: str,
+    session: Optional[requests.Session] = None,
+    backoff: Optional[Backoff] = None,
+    max_retries: int = MAX_RETRIES,
+):
+    """
+    返回: (sentiment_label, reason)
+    遇到 429 / 5xx / 网络错误时按 backoff 退避后重试，最多 max_retries 次。
+    """
+    prompt = build_prompt(text)
+    session = session or build_session(load_api_key())
+    backoff = backoff or Backoff()
+
     try:
-        resp = requests.post(
-            f"{BASE_URL}/chat/completions",
-            headers=headers,
-            json=request_data,
-            timeout=20,
-        )
+        resp = post_chat(prompt, session, backoff, max_retries)
 
         if resp.status_code != 200:
             return 0, f"API请求失败: {resp.status_code}"
 
-        result = resp.json()
-        content = result["choices"][0]["message"]["content"]
-        data = extract_json_object(content)
+        data = extract_json_object(response_content(resp))
 
         sentiment = int(data.get("sentiment", 0))
         reason = str(data.get("reason", "")).strip()
 
         if sentiment not in (-1, 0, 1):
             sentiment = 0
-            if not reason:
-                reason = "标签不合法，已兜底为中性"
+            reason = "标签不合法，已兜底为中性" + (f"：{reason}" if reason else "")
         return sentiment, reason
 
     except Exception as e:
         return 0, f"异常兜底: {type(e).__name__}"
 
-work_df = df.copy()
+@timed("analyze_sentiment_batch", rows=len)
+def analyze_sentiment_batch(
+    texts: Sequence[str],
+    session: Optional[requests.Session] = None,
+    backoff: Optional[Backoff] = None,
+    max_retries: int = MAX_RETRIES,
+) -> List[Tuple[int, str]]:
+    """
+    一个请求分类多条评论，返回与 texts 顺序一致的 (sentiment_label, reason)。
+    模型漏掉或返回不合法的条目，以及整批请求失败时，逐条用 analyze_sentiment 重试。
+    """
+    session = session or build_session(load_api_key())
+    backoff = backoff or Backoff()
+    items = list(enumerate(texts, start=1))
+
+    parsed: Dict[int, dict] = {}
+    try:
+        resp = post_chat(build_batch_prompt(items), session, backoff, max_retries,
+                         max_tokens=150 * len(items) + 150)
+        if resp.status_code == 200:
+            parsed = extract_json_object(response_content(resp), [i for i, _ in items])["results"]
+    except Exception:
+        parsed = {}
+
+    results = []
+    for i, text in items:
+        if i in parsed:
+            results.append((parsed[i]["sentiment"], parsed[i]["reason"]))
+        else:
+            results.append(analyze_sentiment(text, session, backoff, max_retries))
+    return results
+
+def classify_texts(
+    texts: List[str],
+    api_key: Optional[str] = None,
+    max_in_flight: int = MAX_IN_FLIGHT,
+    max_retries: int = MAX_RETRIES,
+    batch_size: int = BATCH_SIZE,
+    rps: Optional[float] = None,
+    on_batch: Optional[Callable[[List[str], List[Tuple[int, str]]], None]] = None,
+) -> List[Tuple[int, str]]:
+    """
+    并发分类，最多 max_in_flight 个请求同时在途；每个线程复用自己的 Session。
+    batch_size > 1 时每个请求打包 batch_size 条评论。
+    任一请求被限流时所有线程一起退避。返回结果与 texts 顺序一致。
+    传入 rps 时再加一层 AIMD 自适应限速：以 rps 起步，正常时逐步提速，被限流时减半。
+    传入 on_batch 时每完成一批就在主线程调用 on_batch(该批文本, 该批结果)，如及时写入缓存，中途中断也不丢已完成的结果。
+    """
+    api_key = api_key or load_api_key()
+    backoff = AdaptiveThrottle(rps) if rps else Backoff()
+    local = threading.local()
+
+    def classify(batch: List[str]) -> List[Tuple[int, str]]:
+        if not hasattr(local, "session"):
+            local.session = build_session(api_key)
+        if len(batch) == 1:
+            return [analyze_sentiment(batch[0], local.session, backoff, max_retries)]
+        return analyze_sentiment_batch(batch, local.session, backoff, max_retries)
+
+    batch_size = max(1, batch_size)
+    results: List[Tuple[int, str]] = [(0, "")] * len(texts)
+    done = 0
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        futures = {
+            pool.submit(classify, texts[start:start + batch_size]): start
+            for start in range(0, len(texts), batch_size)
+        }
+        for fut in as_completed(futures):
+            start = futures[fut]
+            batch_results = fut.result()
+            results[start:start + len(batch_results)] = batch_results
+            if on_batch is not None:
+                on_batch(texts[start:start + len(batch_results)], batch_results)
+            done += len(batch_results)
+            if done // 50 != (done - len(batch_results)) // 50 or done == len(texts):
+                print(f"已分析 {done}/{len(texts)} 条...")
+    return results
+
+def classify_comments(
+    df: pd.DataFrame,
+    cache: Optional[SentimentCache] = None,
+    local: Optional[LocalClassifier] = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    对 df 的 content 列分类，返回带 sentiment_label / judgment_reason / sentiment_tier 三列的副本（行顺序不变）。
+    归一化后相同的文本只处理一次，依次经过：
+    1. cache：命中的直接复用之前的 LLM 结果
+    2. local：本地规则 / 模型置信度达到阈值的直接定标签
+    3. LLM：其余文本调用 API，每完成一批就把成功的结果写回缓存（请求失败的兜底结果不缓存）
+    sentiment_tier 记录每行的标签来自 cache / local / llm，并打印各层处理的评论条数。
+    """
+    work_df = df.copy()
+    texts = [str(t).strip() for t in work_df["content"].fillna("")]
+
+    # 归一化文本 -> 代表文本（第一次出现的原文）
+    uniques: Dict[str, str] = {}
+    for t in texts:
+        uniques.setdefault(normalize_text(t), t)
 
-all_sentiments = []
-all_reasons = []
+    labels: Dict[str, Tuple[int, str]] = {}
+    tiers: Dict[str, str] = {}
+
+    def assign(results: Dict[str, Tuple[int, str]], tier: str) -> None:
+        for t, r in results.items():
+            labels[normalize_text(t)] = r
+            tiers[normalize_text(t)] = tier
+
+    if cache is not None:
+        assign(cache.get_many(uniques.values(), MODEL, PROMPT_VERSION), "cache")
+    pending = [t for norm, t in uniques.items() if norm not in labels]
+
+    if local is not None and pending:
+        decided, pending = local.split(pending)
+        assign(decided, "local")
+
+    print(f"评论 {len(texts)} 条，去重后 {len(uniques)} 条，需请求 LLM {len(pending)} 条")
+
+    if pending:
+        def save_batch(batch: List[str], batch_results: List[Tuple[int, str]]) -> None:
+            cache.put_many(
+                {t: r for t, r in zip(batch, batch_results) if not is_fallback(r[1])},
+                MODEL,
+                PROMPT_VERSION,
+            )
+
+        results = classify_texts(pending, on_batch=save_batch if cache is not None else None, **kwargs)
+        assign(dict(zip(pending, results)), "llm")
+
+    norms = [normalize_text(t) for t in texts]
+    work_df["sentiment_label"] = [labels[n][0] for n in norms]
+    work_df["judgment_reason"] = [labels[n][1] for n in norms]
+    work_df["sentiment_tier"] = [tiers[n] for n in norms]
+
+    counts = work_df["sentiment_tier"].value_counts()
+    for tier, n in counts.items():
+        inc("sentiment_rows", int(n), tier=tier)
+    print("各层处理评论数：" + "，".join(
+        f"{name} {int(counts.get(tier, 0))} 条"
+        for tier, name in (("cache", "缓存"), ("local", "本地"), ("llm", "LLM"))
+    ))
+    return work_df
+
+def new_comments(df: pd.DataFrame, existing: pd.DataFrame) -> pd.DataFrame:
+    """返回 df 中 rpid 不在已有标注结果 existing 里的评论（按 rpid 去重）。
+
+    existing 里的兜底结果不算已标注，对应评论会重新分类。
+    """
+    known = set(existing.loc[~existing["judgment_reason"].map(is_fallback), "rpid"].dropna())
+    todo = df[~df["rpid"].isin(known)]
+    return todo.drop_duplicates(subset="rpid") if todo["rpid"].notna().all() else todo
+
+def main():
+    parser = argparse.ArgumentParser(description="调用 DeepSeek 对评论进行情绪分类")
+    parser.add_argument("--bvid", default=BVID, help="视频 BV 号，读取 {bvid}_comments.csv / .parquet")
+    parser.add_argument("--workers", type=int, default=MAX_IN_FLIGHT, help="同时在途的 API 请求数")
+    parser.add_argument("--max_retries", type=int, default=MAX_RETRIES, help="429 / 5xx 时的最大重试次数")
+    parser.add_argument("--batch_size", type=int, default=BATCH_SIZE, help="每个请求打包的评论条数，如 20")
+    parser.add_argument("--rps", type=float, default=None, help="自适应限速的初始每秒请求数（默认只按在途请求数并发）")
+    parser.add_argument("--cache", default=DEFAULT_SENTIMENT_CACHE_PATH, help="分类结果缓存文件")
+    parser.add_argument("--no_cache", action="store_true", help="不读写分类结果缓存")
+    parser.add_argument("--local", action="store_true", help="先用本地规则 / 模型分类，置信度足够的不再请求 LLM")
+    parser.add_argument("--local_threshold", type=float, default=DEFAULT_THRESHOLD, help="本地定标签的置信度阈值")
+    parser.add_argument("--local_model", default=None, help="sentiment_local.py 训练出的线性模型文件（可选）")
+    parser.add_argument("--incremental", action="store_true", help="只分类输出文件中还没有的 rpid，结果追加到输出文件")
+    parser.add_argument("--store", default=None, help="从本地分析库（bili_store.py）读取评论，结果写回库中而不是 CSV")
+    parser.add_argument("--keyword", nargs="*", default=None, help="配合 --store：分类这些关键词下视频的评论（代替 --bvid）")
+    parser.add_argument("--days", type=float, default=None, help="配合 --store：只分类最近 N 天的评论")
+    parser.add_argument("--min_view", type=int, default=None, help="配合 --store：只分类播放量不低于该值的视频的评论")
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else SentimentCache(args.cache)
+    local = None
+    if args.local:
+        model = LinearSentimentModel.load(args.local_model) if args.local_model else None
+        local = LocalClassifier(args.local_threshold, model)
+    options = dict(
+        max_in_flight=args.workers,
+        max_retries=args.max_retries,
+        batch_size=args.batch_size,
+        rps=args.rps,
+    )
+
+    if args.store:
+        # 过滤条件下推到 SQL；--incremental 时只取本模型还没有结果的评论
+        store = BiliStore(args.store)
+        filters = dict(
+            bvid=None if args.keyword else args.bvid, keyword=args.keyword, days=args.days, min_view=args.min_view,
+        )
+        df = store.query_comments(
+            sentiment_model=MODEL if args.incremental else None, unlabeled=args.incremental, **filters
+        )
+        print(f"[INFO] 从 {args.store} 读取评论 {len(df)} 条")
+        if len(df):
+            work_df = classify_comments(df, cache=cache, local=local, **options)
+            # 兜底结果不入库，下次 --incremental 时重新分类
+            failed = work_df["judgment_reason"].map(is_fallback)
+            store.upsert_sentiments(work_df[~failed], MODEL, PROMPT_VERSION)
+            if failed.any():
+                print(f"[WARN] {int(failed.sum())} 条评论分类失败，未写入库，可用 --incremental 重试")
+        counts = store.sentiment_counts(MODEL, **filters)
+        store.close()
+        print(f"\n已写入：{args.store}（模型 {MODEL}）")
+        print(f"积极情绪 (1):  {counts.get(1, 0)} 条")
+        print(f"消极情绪 (-1): {counts.get(-1, 0)} 条")
+        print(f"中性情绪 (0):  {counts.get(0, 0)} 条")
+        print(f"总计: {sum(counts.values())} 条")
+        return
 
-for i in range(len(work_df)):
-    text = str(work_df.iloc[i].get("content", "")).strip()
-    print(f"正在分析第 {i+1}/{len(work_df)} 条...")
+    comments_path = Path(find_table(f"{args.bvid}_comments"))  # 优先读 .parquet，否则读 .csv
+    df = read_table(comments_path, dtypes=COMMENT_DTYPES)
 
-    s, r = analyze_sentiment(text)
-    all_sentiments.append(s)
-    all_reasons.append(r)
+    out_path = Path(f"{args.bvid}_comments_with_sentiment.csv")
+    existing = None
+    if args.incremental and out_path.exists():
+        existing = read_table(out_path, dtypes=COMMENT_DTYPES)
+        df = new_comments(df, existing)
+        stale = existing["judgment_reason"].map(is_fallback)
+        existing = existing[~stale]  # 旧的兜底结果会被本次重试的结果替换
+        print(f"[INFO] 已有标注 {len(existing)} 条，本次新增评论 {len(df)} 条")
 
-    time.sleep(1) # 暂停1秒，避免请求频率过高
+    work_df = classify_comments(df, cache=cache, local=local, **options)
+    if args.incremental:
+        # 兜底结果不写入，下次 --incremental 时重新分类
+        failed = work_df["judgment_reason"].map(is_fallback)
+        work_df = work_df[~failed]
+        if failed.any():
+            print(f"[WARN] {int(failed.sum())} 条评论分类失败，未写入，可用 --incremental 重试")
 
-work_df["sentiment_label"] = all_sentiments
-work_df["judgment_reason"] = all_reasons
+    # 保存输出文件
+    if existing is None:
+        work_df.to_csv(out_path, index=False, encoding="utf_8_sig")
+    elif list(existing.columns) == list(work_df.columns) and not stale.any():
+        # 增量：列一致时直接追加新行，不重写已有结果
+        work_df.to_csv(out_path, mode="a", index=False, header=False, encoding="utf-8")
+        work_df = pd.concat([existing, work_df], ignore_index=True)
+    else:
+        work_df = pd.concat([existing, work_df], ignore_index=True)
+        work_df.to_csv(out_path, index=False, encoding="utf_8_sig")
+    print(f"\n已保存：{out_path}  行数={len(work_df)}")
 
-# 保存输出文件
-out_path = Path(f"{BVID}_comments_with_sentiment.csv")
-work_df.to_csv(out_path, index=False, encoding="utf_8_sig")
-print(f"\n已保存：{out_path}  行数={len(work_df)}")
+    # 统计数量
+    print(f"积极情绪 (1):  {len(work_df[work_df['sentiment_label']==1])} 条")
+    print(f"消极情绪 (-1): {len(work_df[work_df['sentiment_label']==-1])} 条")
+    print(f"中性情绪 (0):  {len(work_df[work_df['sentiment_label']==0])} 条")
+    print(f"总计: {len(work_df)} 条")
 
-# 统计数量
-print(f"积极情绪 (1):  {len(work_df[work_df['sentiment_label']==1])} 条")
-print(f"消极情绪 (-1): {len(work_df[work_df['sentiment_label']==-1])} 条")
-print(f"中性情绪 (0):  {len(work_df[work_df['sentiment_label']==0])} 条")
-print(f"总计: {len(work_df)} 条")
+if __name__ == "__main__":
+    main()
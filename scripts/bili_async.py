@@ -0,0 +1,276 @@
+"""
+B站 asyncio 爬虫引擎
+功能：
+1. 基于 aiohttp 的长连接（HTTP/1.1 keep-alive）连接池，按 host 限制并发连接数
+2. 协程版 fetch_search_page / bvid_to_aid / 评论 reply/main 游标翻页
+3. 单进程内同时驱动多个关键词、多个视频的大量在途请求，无需一请求一线程
+
+用法示例：
+    python bili_async.py --keyword Python --pages 10 --out Python_搜索.csv
+    python bili_async.py --bvid BV1wK2QBPEDv BV1xx411c7mD --max_comments 200
+"""
+
+import argparse
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+import pandas as pd
+
+try:
+    from . import bili_search_scraper as bs  # 作为 scripts 包导入（如 notebook）
+    from . import bilibili_comments as bc
+    from .rate_limit import RETRY_CODES, RETRY_STATUS, AsyncRateLimiter, backoff_delay, retry_after_seconds
+    from .http_cache import DEFAULT_MAX_RETRIES, CacheMiss, ResponseCache, is_cacheable
+    from .bili_metrics import inc, timer
+    from .bili_storage import COMMENT_DTYPES, SEARCH_DTYPES, write_table
+except ImportError:
+    import bili_search_scraper as bs  # 在 scripts/ 下直接运行
+    import bilibili_comments as bc
+    from rate_limit import RETRY_CODES, RETRY_STATUS, AsyncRateLimiter, backoff_delay, retry_after_seconds
+    from http_cache import DEFAULT_MAX_RETRIES, CacheMiss, ResponseCache, is_cacheable
+    from bili_metrics import inc, timer
+    from bili_storage import COMMENT_DTYPES, SEARCH_DTYPES, write_table
+
+
+# 与同步版相同的请求头，但去掉 connection: close，复用长连接
+ASYNC_HEADERS = {k: v for k, v in bs.DEFAULT_HEADERS.items() if k != "connection"}
+
+
+class AsyncBiliClient:
+    """
+    用法：
+        async with AsyncBiliClient(cookie=cookie) as client:
+            df = await client.crawl_search("Python", pages=10)
+
+    limit:          连接池总连接数上限
+    limit_per_host: 每个 host 的并发连接数上限
+    rps:            所有协程合计的每秒请求数上限，None 表示不限速
+    cache:          本地响应缓存（http_cache.ResponseCache），命中时不发请求
+    max_retries:    被限流（412 / 429 / 5xx）或网络出错时的最大重试次数
+    """
+
+    def __init__(
+        self,
+        cookie: Optional[str] = None,
+        proxy: Optional[str] = None,
+        limit: int = 100,
+        limit_per_host: int = 8,
+        rps: Optional[float] = None,
+        keepalive_timeout: float = 30,
+        cache: Optional[ResponseCache] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+    ):
+        self.cookie = cookie
+        self.proxy = proxy
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.limiter = AsyncRateLimiter(rps) if rps else None
+        self.cache = cache
+        self.max_retries = max_retries
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncBiliClient":
+        headers = dict(ASYNC_HEADERS)
+        if self.cookie:
+            headers["cookie"] = self.cookie
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self.session = aiohttp.ClientSession(
+            headers=headers,
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=60, connect=20),
+            trust_env=False,
+        )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.session.close()
+
+    async def get_json(self, url: str, params: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """返回与同步版 fetch_search_page 相同结构：{"status_code", "json", "from_cache"}"""
+        endpoint = urlparse(url).path
+        if self.cache is not None:
+            # SQLite 读写是阻塞调用，放到线程里执行，不卡住事件循环（ResponseCache 自带锁，可跨线程使用）
+            hit = await asyncio.to_thread(self.cache.get, url, params)
+            if hit is not None:
+                inc("http_cache_hits", endpoint=endpoint)
+                return {"status_code": 200, "json": hit, "from_cache": True}
+            if self.cache.offline:
+                raise CacheMiss(f"离线模式下缓存未命中：{url} {params}")
+
+        # 被限流（412 / 429 / 5xx 等）或网络出错时按指数退避重试，与同步版 cached_get 一致
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                await self.limiter.acquire()
+            try:
+                with timer("http_request", endpoint=endpoint):
+                    async with self.session.get(url, params=params, headers=headers, proxy=self.proxy) as r:
+                        body = await r.read()
+                        status = r.status
+                        retry_after = retry_after_seconds(r)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise
+                inc("retries", endpoint=endpoint, reason=type(e).__name__)
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            inc("http_responses", endpoint=endpoint, status=status)
+            inc("http_bytes", len(body), endpoint=endpoint)
+            try:
+                j = json.loads(body)
+            except Exception:
+                j = None
+
+            code = j.get("code") if isinstance(j, dict) else None
+            if (status in RETRY_STATUS or code in RETRY_CODES) and attempt < self.max_retries:
+                inc("retries", endpoint=endpoint, reason=code if code in RETRY_CODES else status)
+                delay = retry_after if retry_after is not None else backoff_delay(attempt)
+                await asyncio.sleep(delay)
+                continue
+            break
+
+        if self.cache is not None and is_cacheable(status, j):
+            await asyncio.to_thread(self.cache.put, url, params, j)
+        return {"status_code": status, "json": j, "from_cache": False}
+
+    # ---------- 搜索 ----------
+    async def fetch_search_page(self, keyword: str, page: int, page_size: int = 30) -> Dict[str, Any]:
+        return await self.get_json(bs.SEARCH_URL, bs.search_params(keyword, page, page_size))
+
+    async def search_rows(self, keyword: str, page: int, page_size: int = 30) -> List[Dict[str, Any]]:
+        resp = await self.fetch_search_page(keyword, page, page_size)
+        data_list = bs.check_search_response(resp)
+        return bs.extract_rows(keyword, page, data_list)
+
+    async def crawl_search(self, keyword: str, pages: int = 3, page_size: int = 30) -> pd.DataFrame:
+        # gather 保持提交顺序，输出行按页码排列
+        results = await asyncio.gather(
+            *(self.search_rows(keyword, page, page_size) for page in range(1, pages + 1))
+        )
+        df = pd.DataFrame([row for rows in results for row in rows])
+        if "bvid" in df.columns:
+            df = df.drop_duplicates(subset=["bvid"], keep="first")
+        return df
+
+    # ---------- 评论 ----------
+    async def bvid_to_aid(self, bvid: str) -> int:
+        resp = await self.get_json(bc.VIEW_URL, {"bvid": bvid}, headers={"referer": bc.DEFAULT_HEADERS["referer"]})
+        j = resp["json"] or {}
+        if j.get("code") != 0:
+            raise RuntimeError(f"BV转aid失败：code={j.get('code')} msg={j.get('message')}")
+        return int(j["data"]["aid"])
+
+    async def fetch_comments(self, bvid: str, max_comments: int = 100, aid: Optional[int] = None) -> List[dict]:
+        """
+        reply/main 游标翻页的协程版本。单个视频内部按游标串行，
+        多个视频之间由调用方并发。
+        """
+        if aid is None:
+            aid = await self.bvid_to_aid(bvid)
+
+        all_comments: List[dict] = []
+        next_page = 0
+        while len(all_comments) < max_comments:
+            resp = await self.get_json(
+                bc.REPLY_MAIN_URL,
+                bc.reply_main_params(aid, next_page),
+                headers={"referer": bc.DEFAULT_HEADERS["referer"]},
+            )
+            j = resp["json"] or {}
+            if j.get("code") != 0:
+                raise RuntimeError(f"评论接口返回错误：code={j.get('code')} msg={j.get('message')}")
+
+            data = j.get("data") or {}
+            replies = data.get("replies") or []
+            cursor = data.get("cursor") or {}
+            if not replies:
+                break
+
+            for rep in replies:
+                all_comments.append(dict(bc.parse_reply(rep), bvid=bvid))
+                if len(all_comments) >= max_comments:
+                    break
+
+            if cursor.get("is_end"):
+                break
+            next_page = cursor.get("next")
+            if next_page is None:
+                print(f"[WARN] {bvid} cursor.next 缺失，停止。")
+                break
+
+        return all_comments
+
+
+async def crawl_keywords_async(
+    keywords: List[str],
+    pages: int = 3,
+    page_size: int = 30,
+    cookie: Optional[str] = None,
+    proxy: Optional[str] = None,
+    limit_per_host: int = 8,
+    rps: Optional[float] = None,
+) -> pd.DataFrame:
+    """多个关键词同时爬取，结果按关键词、页码顺序拼接。"""
+    async with AsyncBiliClient(cookie=cookie, proxy=proxy, limit_per_host=limit_per_host, rps=rps) as client:
+        dfs = await asyncio.gather(*(client.crawl_search(k, pages, page_size) for k in keywords))
+    return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+
+
+async def fetch_comments_many_async(
+    bvids: List[str],
+    max_comments: int = 100,
+    cookie: Optional[str] = None,
+    proxy: Optional[str] = None,
+    limit_per_host: int = 8,
+    rps: Optional[float] = None,
+) -> pd.DataFrame:
+    """多个视频的评论同时爬取，返回带 bvid 列的合并 DataFrame。"""
+    async with AsyncBiliClient(cookie=cookie, proxy=proxy, limit_per_host=limit_per_host, rps=rps) as client:
+        results = await asyncio.gather(*(client.fetch_comments(b, max_comments) for b in bvids))
+    return pd.DataFrame([row for rows in results for row in rows])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="B站 asyncio 爬虫（搜索 / 评论）")
+    parser.add_argument("--keyword", nargs="*", default=[], help="搜索关键词，可多个")
+    parser.add_argument("--pages", type=int, default=3, help="每个关键词爬取页数")
+    parser.add_argument("--page_size", type=int, default=30, help="每页数量（默认30）")
+    parser.add_argument("--bvid", nargs="*", default=[], help="爬取评论的视频 BV 号，可多个")
+    parser.add_argument("--max_comments", type=int, default=100, help="每个视频最大评论数")
+    parser.add_argument("--out", default=None, help="输出文件名（.csv 或 .parquet）")
+    parser.add_argument("--cookie", default=None, help="B站Cookie")
+    parser.add_argument("--proxy", default=None, help="HTTP代理，如 http://127.0.0.1:7897")
+    parser.add_argument("--limit_per_host", type=int, default=8, help="每个 host 的并发连接数")
+    parser.add_argument("--rps", type=float, default=None, help="每秒请求数上限（默认不限速）")
+    args = parser.parse_args()
+
+    cookie = bs.load_cookie(args.cookie)
+
+    if args.keyword:
+        df = asyncio.run(crawl_keywords_async(
+            args.keyword, args.pages, args.page_size,
+            cookie=cookie, proxy=args.proxy, limit_per_host=args.limit_per_host, rps=args.rps,
+        ))
+        out = args.out or f"{'_'.join(args.keyword)}_搜索.csv"
+    elif args.bvid:
+        df = asyncio.run(fetch_comments_many_async(
+            args.bvid, args.max_comments,
+            cookie=cookie, proxy=args.proxy, limit_per_host=args.limit_per_host, rps=args.rps,
+        ))
+        out = args.out or "comments.csv"
+    else:
+        parser.error("需要指定 --keyword 或 --bvid")
+
+    write_table(df, out, dtypes=SEARCH_DTYPES if args.keyword else COMMENT_DTYPES)  # .parquet 结尾时写 Parquet
+    print(f"[OK] 保存完成：{out}  行数={len(df)}")
+
+
+if __name__ == "__main__":
+    main()
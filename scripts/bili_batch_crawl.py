@@ -0,0 +1,263 @@
+"""
+多关键词批量爬取
+功能：
+1. 从列表或文件读取关键词，按轮转顺序（各关键词第1页、各关键词第2页……）调度所有页
+2. 所有关键词共享一个每秒请求预算（令牌桶）
+3. 全局 bvid 索引：同一视频只存一次（videos），与各关键词的对应关系单独存一张表（video_keywords）
+
+用法示例：
+    python bili_batch_crawl.py --keywords Python 深度学习 --pages 5
+    python bili_batch_crawl.py --keyword_file keywords.txt --pages 10 --workers 4 --rps 2 --prefix daily_
+"""
+
+import argparse
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import requests
+
+try:
+    from . import bili_search_scraper as bs  # 作为 scripts 包导入（如 notebook）
+    from .rate_limit import AdaptiveThrottle, RateLimiter
+    from .http_cache import ResponseCache
+    from .bili_storage import SEARCH_DTYPES, RowWriter, read_table
+    from .session_pool import SessionPool
+    from .bili_store import BiliStore
+except ImportError:
+    import bili_search_scraper as bs  # 在 scripts/ 下直接运行
+    from rate_limit import AdaptiveThrottle, RateLimiter
+    from http_cache import ResponseCache
+    from bili_storage import SEARCH_DTYPES, RowWriter, read_table
+    from session_pool import SessionPool
+    from bili_store import BiliStore
+
+LINK_DTYPES = {
+    "bvid": "string",
+    "keyword": "category",
+    "page": "Int64",
+    "rank": "Int64",
+}
+
+
+def load_keywords(keywords: Optional[List[str]] = None, keyword_file: Optional[str] = None) -> List[str]:
+    """
+    合并命令行关键词与关键词文件（每行一个，# 开头为注释），去重并保持顺序。
+    """
+    result = list(keywords or [])
+    if keyword_file:
+        with open(keyword_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    result.append(line)
+    return list(dict.fromkeys(result))
+
+
+def load_bvid_index(path: Optional[str]) -> Set[str]:
+    """从已有的 videos 文件中读取 bvid，作为跨批次的全局索引。"""
+    if not path or not os.path.exists(path):
+        return set()
+    df = read_table(path, columns=["bvid"])
+    return set(df["bvid"].dropna().astype(str))
+
+
+def schedule_pages(keywords: List[str], pages: int) -> Iterator[Tuple[str, int]]:
+    """轮转调度：先爬所有关键词的第 1 页，再爬第 2 页……"""
+    for page in range(1, pages + 1):
+        for keyword in keywords:
+            yield keyword, page
+
+
+def iter_batch_pages(
+    keywords: List[str],
+    pages: int = 3,
+    page_size: int = 30,
+    cookie: Optional[str] = None,
+    proxies: Optional[Dict[str, str]] = None,
+    workers: int = 4,
+    rps: float = bs.DEFAULT_RPS,
+    cache: Optional[ResponseCache] = None,
+    adaptive: bool = False,
+    pool: Optional[SessionPool] = None,
+) -> Iterator[Tuple[str, int, List[Dict[str, Any]]]]:
+    """
+    并发爬取所有 (关键词, 页)，按调度顺序产出 (keyword, page, rows)。
+    某个关键词返回空页后，不再调度它后面的页；某页失败时打印警告并
+    停止该关键词，其余关键词继续。
+    adaptive=True 时 rps 只是初始速率，之后按 AdaptiveThrottle 自适应调整。
+    传入 pool（session_pool.SessionPool）时在多个 Cookie / 代理之间轮换，cookie / proxies 不再使用。
+    """
+    limiter = AdaptiveThrottle(rps) if adaptive else RateLimiter(rps)
+    local = threading.local()
+    exhausted: Set[str] = set()
+
+    def fetch_rows(keyword: str, page: int) -> List[Dict[str, Any]]:
+        if pool is not None:
+            local.session = pool
+        elif not hasattr(local, "session"):
+            local.session = bs.build_session(cookie, proxies=proxies)
+        resp = bs.fetch_search_page(local.session, keyword, page, page_size, cache=cache, limiter=limiter)
+        data_list = bs.check_search_response(resp)
+        return bs.extract_rows(keyword, page, data_list)
+
+    tasks = schedule_pages(keywords, pages)
+    pending = deque()
+
+    def submit_next(executor) -> None:
+        for keyword, page in tasks:
+            if keyword in exhausted:
+                continue
+            pending.append((keyword, page, executor.submit(fetch_rows, keyword, page)))
+            return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for _ in range(workers * 2):
+                submit_next(executor)
+            while pending:
+                keyword, page, fut = pending.popleft()
+                try:
+                    rows = fut.result()
+                except (RuntimeError, requests.RequestException) as e:
+                    # 包括重试用尽后的网络错误，只停掉这个关键词
+                    print(f"[WARN] 关键词「{keyword}」第 {page} 页失败，跳过该关键词剩余页：{e}")
+                    rows = []
+                if not rows:
+                    exhausted.add(keyword)
+                submit_next(executor)
+                if rows:
+                    yield keyword, page, rows
+        finally:
+            for _, _, fut in pending:
+                fut.cancel()
+
+
+def crawl_keywords_batch(
+    keywords: List[str],
+    videos_out: str,
+    links_out: str,
+    pages: int = 3,
+    page_size: int = 30,
+    cookie: Optional[str] = None,
+    proxies: Optional[Dict[str, str]] = None,
+    workers: int = 4,
+    rps: float = bs.DEFAULT_RPS,
+    cache: Optional[ResponseCache] = None,
+    known_bvids: Optional[Set[str]] = None,
+    adaptive: bool = False,
+    pool: Optional[SessionPool] = None,
+    store: Optional[BiliStore] = None,
+) -> Dict[str, int]:
+    """
+    批量爬取并流式写出两张表：
+    - videos_out：每个 bvid 一行（首次出现时的搜索结果）
+    - links_out： (bvid, keyword, page, rank)，记录视频出现在哪些关键词的第几页第几位
+    known_bvids 为之前批次已存过的 bvid，这些视频只记录关联、不重复存储。
+    传入 store（bili_store.BiliStore）时每页的行同时 upsert 进本地分析库（含视频-关键词关联）。
+    返回统计信息。
+    """
+    seen: Set[str] = set(known_bvids or ())
+    links_seen: Set[Tuple[str, str]] = set()
+    stats = {"pages": 0, "results": 0, "videos": 0, "links": 0}
+
+    with RowWriter(videos_out, dtypes=SEARCH_DTYPES) as videos, \
+            RowWriter(links_out, dtypes=LINK_DTYPES) as links:
+        for keyword, page, rows in iter_batch_pages(
+            keywords, pages, page_size, cookie, proxies, workers, rps, cache, adaptive, pool
+        ):
+            stats["pages"] += 1
+            stats["results"] += len(rows)
+            if store is not None:
+                store.upsert_videos(rows)
+            new_videos, new_links = [], []
+            for rank, row in enumerate(rows, start=1):
+                bvid = row["bvid"]
+                if not bvid:
+                    continue
+                if (bvid, keyword) not in links_seen:
+                    links_seen.add((bvid, keyword))
+                    new_links.append({"bvid": bvid, "keyword": keyword, "page": page, "rank": rank})
+                if bvid not in seen:
+                    seen.add(bvid)
+                    new_videos.append(row)
+            videos.write_rows(new_videos)
+            links.write_rows(new_links)
+            stats["videos"] += len(new_videos)
+            stats["links"] += len(new_links)
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="B站多关键词批量搜索爬取")
+    parser.add_argument("--keywords", nargs="*", default=[], help="搜索关键词，可多个")
+    parser.add_argument("--keyword_file", default=None, help="关键词文件，每行一个")
+    parser.add_argument("--pages", type=int, default=3, help="每个关键词爬取页数")
+    parser.add_argument("--page_size", type=int, default=30, help="每页数量（默认30）")
+    parser.add_argument("--prefix", default="batch_", help="输出文件名前缀")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="输出格式")
+    parser.add_argument("--index", default=None, help="已有的 videos 文件，其中的 bvid 不再重复存储")
+    parser.add_argument("--cookie", default=None, help="B站Cookie")
+    parser.add_argument("--proxy", default=None, help="HTTP代理，如 http://127.0.0.1:7897")
+    parser.add_argument("--workers", type=int, default=4, help="并发线程数")
+    parser.add_argument("--rps", type=float, default=bs.DEFAULT_RPS, help="所有关键词合计的每秒请求数上限")
+    parser.add_argument("--cache", default=None, help="本地响应缓存文件，如 bili_http_cache.sqlite")
+    parser.add_argument("--adaptive", action="store_true", help="自适应限速：正常时逐步提速，被限流时减速退避（--rps 为初始速率）")
+    parser.add_argument("--cookie_file", default=None, help="多身份文件（每行一个 Cookie，可附代理），在各身份间轮换")
+    parser.add_argument("--pool_strategy", choices=["round_robin", "least_loaded"], default="round_robin",
+                        help="多身份的分配方式：轮询 / 在途请求最少")
+    parser.add_argument("--store", default=None, help="同时写入本地分析库（SQLite），如 bili_store.sqlite")
+    args = parser.parse_args()
+
+    keywords = load_keywords(args.keywords, args.keyword_file)
+    if not keywords:
+        parser.error("需要指定 --keywords 或 --keyword_file")
+
+    cookie = bs.load_cookie(args.cookie)
+    proxies = {"http": args.proxy, "https": args.proxy} if args.proxy else None
+    cache = ResponseCache(args.cache) if args.cache else None
+    pool = None
+    if args.cookie_file:
+        pool = SessionPool.from_file(args.cookie_file, build=bs.build_session, strategy=args.pool_strategy)
+        print(f"[INFO] 从 {args.cookie_file} 加载 {len(pool)} 个身份")
+
+    store = BiliStore(args.store) if args.store else None
+
+    videos_out = f"{args.prefix}videos.{args.format}"
+    links_out = f"{args.prefix}video_keywords.{args.format}"
+    if args.index and os.path.abspath(args.index) in (os.path.abspath(videos_out), os.path.abspath(links_out)):
+        # 输出文件会被重写，其中的视频又被当作已存过而跳过，最后哪个文件里都没有
+        parser.error(f"--index 不能是本次的输出文件 {args.index}，请换一个 --prefix 或先改名")
+
+    stats = crawl_keywords_batch(
+        keywords,
+        videos_out,
+        links_out,
+        pages=args.pages,
+        page_size=args.page_size,
+        cookie=cookie,
+        proxies=proxies,
+        workers=args.workers,
+        rps=args.rps,
+        cache=cache,
+        known_bvids=load_bvid_index(args.index),
+        adaptive=args.adaptive,
+        pool=pool,
+        store=store,
+    )
+
+    if pool is not None:
+        pool.print_stats()
+    if store is not None:
+        store.close()
+        print(f"[OK] 已写入本地分析库：{args.store}")
+    print(f"[OK] 关键词 {len(keywords)} 个，页 {stats['pages']}，搜索结果 {stats['results']} 条")
+    print(f"[OK] 视频 {stats['videos']} 个 -> {videos_out}")
+    print(f"[OK] 视频-关键词关联 {stats['links']} 条 -> {links_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+端到端吞吐基准测试（基于本地模拟接口，不需要 Cookie / API Key）
+功能：
+1. 启动 mock_bili_server.MockBiliServer，并把各脚本的接口地址指向它
+2. 依次运行各阶段：搜索爬取 → 评论采集 → LLM 情绪分类 → 标题分词词频
+3. 每个阶段报告耗时、pages/s、comments/s、classifications/s 等吞吐，以及阶段内的峰值内存（RSS）
+4. 结果可保存为 JSON，之后用 --compare 对比，吞吐下降超过容忍度时返回非 0，便于发现性能回退
+
+用法示例：
+    python bili_benchmark.py --pages 20 --workers 4 --videos 10 --latency 0.02 --save bench.json
+    # 改动并发 / 缓存后重跑并与之前的结果对比
+    python bili_benchmark.py --pages 20 --workers 4 --videos 10 --latency 0.02 --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import jieba
+
+import api_comments
+import bili_search_scraper as bs
+from bili_metrics import METRICS
+from bili_comment_harvester import harvest_comments, read_comment_dataset
+from bilibili_title_wordfreq import count_title_words
+from mock_bili_server import REPLY_DETAIL_PATH, REPLY_MAIN_PATH, MockBiliServer, patch_endpoints
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def current_rss() -> Optional[int]:
+    """当前进程的常驻内存（字节），拿不到时返回 None。"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PeakRSS:
+    """
+    在 with 块内每 interval 秒采样一次 RSS，记录峰值（字节）。
+    用法：
+        with PeakRSS() as mem:
+            run()
+        print(mem.peak)
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> None:
+        rss = current_rss()
+        if rss is not None:
+            self.peak = rss if self.peak is None else max(self.peak, rss)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "PeakRSS":
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def run_stage(name: str, func: Callable[[], Dict[str, int]]) -> Dict[str, Any]:
+    """运行一个阶段，func 返回 {计数名: 数量}，换算成每秒吞吐。"""
+    print(f"[RUN] {name} ...")
+    with PeakRSS() as mem:
+        start = time.perf_counter()
+        counts = func()
+        seconds = time.perf_counter() - start
+    result: Dict[str, Any] = {"stage": name, "seconds": round(seconds, 3)}
+    for key, n in counts.items():
+        result[key] = n
+        result[f"{key}_per_s"] = round(n / seconds, 2) if seconds > 0 else None
+    result["peak_rss_mb"] = round(mem.peak / 1024 / 1024, 1) if mem.peak is not None else None
+    return result
+
+
+def run_benchmark(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    server = MockBiliServer(
+        latency=args.latency,
+        llm_latency=args.llm_latency,
+        p412=args.p412,
+        p429=args.p429,
+        search_pages=args.pages,
+        comments_per_video=args.comments,
+    )
+    results: List[Dict[str, Any]] = []
+    state: Dict[str, Any] = {}
+
+    def search() -> Dict[str, int]:
+        rows, pages = [], 0
+        for _, page_rows in bs.iter_search_pages(
+            args.keyword, args.pages, args.page_size, workers=args.workers, rps=args.rps, adaptive=args.adaptive,
+        ):
+            rows.extend(page_rows)
+            pages += bool(page_rows)  # 只计返回了结果的页：超出结果总页数的页返回空列表，不算吞吐
+        state["rows"] = rows
+        return {"pages": pages, "rows": len(rows)}
+
+    def comments() -> Dict[str, int]:
+        targets = [(r["bvid"], r["aid"]) for r in state["rows"][:args.videos]]
+        before = server.stats.get(REPLY_MAIN_PATH, 0) + server.stats.get(REPLY_DETAIL_PATH, 0)
+        with tempfile.TemporaryDirectory() as out_dir:
+            done = harvest_comments(
+                targets, out_dir, max_comments=args.comments, workers=args.workers, rps=args.rps,
+                expand_replies=args.expand_replies, adaptive=args.adaptive,
+            )
+            df = read_comment_dataset(out_dir, columns=["content"])
+        state["texts"] = df["content"].fillna("").astype(str).tolist()[:args.classify]
+        pages = server.stats.get(REPLY_MAIN_PATH, 0) + server.stats.get(REPLY_DETAIL_PATH, 0) - before
+        return {"pages": pages, "comments": sum(n for n in done.values() if n > 0)}
+
+    def classify() -> Dict[str, int]:
+        labels = api_comments.classify_texts(
+            state["texts"], api_key="mock", max_in_flight=args.llm_workers, batch_size=args.batch_size,
+        )
+        return {"classifications": len(labels)}
+
+    def tokenize() -> Dict[str, int]:
+        titles = [r["title"] for r in state["rows"]]
+        exclude = set(jieba.cut(args.keyword))
+        counts = count_title_words(titles, args.keyword, set(), exclude, workers=args.tokenize_workers)
+        return {"titles": len(titles), "words": sum(counts.values())}
+
+    jieba.initialize()  # 词典加载不计入分词阶段的耗时
+    with server:
+        patch_endpoints(server.base_url)
+        for name, func in (("search", search), ("comments", comments), ("classify", classify), ("tokenize", tokenize)):
+            results.append(run_stage(name, func))
+        print(f"[INFO] 模拟接口请求统计：{server.stats}")
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    print("\n阶段        耗时(s)   吞吐                                        峰值RSS(MB)")
+    for r in results:
+        rates = "  ".join(f"{k[:-6]}/s={v}" for k, v in r.items() if k.endswith("_per_s"))
+        print(f"{r['stage']:<10}  {r['seconds']:>7}   {rates:<42}  {r['peak_rss_mb']}")
+
+
+def compare_results(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> bool:
+    """逐阶段对比每秒吞吐，任一项低于基线的 (1 - tolerance) 倍时返回 False。"""
+    old = {r["stage"]: r for r in baseline}
+    ok = True
+    print(f"\n与基线对比（容忍下降 {tolerance:.0%}）：")
+    for r in results:
+        base = old.get(r["stage"])
+        if base is None:
+            continue
+        for key, value in r.items():
+            if not key.endswith("_per_s") or not value or not base.get(key):
+                continue
+            change = value / base[key] - 1
+            flag = "REGRESSION" if change < -tolerance else "ok"
+            ok = ok and flag == "ok"
+            print(f"  {r['stage']:<10} {key:<24} {base[key]:>10} -> {value:>10}  ({change:+.1%}) {flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基于本地模拟接口的端到端吞吐基准测试")
+    parser.add_argument("--keyword", default="深度学习", help="搜索关键词")
+    parser.add_argument("--pages", type=int, default=10, help="搜索页数")
+    parser.add_argument("--page_size", type=int, default=30, help="每页数量")
+    parser.add_argument("--workers", type=int, default=4, help="搜索 / 评论的并发线程数")
+    parser.add_argument("--rps", type=float, default=200.0, help="搜索 / 评论合计的每秒请求数上限")
+    parser.add_argument("--videos", type=int, default=5, help="采集评论的视频数")
+    parser.add_argument("--comments", type=int, default=100, help="每个视频的根评论数")
+    parser.add_argument("--expand_replies", action="store_true", help="同时展开楼中楼")
+    parser.add_argument("--adaptive", action="store_true", help="搜索 / 评论使用自适应限速（--rps 为初始速率）")
+    parser.add_argument("--classify", type=int, default=200, help="参与情绪分类的评论条数")
+    parser.add_argument("--llm_workers", type=int, default=api_comments.MAX_IN_FLIGHT, help="同时在途的 LLM 请求数")
+    parser.add_argument("--batch_size", type=int, default=api_comments.BATCH_SIZE, help="每个 LLM 请求打包的评论条数")
+    parser.add_argument("--tokenize_workers", type=int, default=1, help="分词进程数")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟 B站接口的平均延迟（秒）")
+    parser.add_argument("--llm_latency", type=float, default=0.1, help="模拟 LLM 接口的平均延迟（秒）")
+    parser.add_argument("--p412", type=float, default=0.0, help="注入 412 的概率")
+    parser.add_argument("--p429", type=float, default=0.0, help="注入 429 的概率")
+    parser.add_argument("--save", default=None, help="把结果保存为 JSON")
+    parser.add_argument("--compare", default=None, help="与之前保存的 JSON 结果对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="对比时允许的吞吐下降比例")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    print_results(results)
+    if not METRICS.enabled:  # 配置了指标输出时退出前会自动打印
+        METRICS.print_summary()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n[OK] 结果已保存：{args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        ignored = ("save", "compare", "tolerance")
+        changed = [k for k, v in vars(args).items() if k not in ignored and baseline["args"].get(k) != v]
+        if changed:
+            print(f"[WARN] 与基线的参数不同：{', '.join(changed)}，对比结果仅供参考")
+        if not compare_results(results, baseline["results"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+多视频评论批量采集
+功能：
+1. 从搜索结果（{keyword}_搜索.csv / .parquet）或 BV 号列表读取要采集的视频
+2. 直接使用搜索结果里的 aid 列，缺失时再并发调用 bvid_to_aid 解析
+3. 多个视频并发采集，共享一个每秒请求预算，每个视频最多 max_comments 条
+4. 结果按视频分区写入同一个评论数据集目录：{out_dir}/bvid={BV号}/part-0.csv（或 .parquet）
+
+用法示例：
+    python bili_comment_harvester.py --search 深度学习_搜索.csv --top 500 --sort_by view --max_comments 200
+    python bili_comment_harvester.py --bvids BV1wK2QBPEDv BV1xx411c7mD --out_dir comments
+"""
+
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import requests
+
+try:
+    from . import bilibili_comments as bc  # 作为 scripts 包导入（如 notebook）
+    from .rate_limit import AdaptiveThrottle, RateLimiter
+    from .http_cache import ResponseCache
+    from .bili_storage import COMMENT_DTYPES, RowWriter, read_table
+    from .session_pool import SessionPool
+    from .bili_store import BiliStore
+except ImportError:
+    import bilibili_comments as bc  # 在 scripts/ 下直接运行
+    from rate_limit import AdaptiveThrottle, RateLimiter
+    from http_cache import ResponseCache
+    from bili_storage import COMMENT_DTYPES, RowWriter, read_table
+    from session_pool import SessionPool
+    from bili_store import BiliStore
+
+DEFAULT_RPS = 2.0
+
+
+def load_targets(
+    search_file: Optional[str] = None,
+    bvids: Optional[List[str]] = None,
+    bvid_file: Optional[str] = None,
+    top: Optional[int] = None,
+    sort_by: Optional[str] = None,
+) -> List[Tuple[str, Optional[int]]]:
+    """
+    返回 [(bvid, aid 或 None), ...]，按出现顺序去重。
+    search_file 为搜索结果文件（读取 bvid / aid 列，sort_by 如 "view" 时按该列降序）；
+    bvids / bvid_file 为 BV 号列表（文件每行一个）。top 只保留前 N 个。
+    """
+    targets: List[Tuple[str, Optional[int]]] = []
+
+    if search_file:
+        columns = ["bvid", "aid"] + ([sort_by] if sort_by else [])
+        df = read_table(search_file, columns=columns).dropna(subset=["bvid"])
+        if sort_by:
+            df = df.sort_values(sort_by, ascending=False, kind="stable")
+        for bvid, aid in zip(df["bvid"], df["aid"]):
+            targets.append((str(bvid), None if pd.isna(aid) else int(aid)))
+
+    names = list(bvids or [])
+    if bvid_file:
+        with open(bvid_file, "r", encoding="utf-8") as f:
+            names.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    targets.extend((b, None) for b in names)
+
+    seen = set()
+    result = []
+    for bvid, aid in targets:
+        if bvid in seen:
+            continue
+        seen.add(bvid)
+        result.append((bvid, aid))
+    return result[:top] if top else result
+
+
+def partition_path(out_dir: str, bvid: str, fmt: str = "csv") -> str:
+    return os.path.join(out_dir, f"bvid={bvid}", f"part-0.{fmt}")
+
+
+def empty_marker_path(out_dir: str, bvid: str) -> str:
+    # 没有评论的视频不产生分区文件，用这个标记表示已采集过
+    return os.path.join(out_dir, f"bvid={bvid}", "_EMPTY")
+
+
+def harvest_comments(
+    targets: List[Tuple[str, Optional[int]]],
+    out_dir: str,
+    max_comments: int = 100,
+    cookie: Optional[str] = None,
+    proxies: Optional[Dict[str, str]] = None,
+    workers: int = 4,
+    rps: float = DEFAULT_RPS,
+    cache: Optional[ResponseCache] = None,
+    fmt: str = "csv",
+    skip_existing: bool = True,
+    expand_replies: bool = False,
+    max_sub_replies: int = 20,
+    adaptive: bool = False,
+    pool: Optional[SessionPool] = None,
+    store: Optional[BiliStore] = None,
+) -> Dict[str, int]:
+    """
+    并发采集多个视频的评论，每个视频写一个分区文件。
+    分区先写临时文件、完成后再改名，因此 skip_existing=True 时
+    已完成的视频会被跳过，可直接重跑续采。
+    expand_replies=True 时同时展开楼中楼（同样受 rps 限速）。
+    adaptive=True 时 rps 只是初始速率，之后按 AdaptiveThrottle 自适应调整。
+    传入 pool（session_pool.SessionPool）时在多个 Cookie / 代理之间轮换，cookie / proxies 不再使用。
+    传入 store（bili_store.BiliStore）时评论同时 upsert 进本地分析库。
+    返回 {bvid: 评论数}（失败的视频为 -1）。
+    """
+    limiter = AdaptiveThrottle(rps) if adaptive else RateLimiter(rps)
+    local = threading.local()
+
+    def session():
+        if pool is not None:
+            return pool
+        if not hasattr(local, "session"):
+            local.session = bc.build_session(cookie=cookie, proxies=proxies)
+        return local.session
+
+    def harvest_one(bvid: str, aid: Optional[int]) -> int:
+        path = partition_path(out_dir, bvid, fmt)
+        marker = empty_marker_path(out_dir, bvid)
+        if skip_existing and (os.path.exists(path) or os.path.exists(marker)):
+            return 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp." + fmt
+        with RowWriter(tmp, dtypes=COMMENT_DTYPES) as writer:
+            for rows in bc.iter_comment_pages(
+                bvid, session(), max_comments, cache=cache, aid=aid, limiter=limiter,
+                expand_replies=expand_replies, max_sub_replies=max_sub_replies,
+            ):
+                rows = [dict(row, bvid=bvid) for row in rows]
+                writer.write_rows(rows)
+                if store is not None:
+                    store.upsert_comments(rows)
+        if writer.rows_written:
+            os.replace(tmp, path)
+        else:
+            os.remove(tmp)  # RowWriter 会留下只有表头的空文件
+            open(marker, "w").close()
+        return writer.rows_written
+
+    results: Dict[str, int] = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(harvest_one, bvid, aid): bvid for bvid, aid in targets}
+        for i, fut in enumerate(as_completed(futures), start=1):
+            bvid = futures[fut]
+            try:
+                results[bvid] = fut.result()
+            except (RuntimeError, requests.RequestException) as e:
+                # 单个视频失败（含重试用尽后的网络错误）不影响其他视频
+                print(f"[WARN] {bvid} 评论采集失败：{e}")
+                results[bvid] = -1
+            print(f"[{i}/{len(futures)}] {bvid} 评论 {results[bvid]} 条")
+    return results
+
+
+def read_comment_dataset(out_dir: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """读取 harvest_comments 写出的分区数据集，合并为一个 DataFrame。"""
+    frames = []
+    for name in sorted(os.listdir(out_dir)):
+        part_dir = os.path.join(out_dir, name)
+        if not name.startswith("bvid=") or not os.path.isdir(part_dir):
+            continue
+        for fname in sorted(os.listdir(part_dir)):
+            if fname.startswith("part-") and ".tmp." not in fname:
+                frames.append(read_table(os.path.join(part_dir, fname), columns=columns, dtypes=COMMENT_DTYPES))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="B站多视频评论批量采集")
+    parser.add_argument("--search", default=None, help="搜索结果文件（.csv / .parquet），使用其中的 bvid / aid 列")
+    parser.add_argument("--bvids", nargs="*", default=[], help="BV 号，可多个")
+    parser.add_argument("--bvid_file", default=None, help="BV 号文件，每行一个")
+    parser.add_argument("--top", type=int, default=None, help="只采集前 N 个视频")
+    parser.add_argument("--sort_by", default=None, help="按搜索结果的某列降序选取，如 view")
+    parser.add_argument("--max_comments", type=int, default=100, help="每个视频最大评论数")
+    parser.add_argument("--expand_replies", action="store_true", help="展开楼中楼回复")
+    parser.add_argument("--max_sub_replies", type=int, default=20, help="每条根评论最多展开的回复数")
+    parser.add_argument("--out_dir", default="comments", help="评论数据集目录")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="分区文件格式")
+    parser.add_argument("--cookie", default=None, help="B站Cookie")
+    parser.add_argument("--proxy", default=None, help="HTTP代理，如 http://127.0.0.1:7897")
+    parser.add_argument("--workers", type=int, default=4, help="并发采集的视频数")
+    parser.add_argument("--rps", type=float, default=DEFAULT_RPS, help="所有视频合计的每秒请求数上限")
+    parser.add_argument("--cache", default=None, help="本地响应缓存文件，如 bili_http_cache.sqlite")
+    parser.add_argument("--adaptive", action="store_true", help="自适应限速：正常时逐步提速，被限流时减速退避（--rps 为初始速率）")
+    parser.add_argument("--cookie_file", default=None, help="多身份文件（每行一个 Cookie，可附代理），在各身份间轮换")
+    parser.add_argument("--pool_strategy", choices=["round_robin", "least_loaded"], default="round_robin",
+                        help="多身份的分配方式：轮询 / 在途请求最少")
+    parser.add_argument("--store", default=None, help="同时写入本地分析库（SQLite），如 bili_store.sqlite")
+    args = parser.parse_args()
+
+    targets = load_targets(args.search, args.bvids, args.bvid_file, args.top, args.sort_by)
+    if not targets:
+        parser.error("需要指定 --search、--bvids 或 --bvid_file")
+
+    cookie = bc.load_cookie(args.cookie)
+    proxies = {"http": args.proxy, "https": args.proxy} if args.proxy else None
+    cache = ResponseCache(args.cache) if args.cache else None
+    store = BiliStore(args.store) if args.store else None
+    pool = None
+    if args.cookie_file:
+        pool = SessionPool.from_file(args.cookie_file, build=bc.build_session, strategy=args.pool_strategy)
+        print(f"[INFO] 从 {args.cookie_file} 加载 {len(pool)} 个身份")
+
+    results = harvest_comments(
+        targets,
+        args.out_dir,
+        max_comments=args.max_comments,
+        cookie=cookie,
+        proxies=proxies,
+        workers=args.workers,
+        rps=args.rps,
+        cache=cache,
+        fmt=args.format,
+        expand_replies=args.expand_replies,
+        max_sub_replies=args.max_sub_replies,
+        adaptive=args.adaptive,
+        pool=pool,
+        store=store,
+    )
+    if pool is not None:
+        pool.print_stats()
+    if store is not None:
+        store.close()
+        print(f"[OK] 已写入本地分析库：{args.store}")
+    ok = [n for n in results.values() if n >= 0]
+    print(f"[OK] 视频 {len(ok)}/{len(results)} 个，评论 {sum(ok)} 条 -> {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+运行指标（耗时 / 计数）
+功能：
+1. 计时器 timer / 装饰器 timed：记录每次调用的耗时直方图、处理行数和出错次数
+2. 计数器 inc：重试次数、下载字节数、HTTP 状态码、缓存命中等
+3. 结构化 JSON 日志：每次计时 / 事件写一行 JSON（配置了日志文件时）
+4. 汇总：每项的次数、总耗时、平均 / P50 / P95 / 最大耗时、行数和每秒行数；可导出 Prometheus 文本格式
+
+配置方式（二选一）：
+    环境变量 BILI_METRICS_LOG=metrics.jsonl  BILI_METRICS_PROM=metrics.prom
+    代码中   bili_metrics.configure(log_path="metrics.jsonl", prom_path="metrics.prom")
+配置后在进程退出时写出 Prometheus 文件、在日志末尾追加汇总并打印汇总表。
+
+用法：
+    with timer("fetch_search_page"):
+        resp = fetch(...)
+
+    @timed("extract_rows", rows=len)   # 行数取自返回值
+    def extract_rows(...): ...
+
+    inc("retries", endpoint="chat")
+
+注意：指标只在当前进程内累计，进程池子进程中的调用不会被统计。
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 耗时直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROM_PREFIX = "bili_"
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels + extra]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    # 计数器不能用 :g（只保留 6 位有效数字，大计数会丢精度），整数原样输出
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """按桶估计分位数（取所在桶的上限，落在 +Inf 桶时取最大值）。"""
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target and n:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+
+class Timer:
+    """
+    一次计时。可用作上下文管理器，也可手动 start() / stop()。
+    rows：本次处理的行数（评论条数、标题条数等），用于计算每秒行数。
+    """
+
+    def __init__(self, metrics: "Metrics", name: str, labels: Dict[str, Any]):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.rows = 0
+        self._start: Optional[float] = None
+
+    def start(self) -> "Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def stop(self, rows: Optional[int] = None, error: Optional[str] = None) -> float:
+        seconds = time.perf_counter() - self._start
+        if rows is not None:
+            self.rows = rows
+        self.metrics.record(self.name, seconds, self.rows, error, **self.labels)
+        return seconds
+
+    def track(self, items: Iterable[Any]) -> Iterator[Any]:
+        """逐个产出 items，同时把每项的 len() 累加到 rows（如按块读取的标题列表）。"""
+        for item in items:
+            self.rows += len(item)
+            yield item
+
+    def __enter__(self) -> "Timer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop(error=exc_type.__name__ if exc_type else None)
+
+
+class Metrics:
+    """
+    线程安全的指标集合。
+    log_path:  JSON 日志文件（每行一个事件），None 表示不写日志
+    prom_path: flush() 时写出的 Prometheus 文本文件，None 表示不写
+    """
+
+    def __init__(
+        self,
+        log_path: Optional[str] = None,
+        prom_path: Optional[str] = None,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.log_path = log_path
+        self.prom_path = prom_path
+        self.buckets = buckets
+        self.counters: Dict[Key, float] = {}
+        self.histograms: Dict[Key, _Histogram] = {}
+        self._lock = threading.Lock()
+        self._log = None
+        self._started = time.time()
+
+    def configure(self, log_path: Optional[str] = None, prom_path: Optional[str] = None) -> None:
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            self.log_path = log_path
+            self.prom_path = prom_path
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.log_path or self.prom_path)
+
+    # ---------- 记录 ----------
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def record(self, name: str, seconds: float, rows: int = 0, error: Optional[str] = None, **labels: Any) -> None:
+        """记录一次计时（Timer.stop 调用）。"""
+        key = _key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = _Histogram(self.buckets)
+            hist.observe(seconds)
+            if rows:
+                rk = _key(f"{name}_rows", labels)
+                self.counters[rk] = self.counters.get(rk, 0) + rows
+            if error:
+                ek = _key(f"{name}_errors", labels)
+                self.counters[ek] = self.counters.get(ek, 0) + 1
+        if self.log_path:
+            fields = {"seconds": round(seconds, 6), **labels}
+            if rows:
+                fields["rows"] = rows
+            if error:
+                fields["error"] = error
+            self.event(name, **fields)
+
+    def event(self, name: str, **fields: Any) -> None:
+        """往 JSON 日志写一行 {"ts", "event", ...}，未配置日志文件时忽略。"""
+        if not self.log_path:
+            return
+        line = json.dumps({"ts": round(time.time(), 3), "event": name, **fields}, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._log is None:
+                self._log = open(self.log_path, "a", encoding="utf-8")
+            self._log.write(line + "\n")
+
+    def timer(self, name: str, **labels: Any) -> Timer:
+        return Timer(self, name, labels)
+
+    def timed(self, name: Optional[str] = None, rows: Optional[Callable[[Any], int]] = None, **labels: Any):
+        """装饰器：对每次调用计时；rows 为从返回值计算行数的函数，如 len。"""
+        def decorator(func):
+            metric = name or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                t = self.timer(metric, **labels).start()
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as e:
+                    t.stop(error=type(e).__name__)
+                    raise
+                t.stop(rows=rows(result) if rows is not None else None)
+                return result
+            return wrapper
+        return decorator
+
+    # ---------- 汇总 / 导出 ----------
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """{指标名{标签}: {...}}：计时项含次数、耗时统计、行数和每秒行数；计数项只有 value。"""
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+            out: Dict[str, Dict[str, Any]] = {}
+            timer_counters = set()
+            for (name, labels), h in sorted(histograms.items()):
+                rows = counters.get((f"{name}_rows", labels), 0)
+                errors = counters.get((f"{name}_errors", labels), 0)
+                timer_counters.update({(f"{name}_rows", labels), (f"{name}_errors", labels)})
+                out[name + _label_text(labels)] = {
+                    "count": h.count,
+                    "total_s": round(h.sum, 3),
+                    "mean_ms": round(h.sum / h.count * 1000, 2),
+                    "p50_ms": round(h.quantile(0.5) * 1000, 2),
+                    "p95_ms": round(h.quantile(0.95) * 1000, 2),
+                    "max_ms": round(h.max * 1000, 2),
+                    "rows": rows,
+                    "rows_per_s": round(rows / h.sum, 2) if rows and h.sum else None,
+                    "errors": errors,
+                }
+            for (name, labels), value in sorted(counters.items()):
+                if (name, labels) not in timer_counters:
+                    out[name + _label_text(labels)] = {"value": value}
+        return out
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            by_name: Dict[str, List] = {}
+            for (name, labels), value in self.counters.items():
+                by_name.setdefault(name, []).append((labels, value))
+            for name in sorted(by_name):
+                metric = f"{PROM_PREFIX}{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in sorted(by_name[name]):
+                    lines.append(f"{metric}{_label_text(labels)} {_number(value)}")
+
+            by_name = {}
+            for (name, labels), h in self.histograms.items():
+                by_name.setdefault(name, []).append((labels, h))
+            for name in sorted(by_name):
+                metric = f"{PROM_PREFIX}{name}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for labels, h in sorted(by_name[name], key=lambda x: x[0]):
+                    cumulative = 0
+                    for bound, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                        cumulative += n
+                        lines.append(f"{metric}_bucket{_label_text(labels, (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{metric}_sum{_label_text(labels)} {h.sum:.6f}")
+                    lines.append(f"{metric}_count{_label_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+    def print_summary(self) -> None:
+        items = self.summary()
+        if not items:
+            return
+        print(f"\n运行指标（共 {time.time() - self._started:.1f} 秒）：")
+        print(f"{'指标':<56}{'次数':>8}{'总耗时s':>10}{'平均ms':>10}{'P95ms':>10}{'行/秒':>12}")
+        for name, s in items.items():
+            if "count" in s:
+                rate = s["rows_per_s"] if s["rows_per_s"] is not None else ""
+                print(f"{name:<56}{s['count']:>8}{s['total_s']:>10}{s['mean_ms']:>10}{s['p95_ms']:>10}{rate:>12}")
+        for name, s in items.items():
+            if "value" in s:
+                print(f"{name:<56}{_number(s['value']):>8}")
+
+    def flush(self) -> None:
+        """写出 Prometheus 文件，并把汇总追加到 JSON 日志。"""
+        if self.prom_path:
+            self.write_prometheus(self.prom_path)
+        if self.log_path:
+            self.event("summary", metrics=self.summary())
+        with self._lock:
+            if self._log is not None:
+                self._log.flush()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self._started = time.time()
+
+
+# 进程内共享的默认指标集合，各脚本直接使用下面的模块级函数
+METRICS = Metrics(os.getenv("BILI_METRICS_LOG") or None, os.getenv("BILI_METRICS_PROM") or None)
+
+
+def configure(log_path: Optional[str] = None, prom_path: Optional[str] = None) -> None:
+    METRICS.configure(log_path, prom_path)
+
+
+def timer(name: str, **labels: Any) -> Timer:
+    return METRICS.timer(name, **labels)
+
+
+def timed(name: Optional[str] = None, rows: Optional[Callable[[Any], int]] = None, **labels: Any):
+    return METRICS.timed(name, rows, **labels)
+
+
+def inc(name: str, value: float = 1, **labels: Any) -> None:
+    METRICS.inc(name, value, **labels)
+
+
+def event(name: str, **fields: Any) -> None:
+    METRICS.event(name, **fields)
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    if METRICS.enabled:
+        METRICS.flush()
+        METRICS.print_summary()
@@ -3,12 +3,33 @@ import re
 import time
 import random
 import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 import requests
 import pandas as pd
 
+try:
+    from .rate_limit import AdaptiveThrottle, RateLimiter  # 作为 scripts 包导入（如 notebook）
+    from .http_cache import DEFAULT_CACHE_PATH, ResponseCache, cached_get
+    from .crawl_journal import CrawlJournal
+    from .bili_storage import SEARCH_DTYPES, RowWriter, write_table
+    from .bili_metrics import timed
+    from .session_pool import SessionPool
+    from .bili_store import BiliStore
+except ImportError:
+    from rate_limit import AdaptiveThrottle, RateLimiter  # 在 scripts/ 下直接运行
+    from http_cache import DEFAULT_CACHE_PATH, ResponseCache, cached_get
+    from crawl_journal import CrawlJournal
+    from bili_storage import SEARCH_DTYPES, RowWriter, write_table
+    from bili_metrics import timed
+    from session_pool import SessionPool
+    from bili_store import BiliStore
+
 DEFAULT_HEADERS = {
     "accept": "application/json, text/plain, */*",
     "accept-language": "zh-CN,zh;q=0.9",
@@ -24,6 +45,9 @@ DEFAULT_HEADERS = {
 
 SEARCH_URL = "https://api.bilibili.com/x/web-interface/search/type"
 
+# 并发模式下所有 worker 合计的默认每秒请求数
+DEFAULT_RPS = 2.0
+
 
 def polite_sleep(a=0.8, b=1.5):
     time.sleep(random.uniform(a, b))
@@ -128,14 +152,8 @@ def build_session(cookie: Optional[str], proxies: Optional[Dict[str, str]] = Non
     return s
 
 
-def fetch_search_page(
-    session: requests.Session,
-    keyword: str,
-    page: int,
-    page_size: int = 30,
-) -> Dict[str, Any]:
-
-    params = {
+def search_params(keyword: str, page: int, page_size: int = 30) -> Dict[str, Any]:
+    return {
         "search_type": "video",
         "keyword": keyword,
         "page": page,
@@ -150,17 +168,22 @@ def fetch_search_page(
         "com2co": "true",
     }
 
-    r = session.get(SEARCH_URL, params=params, timeout=(20, 60))
-    return {"status_code": r.status_code, "json": safe_json(r)}
 
+@timed("fetch_search_page")
+def fetch_search_page(
+    session: requests.Session,
+    keyword: str,
+    page: int,
+    page_size: int = 30,
+    cache: Optional[ResponseCache] = None,
+    limiter: Optional[RateLimiter] = None,
+) -> Dict[str, Any]:
 
-def safe_json(resp: requests.Response) -> Optional[Dict[str, Any]]:
-    try:
-        return resp.json()
-    except:
-        return None
+    params = search_params(keyword, page, page_size)
+    return cached_get(session, SEARCH_URL, params, cache, timeout=(20, 60), limiter=limiter)
 
 
+@timed("extract_rows", rows=len)
 def extract_rows(keyword: str, page: int, data_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     rows = []
     for d in data_list:
@@ -212,44 +235,403 @@ def extract_rows(keyword: str, page: int, data_list: List[Dict[str, Any]]) -> Li
     return rows
 
 
+# =========================
+# 列式批量清洗（与 extract_rows 结果一致）
+# =========================
+_SEARCH_RAW_FIELDS = [
+    "title", "description", "author", "uname", "owner", "bvid", "aid",
+    "pubdate", "pub_date", "created", "play", "video_review", "danmaku",
+    "like", "favorites", "favorite", "typename", "type", "tname", "tag", "duration",
+]
+
+
+def _truthy(col: pd.Series) -> pd.Series:
+    """逐元素的 Python 真值判断（None / NaN / "" / 0 为假）。"""
+    if pd.api.types.is_numeric_dtype(col):
+        return col.notna() & (col != 0)
+    obj = col.astype("object")
+    return col.notna() & (obj != "") & (obj != 0)
+
+
+def _is_int(col: pd.Series) -> pd.Series:
+    """逐元素的 isinstance(x, int) 判断；含缺失值的整数列会被 pandas 升为 float，整数值仍按整数处理。"""
+    if pd.api.types.is_float_dtype(col):
+        return col.notna() & (col % 1 == 0)
+    if pd.api.types.is_numeric_dtype(col):
+        return col.notna()
+    return col.map(lambda x: isinstance(x, (int, np.integer)))
+
+
+def _coalesce(raw: pd.DataFrame, cols: List[str]) -> pd.Series:
+    """等价于 d.get(a) or d.get(b) or ...，最后一列原样兜底。"""
+    out = raw[cols[0]]
+    for c in cols[1:]:
+        ok = _truthy(out)
+        if ok.all():
+            break
+        out = out.where(ok, raw[c])
+    return out
+
+
+def _text_dtype() -> str:
+    # 有 pyarrow 时字符串运算走 Arrow 的向量化实现，否则退回 Python 对象
+    try:
+        import pyarrow  # noqa: F401
+        return "string[pyarrow]"
+    except ImportError:
+        return "string"
+
+
+def _map_uniques(col: pd.Series, func: Callable[[pd.Series], pd.Series]) -> pd.Series:
+    """
+    只对去重后的取值计算 func，再按编码映射回整列。
+    计数、时长这类列重复值很多（'1.2万'、'12:34'），去重后量级小得多。
+    空值映射为 NA。
+    """
+    codes, uniques = pd.factorize(col)
+    res = func(pd.Series(uniques, dtype="object"))
+    return pd.Series(res.array.take(codes, allow_fill=True), index=col.index)
+
+
+def strip_html_series(col: pd.Series) -> pd.Series:
+    return (
+        col.where(_truthy(col), "")
+        .astype(_text_dtype())
+        .str.replace(r"<[^>]+>", "", regex=True)
+        .str.strip()
+    )
+
+
+def _cn_numbers_unique(col: pd.Series) -> pd.Series:
+    s = col.str.strip()  # 非字符串元素为 NaN
+    nums = pd.to_numeric(col.where(s.isna()), errors="coerce")
+    out = pd.Series(nums.to_numpy(dtype="float64"), index=col.index)
+
+    is_digit = s.str.fullmatch(r"\d+").eq(True)
+    out[is_digit] = pd.to_numeric(s[is_digit], errors="coerce")
+
+    unit = s.str.extract(r"^([\d.]+)\s*([万亿])")
+    scale = unit[1].map({"万": 10000, "亿": 100000000})
+    has_unit = ~is_digit & scale.notna()
+    out[has_unit] = pd.to_numeric(unit[0][has_unit], errors="coerce") * scale[has_unit]
+
+    rest = s.notna() & (s != "") & ~is_digit & ~has_unit
+    joined = s[rest].str.findall(r"\d+").str.join("")
+    out[rest] = pd.to_numeric(joined.where(joined != ""), errors="coerce")
+
+    return np.trunc(out).astype("Int64")
+
+
+def cn_numbers_to_int(col: pd.Series) -> pd.Series:
+    """
+    cn_number_to_int 的列式版本，返回 Int64 列：
+    数字原样取整；字符串支持纯数字、'1.2万' / '3亿'，否则拼接其中的所有数字。
+    """
+    if pd.api.types.is_numeric_dtype(col):
+        return np.trunc(col.astype("float64")).astype("Int64")
+    return _map_uniques(col, _cn_numbers_unique)
+
+
+def _parse_duration_unique(col: pd.Series) -> pd.Series:
+    s = col.astype("string").str.strip()
+
+    is_sec = ~s.str.contains(":", regex=False).fillna(False) & s.str.fullmatch(r"\d+").fillna(False)
+    sec = pd.to_numeric(s[is_sec]).astype("int64")
+    h, m, ss = sec // 3600, (sec % 3600) // 60, sec % 60
+
+    def two(x):
+        return x.astype("string").str.zfill(2)
+
+    mmss = two(m) + ":" + two(ss)
+    s[is_sec] = mmss.where(h == 0, two(h) + ":" + mmss)
+    return s
+
+
+def parse_duration_series(col: pd.Series) -> pd.Series:
+    """parse_duration 的列式版本：纯秒数转为 'mm:ss' / 'hh:mm:ss'，其余原样保留。"""
+    if pd.api.types.is_numeric_dtype(col):
+        col = col.astype("Int64").astype("object")
+    return _map_uniques(col, _parse_duration_unique)
+
+
+def format_local_ts(ts: pd.Series) -> pd.Series:
+    """
+    整数时间戳按本地时区格式化为 '%Y-%m-%d %H:%M:%S'，与 datetime.fromtimestamp 一致。
+    UTC 偏移按天计算；当天内发生夏令时切换的少数行逐行计算。
+    """
+    valid = ts.dropna().astype("int64")
+    out = pd.Series(pd.NA, index=ts.index, dtype="string")
+    if valid.empty:
+        return out
+
+    day_start = valid // 86400 * 86400
+    days = pd.unique(day_start)
+    offset_start = {d: datetime.fromtimestamp(d).astimezone().utcoffset().total_seconds() for d in days}
+    offset_end = {d: datetime.fromtimestamp(d + 86399).astimezone().utcoffset().total_seconds() for d in days}
+
+    offset = day_start.map(offset_start)
+    stable = day_start.map(offset_end) == offset
+
+    local = (valid[stable] + offset[stable].astype("int64")).to_numpy().astype("datetime64[s]")
+    text = np.char.replace(np.datetime_as_string(local, unit="s"), "T", " ")
+    out[valid.index[stable]] = text
+    for idx in valid.index[~stable]:
+        out[idx] = datetime.fromtimestamp(int(valid[idx])).strftime("%Y-%m-%d %H:%M:%S")
+    return out
+
+
+@timed("normalize_search_results", rows=len)
+def normalize_search_results(keyword: str, raw_pages: Iterable[Tuple[int, List[Dict[str, Any]]]]) -> pd.DataFrame:
+    """
+    extract_rows 的列式批量版本：输入多页原始 result 列表 [(page, data_list), ...]，
+    用 pandas 字符串 / 数组运算一次性完成 HTML 清理、'万/亿' 计数解析和时间戳转换。
+    适合对大量缓存的原始数据重新清洗。输出列与 extract_rows 相同。
+    """
+    records, page_col = [], []
+    for page, data_list in raw_pages:
+        records.extend(data_list)
+        page_col.extend([page] * len(data_list))
+
+    raw = pd.DataFrame.from_records(records).reindex(columns=_SEARCH_RAW_FIELDS)
+    raw.index = pd.RangeIndex(len(raw))
+
+    pub_cols = ["pubdate", "pub_date", "created"]
+    pub_ts = _coalesce(raw, pub_cols)
+    # 与 isinstance(pub_ts, int) 一致：按每行实际取值的那一列判断，字符串等其他类型不转换
+    is_int_ts = _is_int(raw[pub_cols[-1]])
+    for c in reversed(pub_cols[:-1]):
+        is_int_ts = _is_int(raw[c]).where(_truthy(raw[c]), is_int_ts)
+
+    author = _coalesce(raw, ["author", "uname"])
+    author = author.where(_truthy(author), raw["owner"].fillna(""))
+
+    bvid = raw["bvid"]
+    has_bvid = _truthy(bvid)
+
+    df = pd.DataFrame({
+        "keyword": keyword,
+        "page": page_col,
+        "title": strip_html_series(raw["title"]),
+        "author": author,
+        "bvid": bvid,
+        "aid": raw["aid"],
+        "pub_ts": pub_ts,
+        "pub_time": format_local_ts(pd.to_numeric(pub_ts.where(is_int_ts), errors="coerce")),
+        "duration": parse_duration_series(raw["duration"]),
+        "danmaku": cn_numbers_to_int(_coalesce(raw, ["video_review", "danmaku"])),
+        "like": cn_numbers_to_int(raw["like"]),
+        "view": cn_numbers_to_int(raw["play"]),
+        "favorite": cn_numbers_to_int(_coalesce(raw, ["favorites", "favorite"])),
+        "type_name": _coalesce(raw, ["typename", "type", "tname"]),
+        "tag": raw["tag"],
+        "description": strip_html_series(raw["description"]),
+        "link": ("https://www.bilibili.com/video/" + bvid.astype(_text_dtype())).where(has_bvid),
+    })
+    return df
+
+
+def load_cached_search_pages(
+    cache: ResponseCache,
+    keyword: str,
+    pages: int,
+    page_size: int = 30,
+) -> List[Tuple[int, List[Dict[str, Any]]]]:
+    """从本地响应缓存中取出某关键词各页的原始 result 列表（不发请求），遇到未缓存的页停止。"""
+    raw_pages = []
+    for page in range(1, pages + 1):
+        j = cache.get(SEARCH_URL, search_params(keyword, page, page_size))
+        if j is None:
+            break
+        raw_pages.append((page, (j.get("data", {}) or {}).get("result", []) or []))
+    return raw_pages
+
+
+def check_search_response(resp: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    校验 fetch_search_page 的返回，出错时抛 RuntimeError，
+    正常时返回 data.result 列表。
+    """
+    code = resp["status_code"]
+    j = resp["json"]
+
+    # 412 常见反爬
+    if code == 412:
+        raise RuntimeError(
+            "触发 HTTP 412（疑似反爬），退避重试后仍未恢复。\n"
+            "解决办法：\n"
+            "1) 使用自己浏览器的 Cookie\n"
+            "   - 方式A：命令行参数 --cookie \"...\"\n"
+            "   - 方式B：环境变量 BILI_COOKIE\n"
+            "   - 方式C：放到同目录 cookie.txt\n"
+            "2) 降低 pages / rps，或使用 --adaptive 自适应限速。\n"
+        )
+    if code != 200 or not j:
+        raise RuntimeError(f"请求失败：status={code}, json解析={bool(j)}")
+
+    if j.get("code") != 0:
+        raise RuntimeError(f"接口返回非0 code：{j.get('code')}, msg={j.get('message')}")
+
+    return (j.get("data", {}) or {}).get("result", []) or []
+
+
+PageRows = Tuple[int, List[Dict[str, Any]]]
+PageCallback = Callable[[int, List[Dict[str, Any]]], None]
+
+
+def _iter_pages_sequential(
+    session: requests.Session,
+    keyword: str,
+    todo: List[int],
+    page_size: int,
+    cache: Optional[ResponseCache] = None,
+    on_page: Optional[PageCallback] = None,
+) -> Iterator[PageRows]:
+    for page in todo:
+        resp = fetch_search_page(session, keyword, page, page_size, cache=cache)
+        data_list = check_search_response(resp)
+        rows = extract_rows(keyword, page, data_list)
+        if on_page is not None:
+            on_page(page, rows)
+        yield page, rows
+
+        # 命中缓存没有发请求，不用等待
+        if not resp.get("from_cache"):
+            polite_sleep()
+
+
+def _iter_pages_concurrent(
+    keyword: str,
+    todo: List[int],
+    page_size: int,
+    cookie: Optional[str],
+    proxies: Optional[Dict[str, str]],
+    workers: int,
+    limiter: RateLimiter,
+    cache: Optional[ResponseCache] = None,
+    on_page: Optional[PageCallback] = None,
+    pool: Optional[SessionPool] = None,
+) -> Iterator[PageRows]:
+    # requests.Session 不保证线程安全，每个 worker 线程各建一个；传入 pool 时各线程共用会话池
+    local = threading.local()
+
+    def fetch_rows(page: int) -> List[Dict[str, Any]]:
+        if pool is not None:
+            local.session = pool
+        elif not hasattr(local, "session"):
+            local.session = build_session(cookie, proxies=proxies)
+        resp = fetch_search_page(local.session, keyword, page, page_size, cache=cache, limiter=limiter)
+        data_list = check_search_response(resp)
+        rows = extract_rows(keyword, page, data_list)
+        # 在 worker 内记录日志：即使之前的页失败，已完成的页也不会丢
+        if on_page is not None:
+            on_page(page, rows)
+        return rows
+
+    # 最多提前提交 2*workers 页，内存占用不随总页数增长
+    pages = iter(todo)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for page in pages:
+                pending.append((page, executor.submit(fetch_rows, page)))
+                if len(pending) >= workers * 2:
+                    break
+            while pending:
+                page, fut = pending.popleft()
+                rows = fut.result()
+                nxt = next(pages, None)
+                if nxt is not None:
+                    pending.append((nxt, executor.submit(fetch_rows, nxt)))
+                yield page, rows
+        finally:
+            for _, fut in pending:
+                fut.cancel()
+
+
+def iter_search_pages(
+    keyword: str,
+    pages: int = 3,
+    page_size: int = 30,
+    cookie: Optional[str] = None,
+    proxies: Optional[Dict[str, str]] = None,
+    workers: int = 1,
+    rps: Optional[float] = None,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CrawlJournal] = None,
+    resume: bool = False,
+    adaptive: bool = False,
+    pool: Optional[SessionPool] = None,
+) -> Iterator[PageRows]:
+    """
+    按页码顺序逐页产出 (page, rows)。参数含义见 crawl_bilibili_search。
+    """
+    done: Dict[int, List[Dict[str, Any]]] = {}
+    on_page = None
+    if journal is not None:
+        journal.start({"keyword": keyword, "page_size": page_size}, resume=resume)
+        done = {e["page"]: e["rows"] for e in journal.entries}
+        journal.entries = []
+        if done:
+            print(f"[INFO] 从日志恢复 {len(done)} 页：{journal.path}")
+
+        def on_page(page, rows):
+            journal.append({"page": page, "rows": rows})
+
+    todo = [page for page in range(1, pages + 1) if page not in done]
+
+    if workers <= 1 and rps is None and not adaptive:
+        session = pool if pool is not None else build_session(cookie, proxies=proxies)
+        fetched = _iter_pages_sequential(session, keyword, todo, page_size, cache=cache, on_page=on_page)
+    else:
+        limiter = AdaptiveThrottle(rps or DEFAULT_RPS) if adaptive else RateLimiter(rps or DEFAULT_RPS)
+        fetched = _iter_pages_concurrent(
+            keyword, todo, page_size, cookie, proxies, max(1, workers), limiter,
+            cache=cache, on_page=on_page, pool=pool,
+        )
+
+    # todo 按页码升序产出，与日志中已完成的页合并后仍按页码顺序
+    for page in range(1, pages + 1):
+        if page in done:
+            yield page, done.pop(page)
+        else:
+            yield next(fetched)
+
+
 def crawl_bilibili_search(
     keyword: str,
     pages: int = 3,
     page_size: int = 30,
     cookie: Optional[str] = None,
     proxies: Optional[Dict[str, str]] = None,
+    workers: int = 1,
+    rps: Optional[float] = None,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CrawlJournal] = None,
+    resume: bool = False,
+    adaptive: bool = False,
+    pool: Optional[SessionPool] = None,
+    store: Optional[BiliStore] = None,
 ) -> pd.DataFrame:
-    session = build_session(cookie, proxies=proxies)
-
+    """
+    workers=1 且未指定 rps 时逐页爬取（每页之后 polite_sleep）；
+    否则用 workers 个线程并发爬取，所有线程共享 rps 的每秒请求预算。
+    adaptive=True 时 rps 只是初始速率：响应正常时逐步提速，遇到 412 / 429 / 5xx
+    时减速并让所有线程一起退避（见 rate_limit.AdaptiveThrottle）。
+    无论哪种模式，被限流的页都会退避后自动重试，重试用尽才报错。
+    传入 pool（session_pool.SessionPool）时在多个 Cookie / 代理之间轮换，
+    被限流的身份自动冷却，cookie / proxies 参数不再使用。
+    传入 cache 时优先读本地缓存，命中的页不发请求、不休眠。
+    传入 journal 时每完成一页就连同该页的行写入日志；resume=True 时
+    跳过日志中已完成的页，只爬剩下的。
+    传入 store（bili_store.BiliStore）时每页的行同时 upsert 进本地分析库。
+    """
     all_rows = []
-    for page in range(1, pages + 1):
-        resp = fetch_search_page(session, keyword, page, page_size)
-
-        code = resp["status_code"]
-        j = resp["json"]
-
-        # 412 常见反爬
-        if code == 412:
-            raise RuntimeError(
-                "触发 HTTP 412（疑似反爬）。\n"
-                "解决办法：\n"
-                "1) 使用自己浏览器的 Cookie\n"
-                "   - 方式A：命令行参数 --cookie \"...\"\n"
-                "   - 方式B：环境变量 BILI_COOKIE\n"
-                "   - 方式C：放到同目录 cookie.txt\n"
-                "2) 降低 pages / 增加 sleep。\n"
-            )
-        if code != 200 or not j:
-            raise RuntimeError(f"请求失败：status={code}, json解析={bool(j)}")
-
-        if j.get("code") != 0:
-            raise RuntimeError(f"接口返回非0 code：{j.get('code')}, msg={j.get('message')}")
-
-        data_list = (j.get("data", {}) or {}).get("result", []) or []
-        rows = extract_rows(keyword, page, data_list)
+    for _, rows in iter_search_pages(
+        keyword, pages, page_size, cookie, proxies, workers, rps, cache, journal, resume, adaptive, pool
+    ):
         all_rows.extend(rows)
-
-        polite_sleep()
+        if store is not None:
+            store.upsert_videos(rows)
 
     df = pd.DataFrame(all_rows)
 
@@ -260,6 +642,46 @@ def crawl_bilibili_search(
     return df
 
 
+def crawl_bilibili_search_to_file(
+    out: str,
+    keyword: str,
+    pages: int = 3,
+    page_size: int = 30,
+    cookie: Optional[str] = None,
+    proxies: Optional[Dict[str, str]] = None,
+    workers: int = 1,
+    rps: Optional[float] = None,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CrawlJournal] = None,
+    resume: bool = False,
+    batch_size: int = 1000,
+    adaptive: bool = False,
+    pool: Optional[SessionPool] = None,
+    store: Optional[BiliStore] = None,
+) -> int:
+    """
+    流式版 crawl_bilibili_search：每页的行按批直接写入 out（.csv / .parquet），
+    不在内存中累积全部结果。按 bvid 去重改为增量的 seen 集合。
+    传入 store 时每页的行同时 upsert 进本地分析库。
+    返回写入的行数。
+    """
+    seen = set()
+    with RowWriter(out, batch_size=batch_size, dtypes=SEARCH_DTYPES) as writer:
+        for _, rows in iter_search_pages(
+            keyword, pages, page_size, cookie, proxies, workers, rps, cache, journal, resume, adaptive, pool
+        ):
+            fresh = []
+            for row in rows:
+                if row["bvid"] in seen:
+                    continue
+                seen.add(row["bvid"])
+                fresh.append(row)
+            writer.write_rows(fresh)
+            if store is not None:
+                store.upsert_videos(rows)
+    return writer.rows_written
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="B站搜索结果爬取"
@@ -267,10 +689,20 @@ def main():
     parser.add_argument("--keyword", required=True, help="搜索关键词")
     parser.add_argument("--pages", type=int, default=3, help="爬取页数")
     parser.add_argument("--page_size", type=int, default=30, help="每页数量（默认30）")
-    parser.add_argument("--out", default="search.csv", help="输出CSV文件名")
+    parser.add_argument("--out", default="search.csv", help="输出文件名（.csv 或 .parquet）")
     parser.add_argument("--cookie", default=None, help="B站Cookie")
 
     parser.add_argument("--proxy", default=None, help="HTTP代理，如 http://127.0.0.1:7897")
+    parser.add_argument("--workers", type=int, default=1, help="并发线程数（默认1，即逐页爬取）")
+    parser.add_argument("--rps", type=float, default=None, help=f"并发模式下每秒请求数上限（默认{DEFAULT_RPS}）")
+    parser.add_argument("--cache", default=None, help="本地响应缓存文件，如 bili_http_cache.sqlite")
+    parser.add_argument("--offline", action="store_true", help="只读缓存，不发网络请求（需配合 --cache）")
+    parser.add_argument("--resume", action="store_true", help="从进度日志 {out}.journal.jsonl 断点续爬")
+    parser.add_argument("--adaptive", action="store_true", help="自适应限速：正常时逐步提速，被限流时减速退避（--rps 为初始速率）")
+    parser.add_argument("--cookie_file", default=None, help="多身份文件（每行一个 Cookie，可附代理），在各身份间轮换")
+    parser.add_argument("--pool_strategy", choices=["round_robin", "least_loaded"], default="round_robin",
+                        help="多身份的分配方式：轮询 / 在途请求最少")
+    parser.add_argument("--store", default=None, help="同时写入本地分析库（SQLite），如 bili_store.sqlite")
 
     args = parser.parse_args()
 
@@ -280,16 +712,44 @@ def main():
     if args.proxy:
         proxies = {"http": args.proxy, "https": args.proxy}
 
-    df = crawl_bilibili_search(
+    pool = None
+    if args.cookie_file:
+        pool = SessionPool.from_file(args.cookie_file, build=build_session, strategy=args.pool_strategy)
+        print(f"[INFO] 从 {args.cookie_file} 加载 {len(pool)} 个身份")
+
+    cache = None
+    if args.cache or args.offline:
+        cache = ResponseCache(args.cache or DEFAULT_CACHE_PATH, offline=args.offline)
+
+    store = BiliStore(args.store) if args.store else None
+
+    # 每页完成即写入进度日志，中途失败后可用 --resume 续爬
+    journal = CrawlJournal(f"{args.out}.journal.jsonl")
+
+    n = crawl_bilibili_search_to_file(
+        out=args.out,
         keyword=args.keyword,
         pages=args.pages,
         page_size=args.page_size,
         cookie=cookie,
         proxies=proxies,
+        workers=args.workers,
+        rps=args.rps,
+        cache=cache,
+        journal=journal,
+        resume=args.resume,
+        adaptive=args.adaptive,
+        pool=pool,
+        store=store,
     )
 
-    df.to_csv(args.out, index=False, encoding="utf_8_sig")
-    print(f"[OK] 保存完成：{args.out}  行数={len(df)}")
+    if pool is not None:
+        pool.print_stats()
+    if store is not None:
+        store.close()
+        print(f"[OK] 已写入本地分析库：{args.store}")
+    journal.remove()
+    print(f"[OK] 保存完成：{args.out}  行数={n}")
 
 
 if __name__ == "__main__":
@@ -299,6 +759,10 @@ if __name__ == "__main__":
     out = f"{keyword}_搜索.csv" # 输出的文件名
     page_size = 30 # 每页数量（默认30）
     proxy = None # 如不使用代理，设为 None
+    workers = 1 # 并发线程数（1 为逐页爬取）
+    rps = None # 并发模式下每秒请求数上限（None 为默认值）
+    resume = False # 是否从进度日志断点续爬
+    adaptive = False # 是否自适应限速（被限流时自动减速重试，正常时逐步提速）
 
     cookie = load_cookie(None)
 
@@ -306,14 +770,22 @@ if __name__ == "__main__":
     if proxy:
         proxies = {"http": proxy, "https": proxy}
 
+    journal = CrawlJournal(f"{out}.journal.jsonl")
+
     df = crawl_bilibili_search(
         keyword=keyword,
         pages=pages,
         page_size=page_size,
         cookie=cookie,
         proxies=proxies,
+        workers=workers,
+        rps=rps,
+        journal=journal,
+        resume=resume,
+        adaptive=adaptive,
     )
 
-    df.to_csv(out, index=False, encoding="utf_8_sig")
+    write_table(df, out, dtypes=SEARCH_DTYPES)  # out 以 .parquet 结尾时写 Parquet
+    journal.remove()
     print(f"[OK] 保存完成：{out}  行数={len(df)}")
 
@@ -0,0 +1,232 @@
+"""
+结果落盘与读取
+功能：
+1. 搜索结果、评论等表的显式列类型（计数列为整数，author / type_name 为字典编码）
+2. RowWriter：按批把行写入 CSV / Parquet（按扩展名选择格式），内存占用与总行数无关
+3. write_table / read_table：整表读写，读 Parquet 时只加载需要的列
+4. iter_table_chunks：按块读取，内存占用与总行数无关
+"""
+
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+# {keyword}_搜索.csv 的列类型
+SEARCH_DTYPES = {
+    "keyword": "category",
+    "page": "Int64",
+    "title": "string",
+    "author": "category",
+    "bvid": "string",
+    "aid": "Int64",
+    "pub_ts": "Int64",
+    "pub_time": "string",
+    "duration": "string",
+    "danmaku": "Int64",
+    "like": "Int64",
+    "view": "Int64",
+    "favorite": "Int64",
+    "type_name": "category",
+    "tag": "string",
+    "description": "string",
+    "link": "string",
+}
+
+# {bvid}_comments.csv 的列类型
+COMMENT_DTYPES = {
+    "bvid": "string",
+    "rpid": "Int64",
+    "mid": "Int64",
+    "uname": "string",
+    "content": "string",
+    "like": "Int64",
+    "ctime": "Int64",
+    "root": "Int64",
+    "parent": "Int64",
+}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("写入 Parquet 需要安装 pyarrow：pip install pyarrow")
+    return pa, pq
+
+
+def apply_dtypes(df: pd.DataFrame, dtypes: Optional[Dict[str, str]]) -> pd.DataFrame:
+    """把 df 中出现在 dtypes 里的列转换为对应类型，其余列不动。"""
+    if not dtypes:
+        return df
+    return df.astype({c: t for c, t in dtypes.items() if c in df.columns})
+
+
+def arrow_schema(df: pd.DataFrame, dtypes: Optional[Dict[str, str]] = None):
+    """
+    按 dtypes 生成固定的 Arrow schema，保证分批写入时每批类型一致；
+    不在 dtypes 中的列按第一批推断，全为空的列按字符串处理。
+    """
+    pa, _ = _import_pyarrow()
+    type_map = {
+        "Int64": pa.int64(),
+        "Float64": pa.float64(),
+        "string": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+    }
+    inferred = pa.Table.from_pandas(df, preserve_index=False).schema
+    fields = []
+    for f in inferred:
+        t = (dtypes or {}).get(f.name)
+        if t in type_map:
+            fields.append(pa.field(f.name, type_map[t]))
+        elif pa.types.is_null(f.type):
+            fields.append(pa.field(f.name, pa.string()))
+        else:
+            fields.append(f)
+    return pa.schema(fields)
+
+
+def find_table(stem: str) -> str:
+    """
+    给定不带扩展名的文件名（如 "深度学习_搜索"），优先返回已存在的 .parquet，
+    否则返回 .csv。已带扩展名时原样返回。
+    """
+    if stem.endswith((".csv", ".parquet")):
+        return stem
+    if os.path.exists(stem + ".parquet"):
+        return stem + ".parquet"
+    return stem + ".csv"
+
+
+def write_table(df: pd.DataFrame, path: str, dtypes: Optional[Dict[str, str]] = None) -> None:
+    if str(path).endswith(".parquet"):
+        pa, pq = _import_pyarrow()
+        df = apply_dtypes(df, dtypes)
+        table = pa.Table.from_pandas(df, schema=arrow_schema(df, dtypes), preserve_index=False)
+        pq.write_table(table, path)
+    else:
+        df.to_csv(path, index=False, encoding="utf_8_sig")
+
+
+def read_table(
+    path: str,
+    columns: Optional[List[str]] = None,
+    dtypes: Optional[Dict[str, str]] = None,
+) -> pd.DataFrame:
+    """
+    读取 CSV / Parquet。columns 指定只读哪些列（Parquet 只解码这些列），
+    dtypes 指定列类型（如 SEARCH_DTYPES）。
+    """
+    if str(path).endswith(".parquet"):
+        _import_pyarrow()
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_csv(path, usecols=columns, encoding="utf_8_sig")
+    return apply_dtypes(df, dtypes)
+
+
+def iter_table_chunks(
+    path: str,
+    columns: Optional[List[str]] = None,
+    chunk_size: int = 100000,
+    dtypes: Optional[Dict[str, str]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    按块读取 CSV / Parquet，每次产出最多 chunk_size 行的 DataFrame。
+    CSV 按 dtypes 直接解析（避免每块各自推断出不同的类型），Parquet 按 row group 分批解码。
+    """
+    if str(path).endswith(".parquet"):
+        _, pq = _import_pyarrow()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield apply_dtypes(batch.to_pandas(), dtypes)
+    else:
+        yield from pd.read_csv(
+            path, usecols=columns, encoding="utf_8_sig", chunksize=chunk_size, dtype=dtypes
+        )
+
+
+class RowWriter:
+    """
+    用法：
+        with RowWriter("Python_搜索.csv") as writer:
+            for rows in pages:
+                writer.write_rows(rows)
+
+    path:       输出文件，.parquet 结尾写 Parquet，否则写 UTF-8-BOM 的 CSV
+    columns:    列顺序，默认取第一批行的键
+    batch_size: 攒够多少行写一次盘
+    dtypes:     列类型（如 SEARCH_DTYPES），写 Parquet 时据此固定 schema
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: Optional[List[str]] = None,
+        batch_size: int = 1000,
+        dtypes: Optional[Dict[str, str]] = None,
+    ):
+        self.path = path
+        self.columns = columns
+        self.dtypes = dtypes
+        self.batch_size = batch_size
+        self.is_parquet = str(path).endswith(".parquet")
+        self.rows_written = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._started = False
+        self._pq_writer = None
+        self._pa_schema = None
+
+    def __enter__(self) -> "RowWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write_rows(self, rows: Iterable[Dict[str, Any]]) -> None:
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        if self.columns is None:
+            self.columns = list(self._buffer[0].keys())
+        df = pd.DataFrame(self._buffer, columns=self.columns)
+        self._buffer = []
+
+        if self.is_parquet:
+            self._write_parquet(df)
+        elif not self._started:
+            # 只有第一批写 BOM 和表头，之后追加
+            df.to_csv(self.path, index=False, encoding="utf_8_sig")
+        else:
+            df.to_csv(self.path, mode="a", index=False, header=False, encoding="utf-8")
+
+        self._started = True
+        self.rows_written += len(df)
+
+    def _write_parquet(self, df: pd.DataFrame) -> None:
+        pa, pq = _import_pyarrow()
+        df = apply_dtypes(df, self.dtypes)
+        if self._pq_writer is None:
+            self._pa_schema = arrow_schema(df, self.dtypes)
+            self._pq_writer = pq.ParquetWriter(self.path, self._pa_schema)
+        table = pa.Table.from_pandas(df, schema=self._pa_schema, preserve_index=False)
+        self._pq_writer.write_table(table)
+
+    def close(self) -> None:
+        self.flush()
+        if not self._started:
+            # 一行都没写时也生成只有表头（Parquet 为只有 schema）的空文件，列取 columns 或 dtypes
+            empty = pd.DataFrame(columns=self.columns or list(self.dtypes or {}))
+            if self.is_parquet:
+                self._write_parquet(empty)
+            else:
+                empty.to_csv(self.path, index=False, encoding="utf_8_sig")
+            self._started = True
+        if self._pq_writer is not None:
+            self._pq_writer.close()
+            self._pq_writer = None
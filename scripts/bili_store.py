@@ -0,0 +1,368 @@
+"""
+本地分析库（SQLite，WAL 模式）
+功能：
+1. 三张主表：videos（按 bvid 去重）、comments（按 rpid 去重）、sentiments（按 rpid + 模型去重），
+   另有 video_keywords 记录视频出现在哪些关键词的搜索结果中
+2. 爬虫可直接 upsert：重复爬到的视频 / 评论只更新播放量、点赞等字段，不会产生重复行
+3. 在 bvid / author / keyword / pub_ts / view 等常用过滤列上建索引，查询时把
+   “关键词 X、最近 7 天、播放量 > 1 万”这类条件下推到 SQL，只读出需要的行和列
+4. 可把已有的 {keyword}_搜索.csv / {bvid}_comments.csv 等文件导入库中
+
+用法示例：
+    python bili_store.py --import 深度学习_搜索.csv --import BV1xx411c7mD_comments.csv
+    python bili_store.py --keyword 深度学习 --days 7 --min_view 10000 --limit 20
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+try:
+    from .bili_storage import COMMENT_DTYPES, SEARCH_DTYPES, apply_dtypes, iter_table_chunks  # 作为 scripts 包导入
+except ImportError:
+    from bili_storage import COMMENT_DTYPES, SEARCH_DTYPES, apply_dtypes, iter_table_chunks  # 在 scripts/ 下直接运行
+
+DEFAULT_STORE_PATH = "bili_store.sqlite"
+
+# videos 表的列：搜索结果去掉 keyword / page（这两列放在 video_keywords 中）
+VIDEO_COLUMNS = [c for c in SEARCH_DTYPES if c not in ("keyword", "page")]
+COMMENT_COLUMNS = list(COMMENT_DTYPES)
+SENTIMENT_DTYPES = {"sentiment_label": "Int64", "judgment_reason": "string", "sentiment_tier": "string"}
+
+Keywords = Union[str, Sequence[str], None]
+
+
+def _q(column: str) -> str:
+    # like / view 等列名与 SQL 关键字冲突，统一加引号
+    return f'"{column}"'
+
+
+def _sql_type(dtype: str) -> str:
+    return "INTEGER" if dtype == "Int64" else "TEXT"
+
+
+def _clean(value: Any) -> Any:
+    """pandas 的缺失值转成 None，numpy 数值转成 Python 数值，便于写入 SQLite。"""
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value.item() if hasattr(value, "item") else value
+
+
+def _as_list(values: Keywords) -> List[str]:
+    if values is None:
+        return []
+    return [values] if isinstance(values, str) else list(values)
+
+
+def _marks(n: int) -> str:
+    return ",".join("?" * n)
+
+
+class BiliStore:
+    """
+    用法：
+        store = BiliStore("bili_store.sqlite")
+        store.upsert_videos(rows)          # 搜索结果的行（extract_rows 的输出）
+        store.upsert_comments(rows)        # 评论行，需带 bvid
+        df = store.query_videos(keyword="深度学习", days=7, min_view=10000)
+        for chunk in store.iter_videos(columns=["title"], keyword="深度学习"):
+            ...
+
+    写入在同一连接上加锁串行执行，可在多个爬虫线程间共用；
+    iter_* 每次打开单独的只读连接，WAL 模式下读取不会阻塞写入。
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        video_cols = ", ".join(
+            f"{_q(c)} {_sql_type(SEARCH_DTYPES[c])}" + (" PRIMARY KEY" if c == "bvid" else "")
+            for c in VIDEO_COLUMNS
+        )
+        comment_cols = ", ".join(
+            f"{_q(c)} {_sql_type(COMMENT_DTYPES[c])}" + (" PRIMARY KEY" if c == "rpid" else "")
+            for c in COMMENT_COLUMNS
+        )
+        self._conn.executescript(
+            f"CREATE TABLE IF NOT EXISTS videos ({video_cols}, updated REAL);"
+            "CREATE TABLE IF NOT EXISTS video_keywords ("
+            " keyword TEXT, bvid TEXT, page INTEGER, PRIMARY KEY (keyword, bvid));"
+            f"CREATE TABLE IF NOT EXISTS comments ({comment_cols}, updated REAL);"
+            "CREATE TABLE IF NOT EXISTS sentiments ("
+            " rpid INTEGER, model TEXT, prompt_version TEXT, label INTEGER, reason TEXT, tier TEXT,"
+            " created REAL, PRIMARY KEY (rpid, model));"
+            "CREATE INDEX IF NOT EXISTS idx_videos_author ON videos (author);"
+            "CREATE INDEX IF NOT EXISTS idx_videos_pub_ts ON videos (pub_ts);"
+            'CREATE INDEX IF NOT EXISTS idx_videos_view ON videos ("view");'
+            "CREATE INDEX IF NOT EXISTS idx_video_keywords_bvid ON video_keywords (bvid);"
+            "CREATE INDEX IF NOT EXISTS idx_comments_bvid ON comments (bvid);"
+            "CREATE INDEX IF NOT EXISTS idx_comments_ctime ON comments (ctime);"
+        )
+        self._conn.commit()
+
+    def __enter__(self) -> "BiliStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ---------- 写入 ----------
+
+    def _upsert(self, table: str, columns: List[str], key: str, rows: List[tuple]) -> None:
+        names = ", ".join(_q(c) for c in columns)
+        updates = ", ".join(f"{_q(c)} = excluded.{_q(c)}" for c in columns if c != key)
+        self._conn.executemany(
+            f"INSERT INTO {table} ({names}, updated) VALUES ({_marks(len(columns) + 1)})"
+            f" ON CONFLICT ({_q(key)}) DO UPDATE SET {updates}, updated = excluded.updated",
+            rows,
+        )
+
+    def upsert_videos(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """写入搜索结果行：按 bvid 插入或更新，行中带 keyword 时同时记录视频-关键词关联。返回写入的视频数。"""
+        now = time.time()
+        videos, links = [], []
+        for row in rows:
+            bvid = _clean(row.get("bvid"))
+            if not bvid:
+                continue
+            videos.append(tuple(_clean(row.get(c)) for c in VIDEO_COLUMNS) + (now,))
+            keyword = _clean(row.get("keyword"))
+            if keyword:
+                links.append((keyword, bvid, _clean(row.get("page"))))
+        with self._lock:
+            self._upsert("videos", VIDEO_COLUMNS, "bvid", videos)
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO video_keywords (keyword, bvid, page) VALUES (?, ?, ?)", links
+            )
+            self._conn.commit()
+        return len(videos)
+
+    def upsert_comments(self, rows: Iterable[Dict[str, Any]], bvid: Optional[str] = None) -> int:
+        """写入评论行：按 rpid 插入或更新。行中没有 bvid 时用参数 bvid。返回写入的评论数。"""
+        now = time.time()
+        values = []
+        for row in rows:
+            if _clean(row.get("rpid")) is None:
+                continue
+            row = dict(row, bvid=_clean(row.get("bvid")) or bvid)
+            values.append(tuple(_clean(row.get(c)) for c in COMMENT_COLUMNS) + (now,))
+        with self._lock:
+            self._upsert("comments", COMMENT_COLUMNS, "rpid", values)
+            self._conn.commit()
+        return len(values)
+
+    def upsert_sentiments(self, df: pd.DataFrame, model: str, prompt_version: str = "") -> int:
+        """写入 api_comments.classify_comments 的结果（需有 rpid / sentiment_label / judgment_reason 列）。"""
+        now = time.time()
+        tiers = df["sentiment_tier"] if "sentiment_tier" in df.columns else [None] * len(df)
+        values = [
+            (_clean(rpid), model, prompt_version, _clean(label), _clean(reason), _clean(tier), now)
+            for rpid, label, reason, tier in zip(df["rpid"], df["sentiment_label"], df["judgment_reason"], tiers)
+            if _clean(rpid) is not None
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sentiments (rpid, model, prompt_version, label, reason, tier, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                values,
+            )
+            self._conn.commit()
+        return len(values)
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def _video_filters(
+        keyword: Keywords = None,
+        days: Optional[float] = None,
+        min_view: Optional[int] = None,
+        author: Keywords = None,
+    ) -> Tuple[str, List[str], List[Any]]:
+        """返回 (JOIN 子句, WHERE 条件列表, 参数)，表别名 v = videos，k = video_keywords。"""
+        join, clauses, params = "", [], []
+        keywords = _as_list(keyword)
+        if keywords:
+            join = " JOIN video_keywords k ON k.bvid = v.bvid"
+            clauses.append(f"k.keyword IN ({_marks(len(keywords))})")
+            params.extend(keywords)
+        if days is not None:
+            clauses.append("v.pub_ts >= ?")
+            params.append(int(time.time() - days * 86400))
+        if min_view is not None:
+            clauses.append('v."view" >= ?')
+            params.append(int(min_view))
+        authors = _as_list(author)
+        if authors:
+            clauses.append(f"v.author IN ({_marks(len(authors))})")
+            params.extend(authors)
+        return join, clauses, params
+
+    def _videos_sql(
+        self,
+        columns: Optional[List[str]] = None,
+        keyword: Keywords = None,
+        days: Optional[float] = None,
+        min_view: Optional[int] = None,
+        author: Keywords = None,
+        order_by: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[str, List[Any]]:
+        columns = columns or (["keyword"] if keyword else []) + VIDEO_COLUMNS
+        if "keyword" in columns and not keyword:
+            raise ValueError("只有按 keyword 过滤时才能取 keyword 列")
+        select = ", ".join("k.keyword" if c == "keyword" else f"v.{_q(c)}" for c in columns)
+        join, clauses, params = self._video_filters(keyword, days, min_view, author)
+        sql = f"SELECT {select} FROM videos v{join}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if order_by:
+            sql += f" ORDER BY v.{_q(order_by)} DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return sql, params
+
+    def query_videos(self, columns: Optional[List[str]] = None, **filters: Any) -> pd.DataFrame:
+        """
+        按条件查询视频，返回列类型同 SEARCH_DTYPES 的 DataFrame。
+        filters: keyword（可为列表）、days（发布于最近 N 天）、min_view、author（可为列表）、order_by、limit。
+        按 keyword 过滤时多一列 keyword，同一视频出现在多个关键词下会各占一行。
+        """
+        sql, params = self._videos_sql(columns, **filters)
+        with self._lock:
+            df = pd.read_sql_query(sql, self._conn, params=params)
+        return apply_dtypes(df, SEARCH_DTYPES)
+
+    def iter_videos(self, columns: Optional[List[str]] = None, chunk_size: int = 100000, **filters: Any) -> Iterator[pd.DataFrame]:
+        """同 query_videos，按块产出，内存占用与结果行数无关。"""
+        sql, params = self._videos_sql(columns, **filters)
+        conn = sqlite3.connect(self.path)
+        try:
+            for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunk_size):
+                yield apply_dtypes(chunk, SEARCH_DTYPES)
+        finally:
+            conn.close()
+
+    def query_comments(
+        self,
+        bvid: Keywords = None,
+        keyword: Keywords = None,
+        days: Optional[float] = None,
+        min_view: Optional[int] = None,
+        sentiment_model: Optional[str] = None,
+        unlabeled: bool = False,
+    ) -> pd.DataFrame:
+        """
+        按条件查询评论：bvid（可为列表）、days（评论发布于最近 N 天）、
+        keyword / min_view（所属视频的关键词 / 播放量）。
+        sentiment_model 不为空时附带该模型的 sentiment_label / judgment_reason / sentiment_tier 列；
+        unlabeled=True 时只返回该模型还没有分类结果的评论。
+        """
+        select = ", ".join(f"c.{_q(c)}" for c in COMMENT_COLUMNS)
+        sql, clauses, params = "", [], []
+        bvids = _as_list(bvid)
+        if bvids:
+            clauses.append(f"c.bvid IN ({_marks(len(bvids))})")
+            params.extend(bvids)
+        if days is not None:
+            clauses.append("c.ctime >= ?")
+            params.append(int(time.time() - days * 86400))
+        if keyword or min_view is not None:
+            join, video_clauses, video_params = self._video_filters(keyword, min_view=min_view)
+            clauses.append(f"c.bvid IN (SELECT v.bvid FROM videos v{join} WHERE {' AND '.join(video_clauses)})")
+            params.extend(video_params)
+
+        if sentiment_model:
+            select += ", s.label AS sentiment_label, s.reason AS judgment_reason, s.tier AS sentiment_tier"
+            sql = f"SELECT {select} FROM comments c LEFT JOIN sentiments s ON s.rpid = c.rpid AND s.model = ?"
+            params.insert(0, sentiment_model)
+            if unlabeled:
+                clauses.append("s.rpid IS NULL")
+        else:
+            sql = f"SELECT {select} FROM comments c"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            df = pd.read_sql_query(sql, self._conn, params=params)
+        return apply_dtypes(df, {**COMMENT_DTYPES, **SENTIMENT_DTYPES})
+
+    def sentiment_counts(self, model: str, **filters: Any) -> Dict[int, int]:
+        """统计某模型的情绪标签分布 {label: 条数}，filters 同 query_comments。"""
+        df = self.query_comments(sentiment_model=model, **filters)
+        counts = df["sentiment_label"].dropna().value_counts()
+        return {int(label): int(n) for label, n in counts.items()}
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("videos", "video_keywords", "comments", "sentiments")
+            }
+
+    # ---------- 导入已有文件 ----------
+
+    def import_file(self, path: str, chunk_size: int = 100000) -> Tuple[str, int]:
+        """
+        导入搜索结果（有 title 列）或评论文件（有 rpid 列）。
+        评论文件没有 bvid 列时按文件名 {bvid}_comments.csv 推断。返回 (表名, 行数)。
+        """
+        first = next(iter_table_chunks(path, chunk_size=1), None)
+        if first is None:
+            return "", 0
+        is_comments = "rpid" in first.columns
+        bvid = os.path.basename(path).split("_comments")[0] if is_comments else None
+        dtypes = COMMENT_DTYPES if is_comments else SEARCH_DTYPES
+        total = 0
+        for chunk in iter_table_chunks(path, chunk_size=chunk_size):
+            rows = apply_dtypes(chunk, dtypes).to_dict("records")
+            total += self.upsert_comments(rows, bvid=bvid) if is_comments else self.upsert_videos(rows)
+        return ("comments" if is_comments else "videos"), total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="B站本地分析库：导入文件 / 按条件查询视频")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="SQLite 库文件")
+    parser.add_argument("--import", dest="imports", action="append", default=[],
+                        help="导入搜索结果或评论文件（.csv / .parquet），可多次指定")
+    parser.add_argument("--keyword", nargs="*", default=None, help="只看这些关键词的搜索结果")
+    parser.add_argument("--days", type=float, default=None, help="只看最近 N 天发布的视频")
+    parser.add_argument("--min_view", type=int, default=None, help="最低播放量")
+    parser.add_argument("--author", nargs="*", default=None, help="只看这些 UP 主")
+    parser.add_argument("--order_by", default="view", help="按该列降序排列")
+    parser.add_argument("--limit", type=int, default=20, help="最多显示多少行")
+    args = parser.parse_args()
+
+    with BiliStore(args.store) as store:
+        for path in args.imports:
+            table, n = store.import_file(path)
+            print(f"[OK] {path} -> {table} {n} 行")
+        print(f"[INFO] {args.store}：{store.counts()}")
+        df = store.query_videos(
+            columns=["bvid", "title", "author", "pub_time", "view", "like"],
+            keyword=args.keyword, days=args.days, min_view=args.min_view, author=args.author,
+            order_by=args.order_by, limit=args.limit,
+        )
+        print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,30 @@
 import os
 import time
 import random
-from typing import Optional, Dict, List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Iterator, List
 
 import requests
 import pandas as pd
 
+try:
+    from .http_cache import ResponseCache, cached_get  # 作为 scripts 包导入（如 notebook）
+    from .crawl_journal import CrawlJournal
+    from .bili_storage import COMMENT_DTYPES, RowWriter
+    from .rate_limit import RateLimiter
+    from .bili_metrics import timed, timer
+    from .session_pool import SessionPool
+    from .bili_store import BiliStore
+except ImportError:
+    from http_cache import ResponseCache, cached_get  # 在 scripts/ 下直接运行
+    from crawl_journal import CrawlJournal
+    from bili_storage import COMMENT_DTYPES, RowWriter
+    from rate_limit import RateLimiter
+    from bili_metrics import timed, timer
+    from session_pool import SessionPool
+    from bili_store import BiliStore
+
 DEFAULT_HEADERS = {
     "accept": "application/json, text/plain, */*",
     "user-agent": (
@@ -16,6 +35,11 @@ DEFAULT_HEADERS = {
     "referer": "https://www.bilibili.com/",
 }
 
+VIEW_URL = "https://api.bilibili.com/x/web-interface/view"
+REPLY_MAIN_URL = "https://api.bilibili.com/x/v2/reply/main"
+REPLY_DETAIL_URL = "https://api.bilibili.com/x/v2/reply/reply"  # 楼中楼（某条评论下的回复）
+SUB_REPLY_PAGE_SIZE = 20  # reply/reply 每页最多 20 条
+
 def polite_sleep(a=0.8, b=1.5):
     time.sleep(random.uniform(a, b))
 
@@ -41,76 +65,306 @@ def build_session(cookie: Optional[str] = None, proxies: Optional[Dict[str, str]
         s.proxies = proxies
     return s
 
-def bvid_to_aid(bvid: str, session: requests.Session) -> int:
+def clone_session(session: requests.Session) -> requests.Session:
+    # 复制 headers / cookie / 代理，给并发的子线程各用一个 Session
+    s = requests.Session()
+    s.headers.update(session.headers)
+    s.proxies.update(session.proxies or {})
+    s.cookies.update(session.cookies)
+    return s
+
+@timed("bvid_to_aid")
+def bvid_to_aid(
+    bvid: str,
+    session: requests.Session,
+    cache: Optional[ResponseCache] = None,
+    limiter: Optional[RateLimiter] = None,
+) -> int:
     # 通过视频信息接口拿到 aid（av号），评论 oid 用这个
-    url = "https://api.bilibili.com/x/web-interface/view"
-    r = session.get(url, params={"bvid": bvid}, timeout=(10, 30))
-    j = r.json()
+    # bvid -> aid 不会变化，传入 cache 时永久缓存
+    resp = cached_get(session, VIEW_URL, {"bvid": bvid}, cache, timeout=(10, 30), limiter=limiter)
+    j = resp["json"] or {}
     if j.get("code") != 0:
         raise RuntimeError(f"BV转aid失败：code={j.get('code')} msg={j.get('message')}")
     return int(j["data"]["aid"])
 
-def fetch_comments(bvid: str, session: requests.Session, max_comments: int = 100) -> pd.DataFrame:
-    aid = bvid_to_aid(bvid, session)
+def reply_main_params(aid: int, next_page: int) -> dict:
+    return {
+        "type": 1,
+        "oid": aid,
+        "next": next_page,
+        "mode": 3,   # 常见：3=按时间（不同资料说法略有差异，但可用）
+        "plat": 1,
+    }
 
-    all_comments: List[dict] = []
-    next_page = 0  # reply/main 常见从 0 或 1 开始，0 更常见
-    while len(all_comments) < max_comments:
-        url = "https://api.bilibili.com/x/v2/reply/main"
-        params = {
-            "type": 1,
-            "oid": aid,
-            "next": next_page,
-            "mode": 3,   # 常见：3=按时间（不同资料说法略有差异，但可用）
-            "plat": 1,
-        }
-        r = session.get(url, params=params, timeout=(10, 30))
-        j = r.json()
+def parse_reply(rep: dict) -> dict:
+    return {
+        "rpid": rep.get("rpid"),
+        "mid": rep.get("member", {}).get("mid"),
+        "uname": rep.get("member", {}).get("uname"),
+        "content": rep.get("content", {}).get("message"),
+        "like": rep.get("like"),
+        "ctime": rep.get("ctime"),
+        "root": rep.get("root", 0),      # 所在楼的根评论 rpid，根评论本身为 0
+        "parent": rep.get("parent", 0),  # 直接回复的评论 rpid，根评论本身为 0
+    }
 
+def reply_detail_params(aid: int, root: int, pn: int, ps: int = SUB_REPLY_PAGE_SIZE) -> dict:
+    return {
+        "type": 1,
+        "oid": aid,
+        "root": root,
+        "pn": pn,
+        "ps": ps,
+    }
+
+@timed("fetch_sub_replies", rows=len)
+def fetch_sub_replies(
+    session: requests.Session,
+    aid: int,
+    root: int,
+    max_sub: int = 20,
+    cache: Optional[ResponseCache] = None,
+    limiter: Optional[RateLimiter] = None,
+) -> List[dict]:
+    """按 pn 翻页取根评论 root 下的楼中楼回复，最多 max_sub 条。"""
+    rows: List[dict] = []
+    pn = 1
+    while len(rows) < max_sub:
+        params = reply_detail_params(aid, root, pn)
+        resp = cached_get(session, REPLY_DETAIL_URL, params, cache, timeout=(10, 30), limiter=limiter)
+        j = resp["json"] or {}
         if j.get("code") != 0:
-            # 关键：把错误信息打印出来，别“默默只拿到几条”
-            raise RuntimeError(f"评论接口返回错误：code={j.get('code')} msg={j.get('message')}")
+            raise RuntimeError(f"楼中楼接口返回错误：root={root} code={j.get('code')} msg={j.get('message')}")
 
         data = j.get("data") or {}
         replies = data.get("replies") or []
-        cursor = data.get("cursor") or {}
+        rows.extend(parse_reply(rep) for rep in replies[:max_sub - len(rows)])
 
-        if not replies:
-            print("[INFO] 本页无 replies，停止。")
+        total = (data.get("page") or {}).get("count") or 0
+        if not replies or pn * SUB_REPLY_PAGE_SIZE >= total:
             break
+        pn += 1
+
+        if limiter is None and not resp["from_cache"]:
+            polite_sleep()
+    return rows
+
+def iter_comment_pages(
+    bvid: str,
+    session: requests.Session,
+    max_comments: int = 100,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CrawlJournal] = None,
+    resume: bool = False,
+    aid: Optional[int] = None,
+    limiter: Optional[RateLimiter] = None,
+    expand_replies: bool = False,
+    max_sub_replies: int = 20,
+    sub_workers: int = 4,
+) -> Iterator[List[dict]]:
+    """
+    按 reply/main 游标逐页产出评论行，累计不超过 max_comments 条。
+    传入 journal 时每翻完一页就把该页的评论和下一页游标写入日志；
+    resume=True 时先产出日志中的评论，再从最后的 cursor.next 继续翻页。
+    已知 aid（如搜索结果里的 aid 列）时直接传入，省去一次 bvid_to_aid 请求。
+    传入 limiter 时按共享的请求预算限速，不再每页 polite_sleep。
+    expand_replies=True 时，本页中有回复的根评论再用 reply/reply 展开楼中楼，
+    每楼最多 max_sub_replies 条，最多 sub_workers 个楼同时请求；
+    楼中楼紧跟在根评论后面产出，通过 root / parent 列关联，不计入 max_comments。
+    """
+    count = 0
+    seen_rpids = set()
+    next_page = 0  # reply/main 常见从 0 或 1 开始，0 更常见
+
+    if journal is not None:
+        meta = {"bvid": bvid}
+        if expand_replies:
+            meta["max_sub_replies"] = max_sub_replies
+        journal.start(meta, resume=resume)
+        entries, journal.entries = journal.entries, []
+        for entry in entries:
+            rows = []
+            for c in entry["rows"]:
+                if not c.get("root"):
+                    if count >= max_comments:
+                        break
+                    count += 1
+                rows.append(c)
+            seen_rpids.update(c["rpid"] for c in rows)
+            if rows:
+                yield rows
+        if entries:
+            last = entries[-1]
+            print(f"[INFO] 从日志恢复 {count} 条评论：{journal.path}")
+            if last["end"]:
+                return
+            next_page = last["next"]
+
+    if aid is None:
+        aid = bvid_to_aid(bvid, session, cache=cache, limiter=limiter)
+
+    local = threading.local()
 
-        for rep in replies:
-            all_comments.append({
-                "rpid": rep.get("rpid"),
-                "mid": rep.get("member", {}).get("mid"),
-                "uname": rep.get("member", {}).get("uname"),
-                "content": rep.get("content", {}).get("message"),
-                "like": rep.get("like"),
-                "ctime": rep.get("ctime"),
-            })
-            if len(all_comments) >= max_comments:
+    def sub_replies(root: int) -> List[dict]:
+        if not hasattr(local, "session"):
+            # 会话池本身线程安全，直接共用；普通 Session 给每个线程复制一个
+            local.session = session if isinstance(session, SessionPool) else clone_session(session)
+        try:
+            return fetch_sub_replies(local.session, aid, root, max_sub_replies, cache=cache, limiter=limiter)
+        except RuntimeError as e:
+            print(f"[WARN] {e}，跳过该楼的回复")
+            return []
+
+    pool = ThreadPoolExecutor(max_workers=sub_workers) if expand_replies else None
+    try:
+        while count < max_comments:
+            page_timer = timer("comment_page").start()
+            params = reply_main_params(aid, next_page)
+            resp = cached_get(session, REPLY_MAIN_URL, params, cache, timeout=(10, 30), limiter=limiter)
+            j = resp["json"] or {}
+
+            if j.get("code") != 0:
+                # 关键：把错误信息打印出来，别“默默只拿到几条”
+                raise RuntimeError(f"评论接口返回错误：code={j.get('code')} msg={j.get('message')}")
+
+            data = j.get("data") or {}
+            replies = data.get("replies") or []
+            cursor = data.get("cursor") or {}
+
+            if not replies:
+                page_timer.stop(rows=0)
+                print("[INFO] 本页无 replies，停止。")
+                if journal is not None:
+                    journal.append({"cursor": next_page, "next": None, "end": True, "rows": []})
                 break
 
-        # 用 cursor 翻页
-        if cursor.get("is_end"):
-            print("[INFO] cursor.is_end=True，已经到末页。")
-            break
-        next_page = cursor.get("next")
-        if next_page is None:
-            print("[WARN] cursor.next 缺失，停止。")
-            break
+            page_rows = []
+            roots = []  # 需要展开楼中楼的根评论在 page_rows 中的位置
+            truncated = False
+            for rep in replies:
+                row = parse_reply(rep)
+                # 续爬时本页可能已部分写入过日志
+                if row["rpid"] in seen_rpids:
+                    continue
+                seen_rpids.add(row["rpid"])
+                page_rows.append(row)
+                if pool is not None and rep.get("rcount"):
+                    roots.append(len(page_rows) - 1)
+                count += 1
+                if count >= max_comments:
+                    truncated = True
+                    break
+
+            if roots:
+                subs = pool.map(sub_replies, [page_rows[i]["rpid"] for i in roots])
+                expanded = []
+                last = 0
+                for i, sub in zip(roots, subs):
+                    expanded.extend(page_rows[last:i + 1])
+                    expanded.extend(r for r in sub if r["rpid"] not in seen_rpids)
+                    seen_rpids.update(r["rpid"] for r in sub)
+                    last = i + 1
+                expanded.extend(page_rows[last:])
+                page_rows = expanded
+            page_timer.stop(rows=len(page_rows))
 
-        polite_sleep()
+            # 用 cursor 翻页
+            end = False
+            if cursor.get("is_end"):
+                print("[INFO] cursor.is_end=True，已经到末页。")
+                end = True
+            elif cursor.get("next") is None:
+                print("[WARN] cursor.next 缺失，停止。")
+                end = True
 
+            if journal is not None:
+                # 本页没取完时下次仍从本页开始，靠 rpid 去重
+                journal.append({
+                    "cursor": next_page,
+                    "next": next_page if truncated else cursor.get("next"),
+                    "end": end and not truncated,
+                    "rows": page_rows,
+                })
+
+            yield page_rows
+
+            if end:
+                break
+            next_page = cursor.get("next")
+
+            if limiter is None and not resp["from_cache"]:
+                polite_sleep()
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+def fetch_comments(
+    bvid: str,
+    session: requests.Session,
+    max_comments: int = 100,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CrawlJournal] = None,
+    resume: bool = False,
+    aid: Optional[int] = None,
+    expand_replies: bool = False,
+    max_sub_replies: int = 20,
+    sub_workers: int = 4,
+) -> pd.DataFrame:
+    all_comments: List[dict] = []
+    for rows in iter_comment_pages(
+        bvid, session, max_comments, cache, journal, resume, aid=aid,
+        expand_replies=expand_replies, max_sub_replies=max_sub_replies, sub_workers=sub_workers,
+    ):
+        all_comments.extend(rows)
     return pd.DataFrame(all_comments)
 
+def fetch_comments_to_file(
+    out: str,
+    bvid: str,
+    session: requests.Session,
+    max_comments: int = 100,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CrawlJournal] = None,
+    resume: bool = False,
+    batch_size: int = 1000,
+    expand_replies: bool = False,
+    max_sub_replies: int = 20,
+    sub_workers: int = 4,
+    store: Optional[BiliStore] = None,
+) -> int:
+    """
+    流式版 fetch_comments：每页评论按批直接写入 out（.csv / .parquet），返回写入行数。
+    传入 store（bili_store.BiliStore）时评论同时 upsert 进本地分析库。
+    """
+    with RowWriter(out, batch_size=batch_size, dtypes=COMMENT_DTYPES) as writer:
+        for rows in iter_comment_pages(
+            bvid, session, max_comments, cache, journal, resume,
+            expand_replies=expand_replies, max_sub_replies=max_sub_replies, sub_workers=sub_workers,
+        ):
+            writer.write_rows(rows)
+            if store is not None:
+                store.upsert_comments(rows, bvid=bvid)
+    return writer.rows_written
+
 if __name__ == "__main__":
     bvid = "BV1wK2QBPEDv"
     max_comments = 50
+    use_cache = False # 是否启用本地响应缓存（bili_http_cache.sqlite）
+    resume = False # 是否从进度日志断点续爬
+    expand_replies = False # 是否展开楼中楼回复
+    store_file = None # 设为 "bili_store.sqlite" 时评论同时写入本地分析库
 
     cookie = load_cookie()
     session = build_session(cookie=cookie)
+    cache = ResponseCache() if use_cache else None
+    journal = CrawlJournal(f"{bvid}_comments.journal.jsonl")
+    store = BiliStore(store_file) if store_file else None
 
-    df = fetch_comments(bvid, session, max_comments=max_comments)
-    df.to_csv(f"{bvid}_comments.csv", index=False, encoding="utf_8_sig")
-    print(f"[OK] 保存完成：{bvid}_comments.csv  行数={len(df)}")
+    out = f"{bvid}_comments.csv"
+    n = fetch_comments_to_file(out, bvid, session, max_comments=max_comments, cache=cache, journal=journal, resume=resume,
+                               expand_replies=expand_replies, store=store)
+    if store is not None:
+        store.close()
+    journal.remove()
+    print(f"[OK] 保存完成：{out}  行数={n}")
@@ -1,9 +1,12 @@
 """
 Bilibili 搜索数据分析脚本
 功能：
-1. 读取 B 站搜索结果 CSV
-2. 统计 UP 主 / 分区 / 标签 Top10
+1. 读取 B 站搜索结果（CSV / Parquet）
+2. 统计 UP 主 / 分区 / 标签 TopN：一次扫描同时统计多列（含 tag 这类逗号分隔的多值列），
+   支持加权（如每个 UP 主的总播放量）与按关键词分组
 3. 绘制柱状图并标注数值
+4. 可选：按块流式读取并用 Space-Saving / Count-Min 近似统计，内存有界
+5. 可选：从本地分析库（bili_store.py）读取，关键词 / 发布时间 / 播放量等过滤条件下推到 SQL
 """
 
 import pandas as pd
@@ -12,6 +15,17 @@ import platform
 import warnings
 import matplotlib.font_manager as fm
 
+try:
+    from .bili_storage import SEARCH_DTYPES, find_table, iter_table_chunks, read_table  # 作为 scripts 包导入
+    from .heavy_hitters import DEFAULT_EPSILON, make_counter
+    from .bili_metrics import timer
+    from .bili_store import BiliStore
+except ImportError:
+    from bili_storage import SEARCH_DTYPES, find_table, iter_table_chunks, read_table  # 在 scripts/ 下直接运行
+    from heavy_hitters import DEFAULT_EPSILON, make_counter
+    from bili_metrics import timer
+    from bili_store import BiliStore
+
 
 # =========================
 # 1. 中文字体自动适配
@@ -41,81 +55,200 @@ def set_chinese_font():
 # =========================
 # 2. 数据读取
 # =========================
-def load_data(keyword):
-    filename = f"{keyword}_搜索.csv"
-    df = pd.read_csv(filename, encoding="utf_8_sig")
+def load_data(keyword, columns=None):
+    """
+    读取 {keyword}_搜索.parquet（存在时）或 {keyword}_搜索.csv。
+    columns 指定只读哪些列，Parquet 下不会解码其他列。
+    """
+    filename = find_table(f"{keyword}_搜索")
+    df = read_table(filename, columns=columns, dtypes=SEARCH_DTYPES)
     return df
 
 
 # =========================
-# 3. Top10 统计函数
+# 3. TopN 统计
 # =========================
+MULTI_VALUE_COLUMNS = ('tag',)  # 一个单元格里有多个值（逗号分隔）的列
+
+
+class TopNAggregator:
+    """
+    一次扫描统计多列的 TopN，可分块喂入数据（update），最后再取结果（top / tops）。
+    columns:     要统计的列，如 ['author', 'type_name', 'tag']
+    weights:     额外求和的数值列，如 ['view', 'like']，结果中每列一栏，可按其排序
+    by:          分组列，如 'keyword'，每组各取 TopN
+    multi_value: 其中按 sep 拆分后再统计的多值列
+    """
+
+    def __init__(self, columns, weights=(), by=None, multi_value=MULTI_VALUE_COLUMNS, sep=','):
+        self.columns = list(columns)
+        self.weights = list(weights)
+        self.by = by
+        self.multi_value = set(multi_value)
+        self.sep = sep
+        self._parts = {col: [] for col in self.columns}
+
+    def _keys(self, column):
+        return ([self.by] if self.by else []) + [column]
+
+    def _aggregate(self, df, column):
+        frame = df[self._keys(column) + self.weights]
+        if column in self.multi_value:
+            frame = frame.assign(**{column: frame[column].str.split(self.sep)}).explode(column)
+            frame = frame.assign(**{column: frame[column].str.strip()})
+        frame = frame.dropna(subset=[column])
+
+        if not self.weights and not self.by:
+            # 纯计数直接用 value_counts（与原 get_top10_* 结果完全一致），分类列去掉未出现的类别
+            return nonzero_counts(frame[column]).reset_index()
+        return (
+            frame
+            .groupby(self._keys(column), observed=True, sort=False)
+            .agg(count=(column, 'size'), **{w: (w, 'sum') for w in self.weights})
+            .reset_index()
+        )
+
+    def _combine(self, column):
+        parts = self._parts[column]
+        if len(parts) > 1:
+            merged = (
+                pd.concat(parts, ignore_index=True)
+                .groupby(self._keys(column), observed=True, sort=False)[['count'] + self.weights]
+                .sum()
+                .reset_index()
+            )
+            self._parts[column] = [merged]
+        return self._parts[column][0] if self._parts[column] else pd.DataFrame(
+            columns=self._keys(column) + ['count'] + self.weights
+        )
+
+    def update(self, df):
+        for column in self.columns:
+            self._parts[column].append(self._aggregate(df, column))
+            if len(self._parts[column]) >= 8:
+                self._combine(column)  # 分块较多时及时合并，内存只与不同取值的个数有关
+
+    def top(self, column, n=10, sort_by='count'):
+        agg = self._combine(column).sort_values(sort_by, ascending=False, kind='stable')
+        if self.by:
+            agg = agg.groupby(self.by, observed=True, sort=False).head(n).sort_values(self.by, kind='stable')
+        else:
+            agg = agg.head(n)
+        return agg.reset_index(drop=True)
+
+    def tops(self, n=10, sort_by='count'):
+        return {column: self.top(column, n, sort_by) for column in self.columns}
+
+
+def top_n(df, columns, n=10, weights=(), by=None, sort_by='count'):
+    """对内存中的 df 统计 columns 各列的 TopN，返回 {列名: DataFrame}。"""
+    agg = TopNAggregator(columns, weights, by)
+    agg.update(df)
+    return agg.tops(n, sort_by)
+
+
+def top_n_from_files(paths, columns, n=10, weights=(), by=None, sort_by='count', chunk_size=100000):
+    """
+    按块流式读取一个或多个搜索结果文件（可以是不同关键词的），一次扫描得到各列 TopN。
+    by='keyword' 时按关键词分组。
+    """
+    agg = TopNAggregator(columns, weights, by)
+    needed = list(dict.fromkeys(([by] if by else []) + list(columns) + list(weights)))
+    for path in ([paths] if isinstance(paths, str) else paths):
+        for chunk in iter_table_chunks(path, columns=needed, chunk_size=chunk_size, dtypes=SEARCH_DTYPES):
+            agg.update(chunk)
+    return agg.tops(n, sort_by)
+
+
+def top_n_from_store(store, columns, n=10, weights=(), by=None, sort_by='count', chunk_size=100000, **filters):
+    """
+    从本地分析库（BiliStore 或库文件路径）按块读取并统计各列 TopN，只读出需要的列。
+    filters 下推到 SQL：keyword（可为列表）、days（最近 N 天发布）、min_view、author。
+    by='keyword' 时需要同时按 keyword 过滤。
+    """
+    if isinstance(store, str):
+        store = BiliStore(store)
+    agg = TopNAggregator(columns, weights, by)
+    needed = list(dict.fromkeys(([by] if by else []) + list(columns) + list(weights)))
+    for chunk in store.iter_videos(columns=needed, chunk_size=chunk_size, **filters):
+        agg.update(chunk)
+    return agg.tops(n, sort_by)
+
+
 def get_top10_author(df):
-    top10 = (
-        df['author']
-        .value_counts()
-        .head(10)
-        .reset_index()
-    )
-    top10.columns = ['author', 'count']
-    return top10
+    return top_n(df, ['author'], n=10)['author']
 
 
 def get_top10_type(df):
-    top10 = (
-        df['type_name']
-        .value_counts()
-        .head(10)
-        .reset_index()
-    )
-    top10.columns = ['type_name', 'count']
-    return top10
+    return top_n(df, ['type_name'], n=10)['type_name']
 
 
 def get_top10_tag(df):
-    tags = (
-        df['tag']
+    return top_n(df, ['tag'], n=10)['tag']
+
+
+def nonzero_counts(series):
+    """value_counts 并去掉计数为 0 的项：分类列（category）的 value_counts 会列出所有类别，包括本块中没出现的。"""
+    counts = series.value_counts()
+    return counts[counts > 0]
+
+
+def split_tags(tag_series):
+    return (
+        tag_series
         .dropna()
         .str.split(',')
         .explode()
         .str.strip()
     )
 
-    top10 = (
-        tags
-        .value_counts()
-        .head(10)
-        .reset_index()
-    )
-    top10.columns = ['tag', 'count']
-    return top10
+
+def approx_top_counts(path, method='spacesaving', epsilon=DEFAULT_EPSILON, chunk_size=100000):
+    """
+    按块读取 path，对 author / type_name / tag 分别维护一个近似 Top-K 摘要（见 heavy_hitters.py）。
+    每块先用 value_counts 预聚合再加权写入摘要，内存只与 1/epsilon 有关。
+    返回 {列名: 摘要}，摘要可 save 后与其他分片 / 日期的摘要 merge。
+    """
+    counters = {col: make_counter(method, epsilon) for col in ('author', 'type_name', 'tag')}
+    for chunk in iter_table_chunks(path, columns=list(counters), chunk_size=chunk_size, dtypes=SEARCH_DTYPES):
+        counters['author'].update(nonzero_counts(chunk['author']).to_dict())
+        counters['type_name'].update(nonzero_counts(chunk['type_name']).to_dict())
+        counters['tag'].update(nonzero_counts(split_tags(chunk['tag'])).to_dict())
+    return counters
+
+
+def top_from_counter(counter, column, n=10):
+    """把 Counter / 近似摘要的前 n 项转成与 get_top10_* 相同格式的 DataFrame。"""
+    return pd.DataFrame(counter.most_common(n), columns=[column, 'count'])
 
 
 # =========================
 # 4. 通用柱状图绘制函数
 # =========================
 def plot_bar(df, x_col, y_col, title, xlabel, ylabel):
-    plt.figure(figsize=(10, 6))
-    bars = plt.bar(df[x_col], df[y_col])
-
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-
-    plt.xticks(rotation=45, ha='right')
-
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(
-            bar.get_x() + bar.get_width() / 2,
-            height,
-            f'{int(height)}',
-            ha='center',
-            va='bottom',
-            fontsize=10
-        )
-
-    plt.tight_layout()
+    # 计时只包括绘图，不包括 plt.show() 等待窗口关闭的时间
+    with timer("plot_bar"):
+        plt.figure(figsize=(10, 6))
+        bars = plt.bar(df[x_col], df[y_col])
+
+        plt.title(title)
+        plt.xlabel(xlabel)
+        plt.ylabel(ylabel)
+
+        plt.xticks(rotation=45, ha='right')
+
+        for bar in bars:
+            height = bar.get_height()
+            plt.text(
+                bar.get_x() + bar.get_width() / 2,
+                height,
+                f'{int(height)}',
+                ha='center',
+                va='bottom',
+                fontsize=10
+            )
+
+        plt.tight_layout()
     plt.show()
 
 
@@ -123,42 +256,53 @@ def plot_bar(df, x_col, y_col, title, xlabel, ylabel):
 # 5. 主程序入口
 # =========================
 def main():
-    keyword = "深度学习" # 搜索关键词
+    keywords = ["深度学习"] # 搜索关键词，可多个
+    n = 10 # 每项取前 n 名
+    weight = None # 设为 'view' / 'like' 等时按该列总和排名（如每个 UP 主的总播放量），None 为按视频数
+    approx = None # 设为 "spacesaving" / "countmin" 时按块流式近似统计（适合超大数据）
+    approx_epsilon = DEFAULT_EPSILON # 近似统计的误差上限：计数高估不超过 epsilon * 总数
+    store_file = None # 设为 "bili_store.sqlite" 时从本地分析库读取，可配合下面的过滤条件
+    days = None # 只统计最近 N 天发布的视频（仅 store_file）
+    min_view = None # 只统计播放量不低于该值的视频（仅 store_file）
 
     set_chinese_font()
 
-    df = load_data(keyword)
-
-    top10_author_df = get_top10_author(df)
-    top10_type_df = get_top10_type(df)
-    top10_tag_df = get_top10_tag(df)
-
-    plot_bar(
-        top10_author_df,
-        x_col='author',
-        y_col='count',
-        title='UP主出现次数 Top10',
-        xlabel='UP主名称',
-        ylabel='视频数量'
-    )
-
-    plot_bar(
-        top10_type_df,
-        x_col='type_name',
-        y_col='count',
-        title='视频分区出现次数 Top10',
-        xlabel='视频分区',
-        ylabel='视频数量'
-    )
+    columns = ['author', 'type_name', 'tag']
+    paths = [find_table(f"{keyword}_搜索") for keyword in keywords]
 
-    plot_bar(
-        top10_tag_df,
-        x_col='tag',
-        y_col='count',
-        title='标签出现次数 Top10',
-        xlabel='标签',
-        ylabel='出现次数'
-    )
+    if store_file:
+        # 过滤在 SQL 中完成，只读出满足条件的行
+        tops = top_n_from_store(
+            store_file, columns, n=n, weights=[weight] if weight else [], sort_by=weight or 'count',
+            keyword=keywords, days=days, min_view=min_view,
+        )
+    elif approx:
+        counters = approx_top_counts(paths[0], approx, approx_epsilon)
+        for path in paths[1:]:
+            more = approx_top_counts(path, approx, approx_epsilon)
+            counters = {col: counters[col].merge(more[col]) for col in columns}
+        tops = {col: top_from_counter(counters[col], col, n) for col in columns}
+        weight = None
+    else:
+        # 一次扫描所有关键词的数据，同时得到三项统计
+        tops = top_n_from_files(paths, columns, n=n, weights=[weight] if weight else [], sort_by=weight or 'count')
+
+    y_col = weight or 'count'
+    labels = {
+        'author': ('UP主', 'UP主名称', '视频数量'),
+        'type_name': ('视频分区', '视频分区', '视频数量'),
+        'tag': ('标签', '标签', '出现次数'),
+    }
+    for col in columns:
+        name, xlabel, ylabel = labels[col]
+        plot_bar(
+            tops[col],
+            x_col=col,
+            y_col=y_col,
+            title=f'{name}{"出现次数" if y_col == "count" else f" {y_col} 总和"} Top{n}',
+            xlabel=xlabel,
+            ylabel=ylabel if y_col == 'count' else y_col
+        )
 
 
 if __name__ == '__main__':
@@ -1,17 +1,19 @@
-import pandas as pd
 from wordcloud import WordCloud
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
 import platform
 
+from bili_metrics import timer
+from bili_storage import read_table
+
 # -------------设置搜索参数-----------------
 keyword = "深度学习" # 搜索关键词 
 pages = 30 # 搜索页数
 page_size = 30 # 每页结果数量(默认30)
 
-freq_df = pd.read_csv(
+freq_df = read_table(
     f"{keyword}_title_word_freq.csv",
-    encoding="utf_8_sig"
+    columns=['word', 'count']
 )
 
 word_freq = dict(
@@ -46,10 +48,11 @@ wc = WordCloud(
     prefer_horizontal=1.0
 )
 
-wc.generate_from_frequencies(word_freq)
+with timer("wordcloud"):
+    wc.generate_from_frequencies(word_freq)
 
-plt.figure(figsize=(12, 6))
-plt.imshow(wc)
-plt.axis('off')
-plt.title(f'B站“{keyword}”视频标题高频词词云')
-plt.show()
+    plt.figure(figsize=(12, 6))
+    plt.imshow(wc)
+    plt.axis('off')
+    plt.title(f'B站“{keyword}”视频标题高频词词云')
+plt.show()  # 不计入 wordcloud 耗时
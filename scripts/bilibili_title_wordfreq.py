@@ -2,108 +2,341 @@
 """
 B站搜索结果标题文本分析
 功能：
-1. 从 CSV 中提取 title 保存为 txt
-2. 使用 jieba 分词
+1. 从搜索结果（CSV / Parquet）中按块读取 title，边读边分词计数，内存占用与标题总数无关
+2. 使用 jieba 分词（标题较多时按块分给多个进程并行分词）
 3. 去除停用词和搜索关键词
 4. 统计词频
 5. 输出 Top10 并保存完整词频 CSV
+6. 可选：顺带把标题另存为 txt
+7. 分词结果按标题缓存，只改停用词 / 搜索词重跑时不必重新分词
+8. 可选：用 Space-Saving / Count-Min 近似统计高频词，内存有界，摘要可跨分片 / 日期合并
+9. 可选：从本地分析库（bili_store.py）按关键词 / 发布时间 / 播放量过滤后读取标题
 """
 
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional, Set
+
 import pandas as pd
 import jieba
 
+try:
+    from .bili_storage import find_table, iter_table_chunks  # 作为 scripts 包导入（如 notebook）
+    from .token_cache import DEFAULT_TOKEN_CACHE_PATH, TokenCache
+    from .heavy_hitters import make_counter
+    from .bili_metrics import timer
+    from .bili_store import BiliStore
+except ImportError:
+    from bili_storage import find_table, iter_table_chunks  # 在 scripts/ 下直接运行
+    from token_cache import DEFAULT_TOKEN_CACHE_PATH, TokenCache
+    from heavy_hitters import make_counter
+    from bili_metrics import timer
+    from bili_store import BiliStore
+
 
 # =========================
 # 1. 参数设置
 # =========================
 keyword = "深度学习"
-csv_file = f"{keyword}_搜索.csv"
+data_file = find_table(f"{keyword}_搜索")  # 优先读 .parquet，否则读 .csv
 title_txt = f"{keyword}_titles.txt"
 stopwords_file = "stopwords.txt"
 output_csv = f"{keyword}_title_word_freq.csv"
+workers = os.cpu_count() or 1  # 分词进程数，1 表示在当前进程中分词
+chunk_size = 20000  # 每次读取 / 每个进程一次处理的标题数
+save_titles = False  # 是否顺带把标题另存为 title_txt
+token_cache_file = DEFAULT_TOKEN_CACHE_PATH  # 分词结果缓存文件，None 表示不缓存
+approx = None  # 设为 "spacesaving" / "countmin" 时近似统计，只保留高频词
+approx_epsilon = 0.0001  # 近似统计的误差上限：词频高估不超过 epsilon * 总词数
+sketch_file = None  # 近似统计时把摘要保存到该文件，可用 heavy_hitters.py --merge 合并
+store_file = None  # 设为 "bili_store.sqlite" 时从本地分析库读取 keyword 的标题，不再读 data_file
+days = None  # 只统计最近 N 天发布的视频（仅 store_file）
+min_view = None  # 只统计播放量不低于该值的视频（仅 store_file）
 
 
-# =========================
-# 2. 从 CSV 提取标题并保存为 txt
-# =========================
-df = pd.read_csv(csv_file, encoding="utf_8_sig")
+def load_stopwords(path: str) -> Set[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return set(f.read().splitlines())
 
-titles = df['title'].dropna().astype(str)
 
-with open(title_txt, 'w', encoding='utf-8') as f:
-    for t in titles:
-        f.write(t + '\n')
+def count_tokens(
+    token_lists: Iterable[Iterable[str]],
+    keyword: str,
+    stopwords: Set[str],
+    exclude_words: Set[str],
+) -> Counter:
+    """按过滤规则对分好的词计数，token_lists 中每项为一条标题的分词结果。"""
+    word_counts = Counter()
 
-print(f"已保存标题文本：{title_txt}")
+    for words in token_lists:
+        for word in words:
+            word = word.strip()
 
+            # 过滤规则
+            if not word:
+                continue
+            if word in stopwords:
+                continue
+            if word == keyword:
+                continue
+            if word in exclude_words:   # 剔除搜索词分词后的所有子词
+                continue
+            if len(word) <= 1:
+                continue
 
-# =========================
-# 3. 读取标题文本
-# =========================
-with open(title_txt, 'r', encoding='utf-8') as f:
-    content = f.read()
+            word_counts[word] += 1
 
-print("文本前200字示例：")
-print(content[:200])
+    return word_counts
 
 
-# =========================
-# 4. 加载停用词表
-# =========================
-with open(stopwords_file, 'r', encoding='utf-8') as f:
-    stopwords = set(f.read().splitlines())
+def count_words(
+    titles: Iterable[str],
+    keyword: str,
+    stopwords: Set[str],
+    exclude_words: Set[str],
+) -> Counter:
+    """对一批标题分词并按过滤规则计数。"""
+    return count_tokens((jieba.cut(title) for title in titles), keyword, stopwords, exclude_words)
 
 
-# =========================
-# 5. jieba 分词并统计词频
-# =========================
-exclude_words = set(jieba.cut(keyword))
-print("搜索词分词：", exclude_words)
+# 子进程中的过滤参数，由 _init_worker 在进程启动时设置一次
+_worker_args = None
 
-words = jieba.cut(content)
 
-word_counts = {}
+def _init_worker(keyword: str, stopwords: Set[str], exclude_words: Set[str]) -> None:
+    global _worker_args
+    jieba.initialize()  # 每个进程只加载一次词典
+    _worker_args = (keyword, stopwords, exclude_words)
 
-for word in words:
-    word = word.strip()
 
-    # 过滤规则
-    if not word:
-        continue
-    if word in stopwords:
-        continue
-    if word == keyword:
-        continue
-    if word in exclude_words:   # 剔除搜索词分词后的所有子词
-        continue
-    if len(word) <= 1:
-        continue
+def _count_chunk(titles: List[str]) -> Counter:
+    return count_words(titles, *_worker_args)
 
-    word_counts[word] = word_counts.get(word, 0) + 1
 
+def _tokenize_chunk(titles: List[str]) -> List[List[str]]:
+    return [jieba.lcut(t) for t in titles]
 
-# =========================
-# 6. 输出 Top10 高频词
-# =========================
-sorted_words = sorted(
-    word_counts.items(),
-    key=lambda x: x[1],
-    reverse=True
-)
 
-print("\n标题中出现频率最高的词 Top10：")
-for word, count in sorted_words[:10]:
-    print(f"{word}: {count}")
+def iter_title_chunks(path: str, chunk_size: int = 20000) -> Iterator[List[str]]:
+    """按块读取搜索结果的 title 列，每块为去掉空值后的标题列表。"""
+    for chunk in iter_table_chunks(path, columns=['title'], chunk_size=chunk_size, dtypes={'title': 'string'}):
+        yield chunk['title'].dropna().astype(str).tolist()
 
 
-# =========================
-# 7. 保存完整词频结果为 CSV
-# =========================
-word_freq_df = pd.DataFrame(
-    sorted_words,
-    columns=['word', 'count']
-)
+def iter_store_title_chunks(store: BiliStore, chunk_size: int = 20000, **filters) -> Iterator[List[str]]:
+    """同 iter_title_chunks，从本地分析库读取，filters（keyword / days / min_view 等）下推到 SQL。"""
+    for chunk in store.iter_videos(columns=['title'], chunk_size=chunk_size, **filters):
+        yield chunk['title'].dropna().astype(str).tolist()
+
+
+def count_title_chunks(
+    chunks: Iterable[List[str]],
+    keyword: str,
+    stopwords: Set[str],
+    exclude_words: Set[str],
+    workers: Optional[int] = None,
+    token_cache: Optional[TokenCache] = None,
+    word_counts=None,
+) -> Counter:
+    """分词并计数，整体耗时和标题条数记为 tokenize 指标，见 _count_title_chunks。"""
+    workers = workers or os.cpu_count() or 1
+    with timer("tokenize", workers=workers) as t:
+        return _count_title_chunks(
+            t.track(chunks), keyword, stopwords, exclude_words, workers, token_cache, word_counts
+        )
+
+
+def _count_title_chunks(
+    chunks: Iterable[List[str]],
+    keyword: str,
+    stopwords: Set[str],
+    exclude_words: Set[str],
+    workers: int,
+    token_cache: Optional[TokenCache] = None,
+    word_counts=None,
+) -> Counter:
+    """
+    边读边统计：每块标题交给 workers 个进程之一分词，最多 2 * workers 块同时在途，
+    各块的 Counter 按读入顺序合并，结果（包括同频词的先后顺序）与单进程逐条统计完全一致。
+    只有一块时直接在当前进程中统计，省去启动进程的开销。
+    传入 token_cache 时只对缓存中没有的标题分词，见 _count_with_cache。
+    word_counts 为累计结果的容器，默认 Counter()，也可传入 heavy_hitters 的近似摘要。
+    """
+    if word_counts is None:
+        word_counts = Counter()
+    if token_cache is not None:
+        return _count_with_cache(chunks, keyword, stopwords, exclude_words, workers, token_cache, word_counts)
+
+    chunks = iter(chunks)
+    head = [c for c in (next(chunks, None), next(chunks, None)) if c is not None]
+
+    if workers <= 1 or len(head) < 2:
+        for titles in chain(head, chunks):
+            word_counts.update(count_words(titles, keyword, stopwords, exclude_words))
+        return word_counts
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(keyword, stopwords, exclude_words),
+    ) as pool:
+        pending = deque()
+        for titles in chain(head, chunks):
+            pending.append(pool.submit(_count_chunk, titles))
+            if len(pending) >= 2 * workers:
+                word_counts.update(pending.popleft().result())
+        while pending:
+            word_counts.update(pending.popleft().result())
+    return word_counts
+
+
+def _count_with_cache(
+    chunks: Iterable[List[str]],
+    keyword: str,
+    stopwords: Set[str],
+    exclude_words: Set[str],
+    workers: int,
+    token_cache: TokenCache,
+    word_counts: Counter,
+    min_parallel: int = 2000,
+) -> Counter:
+    """
+    每块先查分词缓存，只把未命中的标题（块内去重）交给进程池分词，新结果写回缓存；
+    过滤和计数在主进程按读入顺序进行。未命中少于 min_parallel 条时直接在主进程分词，
+    全部命中时不会启动任何进程。
+    """
+    hits = misses = 0
+    pool = None
+    pending = deque()
+
+    def finish() -> None:
+        titles, known, new_titles, result = pending.popleft()
+        new_tokens = result.result() if hasattr(result, "result") else result
+        fresh = dict(zip(new_titles, new_tokens))
+        if fresh:
+            token_cache.put_many(fresh)
+            known.update(fresh)
+        word_counts.update(count_tokens((known[t] for t in titles), keyword, stopwords, exclude_words))
+
+    try:
+        for titles in chunks:
+            known = token_cache.get_many(titles)
+            new_titles = [t for t in dict.fromkeys(titles) if t not in known]
+            hits += len(known)
+            misses += len(new_titles)
+
+            if workers > 1 and len(new_titles) >= min_parallel:
+                if pool is None:
+                    pool = ProcessPoolExecutor(
+                        max_workers=workers,
+                        initializer=_init_worker,
+                        initargs=(keyword, stopwords, exclude_words),
+                    )
+                result = pool.submit(_tokenize_chunk, new_titles)
+            else:
+                result = _tokenize_chunk(new_titles)
+            pending.append((titles, known, new_titles, result))
+
+            if len(pending) >= 2 * workers:
+                finish()
+        while pending:
+            finish()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    print(f"[INFO] 分词缓存命中 {hits} 条标题，新分词 {misses} 条")
+    return word_counts
+
+
+def count_title_words(
+    titles: List[str],
+    keyword: str,
+    stopwords: Set[str],
+    exclude_words: Set[str],
+    workers: Optional[int] = None,
+    chunk_size: int = 20000,
+) -> Counter:
+    """统计内存中一组标题的词频，按 chunk_size 分块后交给 count_title_chunks。"""
+    chunks = (titles[i:i + chunk_size] for i in range(0, len(titles), chunk_size))
+    return count_title_chunks(chunks, keyword, stopwords, exclude_words, workers)
+
+
+def main():
+    # =========================
+    # 2. 加载停用词表
+    # =========================
+    stopwords = load_stopwords(stopwords_file)
+
+    exclude_words = set(jieba.cut(keyword))
+    print("搜索词分词：", exclude_words)
+
+    # =========================
+    # 3. 按块读取标题（可选另存为 txt）
+    # =========================
+    titles_out = open(title_txt, 'w', encoding='utf-8') if save_titles else None
+    token_cache = TokenCache(token_cache_file) if token_cache_file else None
+
+    if store_file:
+        source = iter_store_title_chunks(BiliStore(store_file), chunk_size, keyword=keyword, days=days, min_view=min_view)
+    else:
+        source = iter_title_chunks(data_file, chunk_size)
+
+    def chunks():
+        first = True
+        for titles in source:
+            if first and titles:
+                print("文本前200字示例：")
+                print("\n".join(titles)[:200])
+                first = False
+            if titles_out is not None:
+                titles_out.writelines(t + '\n' for t in titles)
+            yield titles
+
+    # =========================
+    # 4. jieba 分词并统计词频
+    # =========================
+    try:
+        word_counts = count_title_chunks(
+            chunks(), keyword, stopwords, exclude_words, workers=workers, token_cache=token_cache,
+            word_counts=make_counter(approx, approx_epsilon),
+        )
+    finally:
+        if titles_out is not None:
+            titles_out.close()
+            print(f"已保存标题文本：{title_txt}")
+
+    if approx and sketch_file:
+        word_counts.save(sketch_file)
+        print(f"已保存近似统计摘要：{sketch_file}")
+
+    # =========================
+    # 5. 输出 Top10 高频词
+    # =========================
+    sorted_words = sorted(
+        word_counts.items(),
+        key=lambda x: x[1],
+        reverse=True
+    )
+
+    print("\n标题中出现频率最高的词 Top10：")
+    for word, count in sorted_words[:10]:
+        print(f"{word}: {count}")
+
+    # =========================
+    # 6. 保存完整词频结果为 CSV
+    # =========================
+    word_freq_df = pd.DataFrame(
+        sorted_words,
+        columns=['word', 'count']
+    )
+
+    word_freq_df.to_csv(output_csv, index=False, encoding='utf_8_sig')
+
+    print(f"\n[OK] 词频统计结果已保存为：{output_csv}")
 
-word_freq_df.to_csv(output_csv, index=False, encoding='utf_8_sig')
 
-print(f"\n[OK] 词频统计结果已保存为：{output_csv}")
+if __name__ == "__main__":
+    main()
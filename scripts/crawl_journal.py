@@ -0,0 +1,88 @@
+"""
+爬取进度日志（断点续爬）
+功能：
+1. 只追加的 JSON Lines 日志，每完成一页（或一个评论游标）就连同该页的行写入一条
+2. 第一行记录本次爬取的参数，续爬时校验参数是否一致
+3. 读取时忽略中途被打断而写了一半的最后一行
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+
+class CrawlJournal:
+    """
+    用法：
+        journal = CrawlJournal("Python_搜索.csv.journal.jsonl")
+        journal.start({"keyword": "Python"}, resume=True)
+        for entry in journal.entries: ...
+        journal.append({"page": 1, "rows": [...]})
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta: Optional[Dict[str, Any]] = None
+        self.entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        self.meta = None
+        self.entries = []
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    # 写到一半被中断的行，之后的内容都不可信
+                    break
+                if "meta" in item:
+                    self.meta = item["meta"]
+                else:
+                    self.entries.append(item)
+
+    def start(self, meta: Dict[str, Any], resume: bool = False) -> None:
+        """
+        resume=True 且已有日志时加载已完成的条目，否则清空重来。
+        参数与已有日志不一致时抛 RuntimeError，避免把不同爬取混在一起。
+        """
+        if resume:
+            self.load()
+            if self.meta is not None:
+                if self.meta != meta:
+                    raise RuntimeError(f"续爬参数与日志不一致：日志={self.meta}，本次={meta}")
+                # 重写一遍，丢掉末尾可能残缺的行
+                self._rewrite()
+                return
+
+        self.meta = meta
+        self.entries = []
+        self._rewrite()
+
+    def _rewrite(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"meta": self.meta}, ensure_ascii=False) + "\n")
+            for item in self.entries:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """
+        只写盘，不放进 self.entries：entries 仅表示续爬时从日志加载的内容，
+        避免长时间爬取时日志内容在内存中不断累积。
+        """
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def remove(self) -> None:
+        """爬取完整结束、结果已落盘后删除日志。"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,363 @@
+"""
+近似高频项统计（Top-K），内存有界、可合并
+功能：
+1. SpaceSaving：最多保留 capacity 个计数器，每个计数的高估不超过 epsilon * 总数（capacity = ceil(1/epsilon)）
+2. CountMinTopK：Count-Min 草图 + 候选堆，草图大小由 (epsilon, delta) 决定，
+   以 1 - delta 的概率每个估计的高估不超过 epsilon * 总数
+3. 两者都支持 merge（不同分片 / 不同日期的摘要合并）以及 save / load（JSON）
+4. 接口与 collections.Counter 一致的部分：update / items / most_common，可直接替换 Counter
+
+用法示例：
+    hh = SpaceSaving(epsilon=0.001)
+    hh.update(["Python", "教程", "Python"])
+    hh.update({"深度学习": 3})
+    hh.most_common(10)
+    hh.save("day1.json")
+    # 合并多天 / 多个分片的摘要
+    python heavy_hitters.py --merge day1.json day2.json --out week.json --top 20
+"""
+
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import math
+from collections import Counter
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+DEFAULT_EPSILON = 0.001
+DEFAULT_DELTA = 0.01
+DEFAULT_CAPACITY = 1000
+
+Items = Union[Mapping[Hashable, int], Iterable[Hashable]]
+
+
+class _LazyMinHeap:
+    """item -> count 的最小堆，更新时只追加新条目，弹出时跳过过期条目。"""
+
+    def __init__(self):
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._seq = itertools.count()
+
+    def push(self, count: int, item: Hashable) -> None:
+        heapq.heappush(self._heap, (count, next(self._seq), item))
+
+    def peek_min(self, counts: Dict[Hashable, int]) -> Tuple[int, Hashable]:
+        while True:
+            count, _, item = self._heap[0]
+            if counts.get(item) == count:
+                return count, item
+            heapq.heappop(self._heap)
+
+    def rebuild(self, counts: Dict[Hashable, int], limit: int) -> None:
+        # 过期条目太多时重建，避免堆无限增长
+        if len(self._heap) > limit:
+            self._heap = [(c, next(self._seq), k) for k, c in counts.items()]
+            heapq.heapify(self._heap)
+
+
+class SpaceSaving:
+    """
+    Space-Saving 算法（支持加权更新）。
+    capacity: 计数器个数；不指定时按 epsilon 计算为 ceil(1/epsilon)
+    每个保留项的 count 是真实次数的上界，count - error 是下界；
+    真实次数超过 total / capacity 的项一定会被保留。
+    """
+
+    def __init__(self, capacity: Optional[int] = None, epsilon: Optional[float] = None):
+        if capacity is None:
+            capacity = math.ceil(1 / epsilon) if epsilon else DEFAULT_CAPACITY
+        self.capacity = int(capacity)
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+        self.total = 0
+        self._heap = _LazyMinHeap()
+
+    def add(self, item: Hashable, weight: int = 1) -> None:
+        self.total += weight
+        counts = self.counts
+        if item in counts:
+            counts[item] += weight
+        elif len(counts) < self.capacity:
+            counts[item] = weight
+            self.errors[item] = 0
+        else:
+            # 替换当前最小的计数器，新项继承其计数作为误差
+            min_count, min_item = self._heap.peek_min(counts)
+            del counts[min_item]
+            del self.errors[min_item]
+            counts[item] = min_count + weight
+            self.errors[item] = min_count
+        self._heap.push(counts[item], item)
+        self._heap.rebuild(counts, 4 * self.capacity)
+
+    def update(self, items: Items) -> None:
+        """与 Counter.update 相同：可传 {item: 次数} 或逐个 item 的可迭代对象。"""
+        if isinstance(items, Mapping):
+            for item, weight in items.items():
+                self.add(item, weight)
+        else:
+            for item in items:
+                self.add(item)
+
+    def min_count(self) -> int:
+        """计数器未满时为 0，否则为当前最小计数（未保留项真实次数的上界）。"""
+        if len(self.counts) < self.capacity:
+            return 0
+        return self._heap.peek_min(self.counts)[0]
+
+    def estimate(self, item: Hashable) -> int:
+        return self.counts.get(item, self.min_count())
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """
+        合并两个摘要，返回新摘要（不修改原摘要）。
+        一方未保留的项按该方的 min_count 计入计数和误差，合并后仍满足上界性质。
+        """
+        m1, m2 = self.min_count(), other.min_count()
+        merged = SpaceSaving(capacity=max(self.capacity, other.capacity))
+        merged.total = self.total + other.total
+        combined = []
+        for item in dict.fromkeys(itertools.chain(self.counts, other.counts)):
+            count = self.counts.get(item, m1) + other.counts.get(item, m2)
+            error = self.errors.get(item, m1) + other.errors.get(item, m2)
+            combined.append((count, error, item))
+        combined.sort(key=lambda x: x[0], reverse=True)
+        for count, error, item in combined[:merged.capacity]:
+            merged.counts[item] = count
+            merged.errors[item] = error
+            merged._heap.push(count, item)
+        return merged
+
+    def items(self) -> List[Tuple[Hashable, int]]:
+        return sorted(self.counts.items(), key=lambda x: x[1], reverse=True)
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        return self.items()[:n]
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[Hashable, int, int]]:
+        """返回 [(item, count, error)]，真实次数在 [count - error, count] 之间。"""
+        return [(k, c, self.errors[k]) for k, c in self.most_common(n)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": "spacesaving",
+            "capacity": self.capacity,
+            "total": self.total,
+            "items": [[k, c, self.errors[k]] for k, c in self.counts.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SpaceSaving":
+        hh = cls(capacity=data["capacity"])
+        hh.total = data["total"]
+        for item, count, error in data["items"]:
+            hh.counts[item] = count
+            hh.errors[item] = error
+            hh._heap.push(count, item)
+        return hh
+
+    def save(self, path: str) -> None:
+        save_sketch(self, path)
+
+
+class CountMinSketch:
+    """
+    Count-Min 草图。width = ceil(e / epsilon)，depth = ceil(ln(1 / delta))。
+    estimate 只会高估；相同 width / depth / seed 的草图可以直接相加合并。
+    """
+
+    def __init__(
+        self,
+        width: Optional[int] = None,
+        depth: Optional[int] = None,
+        epsilon: float = DEFAULT_EPSILON,
+        delta: float = DEFAULT_DELTA,
+        seed: int = 0,
+    ):
+        self.width = int(width or math.ceil(math.e / epsilon))
+        self.depth = int(depth or math.ceil(math.log(1 / delta)))
+        self.seed = seed
+        # 逐项更新时 Python 列表比 numpy 小数组的花式索引快得多
+        self.table: List[List[int]] = [[0] * self.width for _ in range(self.depth)]
+        self.total = 0
+        self._key = seed.to_bytes(8, "little")
+
+    def _indexes(self, item: Hashable) -> List[int]:
+        # 一次哈希得到两个 64 位值，按 h1 + i * h2 生成每行的位置（跨进程稳定）
+        digest = hashlib.blake2b(str(item).encode("utf-8"), digest_size=16, key=self._key).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, item: Hashable, weight: int = 1) -> int:
+        """加入 item 并返回其新的估计值。"""
+        self.total += weight
+        estimate = None
+        for row, j in zip(self.table, self._indexes(item)):
+            row[j] += weight
+            if estimate is None or row[j] < estimate:
+                estimate = row[j]
+        return estimate
+
+    def estimate(self, item: Hashable) -> int:
+        return min(row[j] for row, j in zip(self.table, self._indexes(item)))
+
+    def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+        if (self.width, self.depth, self.seed) != (other.width, other.depth, other.seed):
+            raise ValueError("只能合并 width / depth / seed 相同的 Count-Min 草图")
+        merged = CountMinSketch(self.width, self.depth, seed=self.seed)
+        merged.table = (np.asarray(self.table, dtype=np.int64) + np.asarray(other.table, dtype=np.int64)).tolist()
+        merged.total = self.total + other.total
+        return merged
+
+
+class CountMinTopK:
+    """
+    Count-Min 草图 + 候选最小堆，保留估计值最大的 capacity 个项。
+    适合项的种类极多、只关心头部的场景；接口同 SpaceSaving。
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_CAPACITY,
+        epsilon: float = DEFAULT_EPSILON,
+        delta: float = DEFAULT_DELTA,
+        seed: int = 0,
+        sketch: Optional[CountMinSketch] = None,
+    ):
+        self.capacity = int(capacity)
+        self.sketch = sketch or CountMinSketch(epsilon=epsilon, delta=delta, seed=seed)
+        self.counts: Dict[Hashable, int] = {}
+        self._heap = _LazyMinHeap()
+
+    @property
+    def total(self) -> int:
+        return self.sketch.total
+
+    def _offer(self, item: Hashable, estimate: int) -> None:
+        counts = self.counts
+        if item in counts or len(counts) < self.capacity:
+            counts[item] = estimate
+        else:
+            min_count, min_item = self._heap.peek_min(counts)
+            if estimate <= min_count:
+                return
+            del counts[min_item]
+            counts[item] = estimate
+        self._heap.push(estimate, item)
+        self._heap.rebuild(counts, 4 * self.capacity)
+
+    def add(self, item: Hashable, weight: int = 1) -> None:
+        self._offer(item, self.sketch.add(item, weight))
+
+    def update(self, items: Items) -> None:
+        if isinstance(items, Mapping):
+            for item, weight in items.items():
+                self.add(item, weight)
+        else:
+            for item in items:
+                self.add(item)
+
+    def estimate(self, item: Hashable) -> int:
+        return self.sketch.estimate(item)
+
+    def merge(self, other: "CountMinTopK") -> "CountMinTopK":
+        """草图相加，候选项取并集后按合并草图重新估计，保留前 capacity 个。"""
+        merged = CountMinTopK(max(self.capacity, other.capacity), sketch=self.sketch.merge(other.sketch))
+        for item in dict.fromkeys(itertools.chain(self.counts, other.counts)):
+            merged._offer(item, merged.sketch.estimate(item))
+        return merged
+
+    def items(self) -> List[Tuple[Hashable, int]]:
+        return sorted(self.counts.items(), key=lambda x: x[1], reverse=True)
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        return self.items()[:n]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": "countmin",
+            "capacity": self.capacity,
+            "width": self.sketch.width,
+            "depth": self.sketch.depth,
+            "seed": self.sketch.seed,
+            "total": self.sketch.total,
+            "table": self.sketch.table,
+            "items": [[k, c] for k, c in self.counts.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CountMinTopK":
+        sketch = CountMinSketch(data["width"], data["depth"], seed=data["seed"])
+        sketch.table = data["table"]
+        sketch.total = data["total"]
+        hh = cls(data["capacity"], sketch=sketch)
+        for item, count in data["items"]:
+            hh.counts[item] = count
+            hh._heap.push(count, item)
+        return hh
+
+    def save(self, path: str) -> None:
+        save_sketch(self, path)
+
+
+def make_counter(
+    method: Optional[str] = None,
+    epsilon: float = DEFAULT_EPSILON,
+    delta: float = DEFAULT_DELTA,
+    capacity: Optional[int] = None,
+):
+    """
+    method=None 返回精确的 Counter；"spacesaving" / "countmin" 返回对应的近似摘要。
+    三者都支持 update / items / most_common，调用方不需要区分。
+    """
+    if method is None:
+        return Counter()
+    if method == "spacesaving":
+        return SpaceSaving(capacity=capacity, epsilon=epsilon)
+    if method == "countmin":
+        return CountMinTopK(capacity or DEFAULT_CAPACITY, epsilon=epsilon, delta=delta)
+    raise ValueError(f"未知的近似统计方法：{method}（可选 spacesaving / countmin）")
+
+
+def save_sketch(hh, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(hh.to_dict(), f, ensure_ascii=False)
+
+
+def load_sketch(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {"spacesaving": SpaceSaving, "countmin": CountMinTopK}[data["type"]].from_dict(data)
+
+
+def merge_sketches(paths: Iterable[str]):
+    merged = None
+    for path in paths:
+        hh = load_sketch(path)
+        merged = hh if merged is None else merged.merge(hh)
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合并近似 Top-K 摘要（不同分片 / 不同日期）")
+    parser.add_argument("--merge", nargs="+", required=True, help="要合并的摘要文件（JSON）")
+    parser.add_argument("--out", default=None, help="合并后的摘要保存路径")
+    parser.add_argument("--top", type=int, default=10, help="打印前 N 项")
+    args = parser.parse_args()
+
+    merged = merge_sketches(args.merge)
+    if args.out:
+        merged.save(args.out)
+        print(f"[OK] 已合并 {len(args.merge)} 个摘要 -> {args.out}")
+    print(f"总计数：{merged.total}")
+    for item, count in merged.most_common(args.top):
+        print(f"{item}: {count}")
+
+
+if __name__ == "__main__":
+    main()
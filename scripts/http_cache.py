@@ -0,0 +1,224 @@
+"""
+HTTP 响应本地缓存（SQLite）
+功能：
+1. 以 URL + 参数的哈希作为键缓存接口返回的 JSON
+2. 按接口设置过期时间（TTL），bvid -> aid 这类不会变化的数据永久缓存
+3. 按总大小做 LRU 淘汰
+4. 离线模式：只读缓存，未命中直接报错，不发任何网络请求
+5. 请求被限流（412 / 429 / 5xx）或网络出错时退避后重试
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+try:
+    from .bili_metrics import inc, timer  # 作为 scripts 包导入（如 notebook）
+    from .rate_limit import RETRY_CODES, RETRY_STATUS, AdaptiveThrottle, backoff_delay, retry_after_seconds
+except ImportError:
+    from bili_metrics import inc, timer  # 在 scripts/ 下直接运行
+    from rate_limit import RETRY_CODES, RETRY_STATUS, AdaptiveThrottle, backoff_delay, retry_after_seconds
+
+# 按 URL 路径匹配的默认 TTL（秒），None 表示永不过期
+DEFAULT_TTLS = {
+    "/x/web-interface/view": None,
+    "/x/web-interface/search/type": 6 * 3600,
+    "/x/v2/reply/main": 3600,
+}
+DEFAULT_TTL = 3600
+
+DEFAULT_CACHE_PATH = "bili_http_cache.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_RETRIES = 4  # 被限流 / 网络出错时的默认重试次数
+
+
+class CacheMiss(RuntimeError):
+    """离线模式下缓存未命中。"""
+
+
+class ResponseCache:
+    """
+    path:      SQLite 文件路径
+    max_bytes: 缓存正文总大小上限，超出后按最近访问时间淘汰
+    ttls:      {URL 路径片段: TTL 秒数 或 None}，覆盖 DEFAULT_TTLS
+    offline:   True 时只读缓存，未命中抛 CacheMiss
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttls: Optional[Dict[str, Optional[float]]] = None,
+        offline: bool = False,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " url TEXT,"
+            " body BLOB,"
+            " size INTEGER,"
+            " created REAL,"
+            " expires REAL,"
+            " accessed REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        items = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        raw = url + "?" + json.dumps(items, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, url: str) -> Optional[float]:
+        for fragment, ttl in self.ttls.items():
+            if fragment in url:
+                return ttl
+        return DEFAULT_TTL
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        key = self.make_key(url, params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, expires FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            body, expires = row
+            if expires is not None and expires < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(zlib.decompress(body).decode("utf-8"))
+
+    def put(self, url: str, params: Optional[Dict[str, Any]], payload: Dict[str, Any]) -> None:
+        key = self.make_key(url, params)
+        body = zlib.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        ttl = self.ttl_for(url)
+        expires = now + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, url, body, size, created, expires, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, body, len(body), now, expires, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 先清理已过期的，再按最近访问时间从旧到新淘汰
+        self._conn.execute("DELETE FROM responses WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def is_cacheable(status_code: int, j: Optional[Dict[str, Any]]) -> bool:
+    # 只缓存成功的响应，412 / 接口报错不能缓存
+    return status_code == 200 and bool(j) and j.get("code") == 0
+
+
+def cached_get(
+    session: requests.Session,
+    url: str,
+    params: Dict[str, Any],
+    cache: Optional[ResponseCache] = None,
+    timeout=(20, 60),
+    limiter=None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+) -> Dict[str, Any]:
+    """
+    带缓存的 GET，返回 {"status_code", "json", "from_cache"}。
+    cache 为 None 时等同于直接请求；limiter 只在真正发请求前 acquire，
+    命中缓存不消耗请求预算。
+    遇到 412 / 429 / 5xx、接口 code 为 -412 / -509 等限流或网络错误时，退避后重试最多 max_retries 次：
+    limiter 为 AdaptiveThrottle 时由它统一降速并暂停所有 worker，否则本线程按指数退避等待。
+    重试用尽后返回最后一次响应（网络错误则抛出），由调用方按原来的方式报错。
+    每次请求记录耗时（http_request）、状态码、下载字节数、重试和缓存命中数，按接口路径区分。
+    """
+    endpoint = urlparse(url).path
+    if cache is not None:
+        hit = cache.get(url, params)
+        if hit is not None:
+            inc("http_cache_hits", endpoint=endpoint)
+            return {"status_code": 200, "json": hit, "from_cache": True}
+        if cache.offline:
+            raise CacheMiss(f"离线模式下缓存未命中：{url} {params}")
+
+    adaptive = isinstance(limiter, AdaptiveThrottle)
+
+    def throttled(attempt: int, reason, retry_after: Optional[float] = None) -> None:
+        inc("retries", endpoint=endpoint, reason=reason)
+        if adaptive:
+            limiter.failure(retry_after)  # 暂停在下一次 acquire 中生效
+        else:
+            time.sleep(retry_after if retry_after is not None else backoff_delay(attempt))
+
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            with timer("http_request", endpoint=endpoint):
+                r = session.get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            throttled(attempt, type(e).__name__)
+            continue
+        inc("http_responses", endpoint=endpoint, status=r.status_code)
+        inc("http_bytes", len(r.content), endpoint=endpoint)
+        try:
+            j = r.json()
+        except Exception:
+            j = None
+
+        code = j.get("code") if isinstance(j, dict) else None
+        if r.status_code in RETRY_STATUS or code in RETRY_CODES:
+            if attempt < max_retries:
+                throttled(attempt, code if code in RETRY_CODES else r.status_code, retry_after_seconds(r))
+                continue
+        elif adaptive:
+            limiter.success()
+        break
+
+    if cache is not None and is_cacheable(r.status_code, j):
+        cache.put(url, params, j)
+    return {"status_code": r.status_code, "json": j, "from_cache": False}
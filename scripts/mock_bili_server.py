@@ -0,0 +1,363 @@
+"""
+本地模拟 B 站 / DeepSeek 接口（离线测试与压测用）
+功能：
+1. 模拟搜索（search/type）、视频信息（view）、评论（reply/main）、楼中楼（reply/reply）和 chat/completions 接口
+2. 返回的数据按关键词 / 页码 / aid 确定性生成，同样的请求每次结果相同
+3. 可配置每个请求的延迟、搜索总页数、每个视频的评论数，以及按概率注入 412（反爬）/ 429（限流）
+4. patch_endpoints 把各爬虫 / 分析脚本的接口地址指向本地服务，不需要 Cookie 和 API Key
+
+用法示例：
+    # 单独启动，供其他脚本手动指向
+    python mock_bili_server.py --port 8765 --latency 0.05 --p412 0.02
+    # 在代码中使用
+    with MockBiliServer(latency=0.02) as server:
+        patch_endpoints(server.base_url)
+        ...
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+SEARCH_PATH = "/x/web-interface/search/type"
+VIEW_PATH = "/x/web-interface/view"
+REPLY_MAIN_PATH = "/x/v2/reply/main"
+REPLY_DETAIL_PATH = "/x/v2/reply/reply"
+CHAT_PATH = "/v1/chat/completions"
+
+REPLY_PAGE_SIZE = 20
+SUB_REPLY_PAGE_SIZE = 20
+
+_WORDS = (
+    "入门", "教程", "实战", "项目", "零基础", "讲解", "源码", "面试", "算法", "模型", "数据", "分析",
+    "可视化", "爬虫", "神经网络", "训练", "部署", "环境", "配置", "课程", "全套", "合集", "笔记", "速成",
+)
+_TYPES = ("知识", "科技", "计算机技术", "校园学习", "科学科普", "野生技术协会")
+_COMMENTS = (
+    "讲得太好了，感谢up主", "前排", "12:30 这里没听懂", "求课件链接", "标题党，浪费时间",
+    "学到了，三连支持", "up主声音好听", "这个环境配置能出一期吗？", "[doge]", "就这？",
+    "看完了，很有用", "不太行，讲得太快了", "打卡第三天", "催更催更", "这期内容有点水",
+)
+
+
+def _rng(*parts: Any) -> random.Random:
+    # 按请求参数确定性生成数据：同一页 / 同一视频每次返回相同内容
+    seed = hashlib.md5("\0".join(map(str, parts)).encode("utf-8")).hexdigest()
+    return random.Random(int(seed[:16], 16))
+
+
+def mock_bvid(aid: int) -> str:
+    return f"BV1MK{aid:07d}"
+
+
+def mock_aid(bvid: str) -> Optional[int]:
+    m = re.fullmatch(r"BV1MK(\d{7})", bvid or "")
+    return int(m.group(1)) if m else None
+
+
+def make_video(keyword: str, page: int, index: int, page_size: int = 20) -> Dict[str, Any]:
+    """搜索结果中的一条视频，字段与真实接口一致（计数有时为“1.2万”这样的字符串）。"""
+    r = _rng("video", keyword, page, index)
+    prefix = int(hashlib.md5(keyword.encode("utf-8")).hexdigest()[:8], 16) % 900 + 100
+    aid = (prefix * 10000 + (page - 1) * page_size + index) % 10_000_000
+    title_words = r.sample(_WORDS, 3)
+    title_words.insert(r.randrange(4), f'<em class="keyword">{keyword}</em>')
+    view = r.randint(100, 3_000_000)
+    return {
+        "type": "video",
+        "aid": aid,
+        "bvid": mock_bvid(aid),
+        "title": "".join(title_words),
+        "description": f"{keyword} {r.choice(_WORDS)}，{r.choice(_WORDS)}",
+        "author": f"UP主{r.randint(1, 200)}",
+        "mid": r.randint(10000, 99999999),
+        "typename": r.choice(_TYPES),
+        "tag": ",".join([keyword] + r.sample(_WORDS, 3)),
+        "pubdate": 1_600_000_000 + r.randint(0, 150_000_000),
+        "play": f"{view / 10000:.1f}万" if view >= 10000 else view,
+        "video_review": r.randint(0, 5000),
+        "like": r.randint(0, 100000),
+        "favorites": r.randint(0, 50000),
+        "duration": f"{r.randint(1, 90)}:{r.randint(0, 59):02d}",
+    }
+
+
+def make_reply(aid: int, rpid: int, root: int = 0, rcount: int = 0) -> Dict[str, Any]:
+    r = _rng("reply", aid, rpid)
+    return {
+        "rpid": rpid,
+        "oid": aid,
+        "root": root,
+        "parent": root,
+        "rcount": rcount,
+        "like": r.randint(0, 500),
+        "ctime": 1_700_000_000 + r.randint(0, 30_000_000),
+        "member": {"mid": str(r.randint(10000, 99999999)), "uname": f"用户{r.randint(1, 100000)}"},
+        "content": {"message": r.choice(_COMMENTS)},
+    }
+
+
+def mock_sentiment(text: str) -> Tuple[int, str]:
+    label = int(hashlib.md5(text.encode("utf-8")).hexdigest(), 16) % 3 - 1
+    return label, "模拟接口的判断"
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # 并发压测时连接较多，默认的 5 容易被拒绝
+
+
+class MockBiliServer:
+    """
+    latency:          B站接口每个请求的平均延迟（秒），实际延迟在 [0.5, 1.5] 倍之间随机
+    llm_latency:      chat/completions 每个请求的平均延迟（秒）
+    p412 / p429:      每个请求返回 412 / 429 的概率（412 只注入 B站接口）
+    search_pages:     每个关键词的搜索结果总页数，超出后返回空列表
+    comments_per_video: 每个视频的根评论数
+    sub_ratio / sub_replies: 有楼中楼的根评论比例，以及每楼的回复数
+    stats:            按接口路径统计的请求数和注入的错误数
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        llm_latency: float = 0.0,
+        p412: float = 0.0,
+        p429: float = 0.0,
+        search_pages: int = 50,
+        comments_per_video: int = 200,
+        sub_ratio: float = 0.2,
+        sub_replies: int = 5,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.llm_latency = llm_latency
+        self.p412 = p412
+        self.p429 = p429
+        self.search_pages = search_pages
+        self.comments_per_video = comments_per_video
+        self.sub_ratio = sub_ratio
+        self.sub_replies = sub_replies
+        self.stats: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = _Server((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockBiliServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def __enter__(self) -> "MockBiliServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _inject(self, path: str) -> Optional[int]:
+        with self._lock:
+            x = self._random.random()
+        if path != CHAT_PATH and x < self.p412:
+            return 412
+        if x < self.p412 + self.p429:
+            return 429
+        return None
+
+    def _delay(self, path: str) -> None:
+        base = self.llm_latency if path == CHAT_PATH else self.latency
+        if base > 0:
+            with self._lock:
+                factor = self._random.uniform(0.5, 1.5)
+            time.sleep(base * factor)
+
+    # ---------- 各接口 ----------
+
+    def search(self, q: Dict[str, str]) -> Dict[str, Any]:
+        keyword = q.get("keyword", "")
+        page = int(q.get("page", 1))
+        page_size = int(q.get("page_size", 20))
+        result = []
+        if 1 <= page <= self.search_pages:
+            result = [make_video(keyword, page, i, page_size) for i in range(page_size)]
+        return {"code": 0, "message": "0", "data": {
+            "page": page, "pagesize": page_size, "numPages": self.search_pages,
+            "numResults": self.search_pages * page_size, "result": result,
+        }}
+
+    def view(self, q: Dict[str, str]) -> Dict[str, Any]:
+        aid = mock_aid(q.get("bvid", ""))
+        if aid is None:
+            return {"code": -400, "message": "请求错误"}
+        return {"code": 0, "message": "0", "data": {"aid": aid, "bvid": mock_bvid(aid), "title": f"视频{aid}"}}
+
+    def _rcount(self, aid: int, index: int) -> int:
+        return self.sub_replies if _rng("rcount", aid, index).random() < self.sub_ratio else 0
+
+    def reply_main(self, q: Dict[str, str]) -> Dict[str, Any]:
+        aid = int(q.get("oid", 0))
+        page = max(1, int(q.get("next", 0)))  # next=0 与 1 都是第一页
+        start = (page - 1) * REPLY_PAGE_SIZE
+        stop = min(start + REPLY_PAGE_SIZE, self.comments_per_video)
+        replies = [
+            make_reply(aid, aid * 100000 + (i + 1) * 100, rcount=self._rcount(aid, i))
+            for i in range(start, stop)
+        ]
+        return {"code": 0, "message": "0", "data": {
+            "cursor": {"is_begin": page == 1, "next": page + 1, "is_end": stop >= self.comments_per_video},
+            "replies": replies,
+        }}
+
+    def reply_detail(self, q: Dict[str, str]) -> Dict[str, Any]:
+        aid, root = int(q.get("oid", 0)), int(q.get("root", 0))
+        pn, ps = int(q.get("pn", 1)), int(q.get("ps", SUB_REPLY_PAGE_SIZE))
+        index = (root - aid * 100000) // 100 - 1
+        total = self._rcount(aid, index)
+        start = (pn - 1) * ps
+        replies = [make_reply(aid, root + i + 1, root=root) for i in range(start, min(start + ps, total))]
+        return {"code": 0, "message": "0", "data": {"page": {"num": pn, "size": ps, "count": total}, "replies": replies}}
+
+    def chat(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = body["messages"][-1]["content"]
+        items = [json.loads(line) for line in prompt.splitlines() if line.startswith('{"id"')]
+        if items:
+            content = {"results": [
+                dict(zip(("id", "sentiment", "reason"), (it["id"],) + mock_sentiment(it["text"]))) for it in items
+            ]}
+        else:
+            m = re.search(r'文本内容："(.*)"\n', prompt, flags=re.S)
+            label, reason = mock_sentiment(m.group(1) if m else prompt)
+            content = {"sentiment": label, "reason": reason}
+        return {
+            "id": "mock",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                "role": "assistant", "content": json.dumps(content, ensure_ascii=False),
+            }}],
+        }
+
+    def _handler_class(self):
+        server = self
+        routes = {
+            SEARCH_PATH: server.search,
+            VIEW_PATH: server.view,
+            REPLY_MAIN_PATH: server.reply_main,
+            REPLY_DETAIL_PATH: server.reply_detail,
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, status: int, payload: Optional[Dict[str, Any]] = None) -> None:
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _prepare(self) -> Tuple[str, bool]:
+                path = urlparse(self.path).path
+                server._count(path)
+                server._delay(path)
+                status = server._inject(path)
+                if status is None:
+                    return path, True
+                server._count(f"{path} {status}")
+                self._send(status, {"code": -status, "message": "mock injected error"} if status == 429 else None)
+                return path, False
+
+            def do_GET(self) -> None:
+                path, ok = self._prepare()
+                if not ok:
+                    return
+                route = routes.get(path)
+                if route is None:
+                    self._send(404, {"code": -404, "message": "啥都木有"})
+                    return
+                q = {k: v[-1] for k, v in parse_qs(urlparse(self.path).query).items()}
+                self._send(200, route(q))
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                path, ok = self._prepare()
+                if not ok:
+                    return
+                if path.rstrip("/").endswith("/chat/completions"):
+                    self._send(200, server.chat(json.loads(raw)))
+                else:
+                    self._send(404, {"error": "not found"})
+
+        return Handler
+
+
+def patch_endpoints(base_url: str) -> None:
+    """把爬虫 / 分析脚本中的接口地址改为 base_url（本地模拟服务），对之后的请求生效。"""
+    import api_comments
+    import bili_search_scraper
+    import bilibili_comments
+
+    bili_search_scraper.SEARCH_URL = base_url + SEARCH_PATH
+    bilibili_comments.VIEW_URL = base_url + VIEW_PATH
+    bilibili_comments.REPLY_MAIN_URL = base_url + REPLY_MAIN_PATH
+    bilibili_comments.REPLY_DETAIL_URL = base_url + REPLY_DETAIL_PATH
+    api_comments.BASE_URL = base_url + "/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 B站 / DeepSeek 接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="B站接口平均延迟（秒）")
+    parser.add_argument("--llm_latency", type=float, default=0.0, help="chat/completions 平均延迟（秒）")
+    parser.add_argument("--p412", type=float, default=0.0, help="返回 412 的概率")
+    parser.add_argument("--p429", type=float, default=0.0, help="返回 429 的概率")
+    parser.add_argument("--search_pages", type=int, default=50, help="每个关键词的搜索结果页数")
+    parser.add_argument("--comments", type=int, default=200, help="每个视频的根评论数")
+    args = parser.parse_args()
+
+    server = MockBiliServer(
+        args.host, args.port, latency=args.latency, llm_latency=args.llm_latency,
+        p412=args.p412, p429=args.p429, search_pages=args.search_pages, comments_per_video=args.comments,
+    )
+    print(f"[OK] 模拟接口已启动：{server.base_url}")
+    print(f"     搜索 {server.base_url}{SEARCH_PATH}  评论 {server.base_url}{REPLY_MAIN_PATH}")
+    print(f"     DeepSeek BASE_URL = {server.base_url}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+请求速率控制
+功能：
+1. 令牌桶限速器 RateLimiter，多个并发 worker 共享同一个每秒请求预算
+2. 协程版本 AsyncRateLimiter，供 asyncio 爬虫使用
+3. Backoff：多个 worker 共享的退避，任一请求被限流（429/5xx）时所有 worker 一起暂停
+4. AdaptiveThrottle：AIMD 自适应限速，响应正常时逐步提速，被限流（412/429/5xx）时减半并退避，
+   稳定后的吞吐贴近服务端能容忍的上限
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    线程安全的令牌桶限速器。
+    rate:  每秒发放的令牌数，即所有 worker 合计的 requests-per-second 上限
+    burst: 桶容量，允许的瞬时突发请求数（默认 1，即严格匀速）
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 1):
+        if rate <= 0:
+            raise ValueError(f"rate 必须大于 0：{rate}")
+        self.rate = float(rate)
+        self.capacity = max(1, int(burst))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self) -> None:
+        """阻塞直到拿到一个令牌。"""
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AsyncRateLimiter:
+    """
+    asyncio 版令牌桶，参数含义同 RateLimiter。
+    只能在同一个事件循环内共享。
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 1):
+        if rate <= 0:
+            raise ValueError(f"rate 必须大于 0：{rate}")
+        self.rate = float(rate)
+        self.capacity = max(1, int(burst))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # 持锁等待，保证先到先得
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._tokens = 1.0
+                self._last = time.monotonic()
+            self._tokens -= 1
+
+
+class Backoff:
+    """
+    线程安全的共享退避。
+    每次 failure() 把暂停时间翻倍（base 起步，不超过 max_delay，带随机抖动），
+    在暂停结束前所有调用 wait() 的 worker 都会等待；success() 把暂停时间减半直至归零。
+    服务端给出 Retry-After 时以它为准。
+    """
+
+    def __init__(self, base: float = 1.0, max_delay: float = 60.0):
+        self.base = float(base)
+        self.max_delay = float(max_delay)
+        self.delay = 0.0
+        self._until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """阻塞直到当前的暂停结束。"""
+        while True:
+            with self._lock:
+                remaining = self._until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def failure(self, retry_after: Optional[float] = None) -> float:
+        """记录一次被限流，返回本次暂停秒数。"""
+        with self._lock:
+            self.delay = min(self.max_delay, self.delay * 2 if self.delay else self.base)
+            pause = retry_after if retry_after is not None else self.delay * random.uniform(0.5, 1.0)
+            self._until = max(self._until, time.monotonic() + pause)
+            return pause
+
+    def success(self) -> None:
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.base else 0.0
+
+
+# 视为“被限流 / 暂时失败”、应当退避后重试的 HTTP 状态码，以及 B站接口 JSON 中的 code
+RETRY_STATUS = (412, 429, 500, 502, 503, 504)
+RETRY_CODES = (-412, -509, -799)  # 请求被拦截 / 请求过于频繁
+
+
+def retry_after_seconds(resp) -> Optional[float]:
+    """响应头 Retry-After 的秒数，没有或无法解析时返回 None。"""
+    value = resp.headers.get("Retry-After")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 1.0, max_delay: float = 60.0) -> float:
+    """第 attempt 次（从 0 起）重试前的等待秒数：指数增长，带 0.5–1.0 倍随机抖动。"""
+    return min(max_delay, base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+class AdaptiveThrottle(RateLimiter):
+    """
+    线程安全的 AIMD 自适应限速器，可直接替代 RateLimiter 传给各爬虫的 limiter 参数。
+    success()：加性增长，每次成功把速率提高 increase / rate，即健康时大约每秒提高 increase 次/秒
+    failure()：乘性减小，速率乘以 decrease（cooldown 秒内的多次失败只减一次），
+               同时按 Backoff 暂停所有 worker（指数退避 + 抖动，服务端给出 Retry-After 时以它为准）
+    rate 始终在 [min_rate, max_rate] 之间。
+    也可以代替 Backoff 传给 api_comments.post_chat：wait() 与 acquire() 相同。
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        min_rate: float = 0.2,
+        max_rate: float = 20.0,
+        increase: float = 0.1,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+        burst: int = 1,
+        backoff: Optional[Backoff] = None,
+    ):
+        super().__init__(rate, burst)
+        self.min_rate = float(min_rate)
+        self.max_rate = max(float(max_rate), self.rate)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.cooldown = float(cooldown)
+        self.backoff = backoff or Backoff()
+        self.successes = 0
+        self.failures = 0
+        self._last_cut = 0.0
+
+    def acquire(self) -> None:
+        self.backoff.wait()
+        super().acquire()
+
+    wait = acquire
+
+    def _set_rate(self, rate: float) -> None:
+        # 先按旧速率补充令牌，再换速率
+        self._refill(time.monotonic())
+        self.rate = min(self.max_rate, max(self.min_rate, rate))
+
+    def success(self) -> None:
+        with self._lock:
+            self.successes += 1
+            self._set_rate(self.rate + self.increase / self.rate)
+        self.backoff.success()
+
+    def failure(self, retry_after: Optional[float] = None) -> float:
+        """记录一次被限流，返回本次暂停秒数。"""
+        with self._lock:
+            self.failures += 1
+            now = time.monotonic()
+            if now - self._last_cut >= self.cooldown:
+                self._last_cut = now
+                self._set_rate(self.rate * self.decrease)
+        return self.backoff.failure(retry_after)
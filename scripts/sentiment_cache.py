@@ -0,0 +1,109 @@
+"""
+评论情绪分类结果缓存（SQLite）
+功能：
+1. 以「归一化后的评论文本 + 模型 + 指令版本」的哈希作为键缓存 (sentiment_label, reason)
+2. 跨视频、跨运行复用：同样的“前排”“打卡”只需要请求一次
+3. 改了指令或换了模型后键随之变化，旧结果不会被误用
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable, Tuple
+
+DEFAULT_SENTIMENT_CACHE_PATH = "sentiment_cache.sqlite"
+
+_SPACES = re.compile(r"\s+")
+
+# api_comments.analyze_sentiment 兜底返回的理由前缀，这类结果不写入缓存，也不用作训练样本
+FALLBACK_PREFIXES = ("API请求失败", "异常兜底", "标签不合法")
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角（NFKC）、英文转小写、合并空白，用于判断两条评论是否相同。"""
+    text = unicodedata.normalize("NFKC", str(text or ""))
+    return _SPACES.sub(" ", text).strip().lower()
+
+
+def is_fallback(reason: str) -> bool:
+    """是否为请求失败 / 解析失败时的兜底结果（不是模型给出的真实标签）。"""
+    return str(reason).startswith(FALLBACK_PREFIXES)
+
+
+class SentimentCache:
+    """
+    用法：
+        cache = SentimentCache()
+        hit = cache.get_many(texts, model="deepseek-chat", prompt_version="1")
+        cache.put_many({text: (1, "夸赞")}, model="deepseek-chat", prompt_version="1")
+    """
+
+    def __init__(self, path: str = DEFAULT_SENTIMENT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sentiments ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT,"
+            " prompt_version TEXT,"
+            " text TEXT,"
+            " label INTEGER,"
+            " reason TEXT,"
+            " created REAL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(text: str, model: str, prompt_version: str) -> str:
+        raw = f"{model}\0{prompt_version}\0{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_many(
+        self, texts: Iterable[str], model: str, prompt_version: str
+    ) -> Dict[str, Tuple[int, str]]:
+        """返回 {text: (label, reason)}，只包含命中的文本。"""
+        keys = {self.make_key(t, model, prompt_version): t for t in texts}
+        found: Dict[str, Tuple[int, str]] = {}
+        items = list(keys.items())
+        with self._lock:
+            # SQLite 单条语句的参数个数有限，分批查询
+            for start in range(0, len(items), 500):
+                chunk = items[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                for key, label, reason in self._conn.execute(
+                    f"SELECT key, label, reason FROM sentiments WHERE key IN ({marks})",
+                    [k for k, _ in chunk],
+                ):
+                    found[keys[key]] = (int(label), reason)
+        return found
+
+    def put_many(self, results: Dict[str, Tuple[int, str]], model: str, prompt_version: str) -> None:
+        now = time.time()
+        rows = [
+            (self.make_key(t, model, prompt_version), model, prompt_version, normalize_text(t), label, reason, now)
+            for t, (label, reason) in results.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sentiments (key, model, prompt_version, text, label, reason, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sentiments").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sentiments")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
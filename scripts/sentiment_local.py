@@ -0,0 +1,269 @@
+"""
+本地评论情绪预分类（LLM 之前的第一层）
+功能：
+1. 规则：纯表情 / 符号、“前排”“打卡”、问时间点、求资源等直接判为中性（0）
+2. 情感词典：积极 / 消极词命中计数，处理“不好看”这类否定，遇到反讽标记降低置信度
+3. 可选的线性模型：jieba 分词 + softmax 回归，可用 LLM 标注过的结果训练
+4. 每条结果带置信度，高于阈值的在本地直接定标签，其余交给 LLM
+
+用法示例：
+    # 用已有的 LLM 标注结果训练本地模型
+    python sentiment_local.py --train BV1xx411c7mD_comments_with_sentiment.csv --model sentiment_model.json
+    # 查看某个阈值下本地能处理多少条、与 LLM 标签的一致率
+    python sentiment_local.py --eval BV1xx411c7mD_comments_with_sentiment.csv --model sentiment_model.json --threshold 0.85
+"""
+
+import argparse
+import json
+import re
+from typing import List, Optional, Sequence, Tuple
+
+import jieba
+import numpy as np
+import pandas as pd
+
+try:
+    from .bili_storage import read_table  # 作为 scripts 包导入（如 notebook）
+    from .sentiment_cache import is_fallback, normalize_text
+except ImportError:
+    from bili_storage import read_table  # 在 scripts/ 下直接运行
+    from sentiment_cache import is_fallback, normalize_text
+
+DEFAULT_THRESHOLD = 0.85
+
+POSITIVE_WORDS = (
+    "好看", "好听", "好棒", "太好了", "真好", "很好", "不错", "讲得好", "说得好", "做得好", "好评",
+    "喜欢", "爱了", "支持", "感谢", "谢谢", "厉害", "牛逼", "太牛", "真牛", "太强", "优秀",
+    "精彩", "有趣", "有用", "实用", "干货", "学到了", "受益", "宝藏", "推荐", "三连", "点赞",
+    "佩服", "良心", "清晰", "通俗易懂", "绝了", "yyds", "神作", "催更", "期待", "666", "nb", "awsl", "xswl",
+)
+NEGATIVE_WORDS = (
+    "垃圾", "辣鸡", "无聊", "难看", "难听", "恶心", "失望", "误导", "骗", "标题党", "烂",
+    "差劲", "太差", "很差", "差评", "水视频", "智商税", "取关", "退钱", "浪费时间", "不行",
+    "离谱", "尴尬", "抄袭", "营销号", "无语", "什么玩意", "看不下去", "劝退", "答辩",
+)
+NEGATIONS = ("不", "没", "别")
+# 出现这些时字面意思不可信（反讽 / 阴阳怪气），只给低置信度
+SARCASM_MARKERS = ("呵呵", "笑死", "就这", "阴阳", "不愧是", "真有你的", "？？", "??", "[doge]", "[吃瓜]", "[微笑]")
+
+_EMOTE = re.compile(r"\[[^\[\]]{1,12}\]")  # B站表情，如 [doge] [笑哭]
+_NOISE = re.compile(r"^[\W_]{0,12}$")  # 只剩符号；数字 / 字母缩写（666、yyds）交给词典，查不到时置信度低于阈值
+_GREETING = re.compile(r"^(前排|沙发|第一|首评|打卡|来了|路过|占楼|占座|\d+楼|火钳刘明|mark|留名|马克)[\W_]*$")
+_TIMESTAMP = re.compile(r"\d{1,2}[:：]\d{2}")
+_QUESTION = re.compile(r"[?？吗呢]|什么|哪|多少")
+_ASK_RESOURCE = re.compile(r"求(资源|链接|网盘|原曲|出处|教程|代码|课件|原视频|bgm)|bgm是|叫什么|在哪(里)?(看|下载)")
+
+# (label, confidence, reason)
+LocalResult = Tuple[int, float, str]
+
+
+def rule_classify(text: str) -> LocalResult:
+    """规则 + 情感词典，返回 (标签, 置信度, 理由)。"""
+    norm = normalize_text(text)
+    plain = _EMOTE.sub("", norm).strip()
+
+    if not plain or _NOISE.match(plain):
+        return 0, 0.95, "本地规则：纯表情/符号"
+    if _GREETING.match(plain):
+        return 0, 0.95, "本地规则：前排/打卡类刷屏"
+    if _ASK_RESOURCE.search(plain):
+        return 0, 0.9, "本地规则：求资源/问出处"
+    if _TIMESTAMP.search(plain) and (_QUESTION.search(plain) or len(_TIMESTAMP.sub("", plain).strip()) <= 4):
+        return 0, 0.9, "本地规则：时间点标注/提问"
+
+    pos = neg = 0
+    negated = False
+    for words, sign in ((POSITIVE_WORDS, 1), (NEGATIVE_WORDS, -1)):
+        for w in words:
+            start = plain.find(w)
+            while start != -1:
+                # 前 3 个字内有否定词时取反，如“不好看”“没什么用”
+                flip = any(n in plain[max(0, start - 3):start] for n in NEGATIONS)
+                negated = negated or flip
+                if sign * (-1 if flip else 1) > 0:
+                    pos += 1
+                else:
+                    neg += 1
+                start = plain.find(w, start + len(w))
+
+    if any(m in norm for m in SARCASM_MARKERS):
+        return (1 if pos > neg else -1 if neg > pos else 0), 0.4, "本地词典：疑似反讽"
+    if pos == 0 and neg == 0:
+        return 0, 0.5, "本地词典：无情感词"
+    if pos and neg:
+        return (1 if pos > neg else -1 if neg > pos else 0), 0.5, "本地词典：积极消极词混杂"
+
+    hits = pos + neg
+    confidence = min(0.95, 0.75 + 0.1 * hits)
+    if len(plain) > 30:
+        confidence -= 0.15  # 长评论往往有转折，交给 LLM
+    if negated:
+        confidence = min(confidence, 0.8)
+    label = 1 if pos else -1
+    return label, round(confidence, 2), f"本地词典：{'积极' if label > 0 else '消极'}词 {hits} 个"
+
+
+def tokenize(text: str) -> List[str]:
+    return [w for w in jieba.lcut(_EMOTE.sub(" ", normalize_text(text))) if w.strip()]
+
+
+class LinearSentimentModel:
+    """
+    jieba 词袋 + softmax 回归（三分类 -1 / 0 / 1），只依赖 numpy。
+    用法：
+        model = LinearSentimentModel().fit(texts, labels)
+        model.save("sentiment_model.json")
+        probs = LinearSentimentModel.load("sentiment_model.json").predict_proba(texts)
+    """
+
+    LABELS = (-1, 0, 1)
+
+    def __init__(self, vocab: Optional[dict] = None, weights: Optional[np.ndarray] = None):
+        self.vocab = vocab or {}
+        self.weights = weights
+
+    def _features(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # 稀疏表示：每条文本 = 第 0 维偏置 + 去重后的词，权重按 1/sqrt(词数) 归一
+        idx, vals, offsets = [], [], []
+        for t in texts:
+            ids = sorted({self.vocab[w] for w in tokenize(t) if w in self.vocab})
+            offsets.append(len(idx))
+            idx.append(0)
+            vals.append(1.0)
+            if ids:
+                scale = 1.0 / np.sqrt(len(ids))
+                idx.extend(ids)
+                vals.extend([scale] * len(ids))
+        return np.asarray(idx), np.asarray(vals), np.asarray(offsets)
+
+    def _scores(self, idx: np.ndarray, vals: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        scores = np.add.reduceat(self.weights[idx] * vals[:, None], offsets, axis=0)
+        scores -= scores.max(axis=1, keepdims=True)
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def fit(
+        self,
+        texts: Sequence[str],
+        labels: Sequence[int],
+        min_count: int = 2,
+        epochs: int = 200,
+        lr: float = 2.0,
+        l2: float = 1e-4,
+    ) -> "LinearSentimentModel":
+        counts = {}
+        for t in texts:
+            for w in set(tokenize(t)):
+                counts[w] = counts.get(w, 0) + 1
+        words = sorted(w for w, c in counts.items() if c >= min_count)
+        self.vocab = {w: i + 1 for i, w in enumerate(words)}  # 0 号为偏置
+        self.weights = np.zeros((len(self.vocab) + 1, len(self.LABELS)))
+
+        idx, vals, offsets = self._features(texts)
+        doc = np.repeat(np.arange(len(offsets)), np.diff(np.append(offsets, len(idx))))
+        y = np.zeros((len(texts), len(self.LABELS)))
+        y[np.arange(len(texts)), [self.LABELS.index(int(l)) for l in labels]] = 1
+
+        # 全量梯度下降
+        for _ in range(epochs):
+            err = self._scores(idx, vals, offsets) - y
+            grad = np.zeros_like(self.weights)
+            np.add.at(grad, idx, err[doc] * vals[:, None])
+            self.weights -= lr * (grad / len(texts) + l2 * self.weights)
+        return self
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        if not len(texts):
+            return np.zeros((0, len(self.LABELS)))
+        return self._scores(*self._features(texts))
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"vocab": self.vocab, "weights": self.weights.tolist()}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "LinearSentimentModel":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["vocab"], np.asarray(data["weights"]))
+
+
+class LocalClassifier:
+    """
+    threshold: 置信度不低于该值的结果才在本地定标签
+    model:     可选的 LinearSentimentModel，与规则结果取置信度更高者
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, model: Optional[LinearSentimentModel] = None):
+        self.threshold = threshold
+        self.model = model
+
+    def classify_many(self, texts: Sequence[str]) -> List[LocalResult]:
+        results = [rule_classify(t) for t in texts]
+        if self.model is not None:
+            unsure = [i for i, r in enumerate(results) if r[1] < self.threshold]
+            probs = self.model.predict_proba([texts[i] for i in unsure])
+            for i, p in zip(unsure, probs):
+                k = int(p.argmax())
+                if p[k] > results[i][1]:
+                    results[i] = (self.model.LABELS[k], round(float(p[k]), 2), f"本地模型：p={p[k]:.2f}")
+        return results
+
+    def split(self, texts: Sequence[str]) -> Tuple[dict, List[str]]:
+        """返回 ({text: (label, reason)} 本地可定的部分, 需交给 LLM 的文本列表)。"""
+        decided, unsure = {}, []
+        for t, (label, confidence, reason) in zip(texts, self.classify_many(texts)):
+            if confidence >= self.threshold:
+                decided[t] = (label, reason)
+            else:
+                unsure.append(t)
+        return decided, unsure
+
+
+def llm_labeled(path: str) -> pd.DataFrame:
+    """
+    读取标注结果，只保留 LLM 给出的真实标签：有 sentiment_tier 列时只取 llm / cache 层
+    （缓存里只存 LLM 结果；local 层的标签来自本地分类器自己），并去掉请求失败的兜底结果。
+    """
+    df = read_table(path)
+    if "sentiment_tier" in df.columns:
+        df = df[df["sentiment_tier"].isin(["llm", "cache"])]
+    if "judgment_reason" in df.columns:
+        df = df[~df["judgment_reason"].map(is_fallback)]
+    return df[["content", "sentiment_label"]].dropna()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地评论情绪预分类：训练 / 评估")
+    parser.add_argument("--train", default=None, help="带 sentiment_label 列的标注结果，用于训练线性模型")
+    parser.add_argument("--eval", default=None, help="带 sentiment_label 列的标注结果，评估本地层的覆盖率与一致率")
+    parser.add_argument("--model", default=None, help="线性模型文件（训练时写入，评估时读取）")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="本地定标签的置信度阈值")
+    args = parser.parse_args()
+
+    if args.train:
+        if not args.model:
+            parser.error("--train 需要同时指定 --model")
+        df = llm_labeled(args.train)
+        model = LinearSentimentModel().fit(df["content"].astype(str).tolist(), df["sentiment_label"].astype(int).tolist())
+        model.save(args.model)
+        print(f"[OK] 训练样本 {len(df)} 条，词表 {len(model.vocab)} 个 -> {args.model}")
+
+    if args.eval:
+        df = llm_labeled(args.eval)
+        model = LinearSentimentModel.load(args.model) if args.model else None
+        local = LocalClassifier(args.threshold, model)
+        texts = df["content"].astype(str).tolist()
+        results = local.classify_many(texts)
+        decided = [(r[0], int(y)) for r, y in zip(results, df["sentiment_label"]) if r[1] >= args.threshold]
+        agree = sum(p == y for p, y in decided)
+        print(f"评论 {len(texts)} 条，本地定标签 {len(decided)} 条（{len(decided) / max(1, len(texts)):.1%}），"
+              f"其余 {len(texts) - len(decided)} 条交给 LLM")
+        print(f"本地标签与已有标签一致率：{agree / max(1, len(decided)):.1%}")
+
+    if not args.train and not args.eval:
+        parser.error("需要指定 --train 或 --eval")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+多身份（Cookie / 代理）会话池
+功能：
+1. 从文件加载多个 Cookie（可各带一个代理），每个身份单独维护若干 requests.Session
+2. 按轮询（round_robin）或最少在途请求（least_loaded）把会话借给并发的 worker
+3. 记录每个身份的成功 / 被限流 / 出错次数和最近的 412；被限流的身份自动冷却一段时间，
+   冷却期间请求交给其余身份，全部冷却时等待最早恢复的那个
+4. SessionPool 本身提供与 requests.Session 相同的 get()，可直接传给各爬虫的 session 参数
+
+身份文件格式（cookies.txt）：每行一个 Cookie，可在 " | " 后附代理；空行和 # 开头的行忽略
+    SESSDATA=xxx; bili_jct=yyy; buvid3=zzz
+    SESSDATA=aaa; bili_jct=bbb; buvid3=ccc | http://127.0.0.1:7897
+也可以是 JSON 数组：[{"cookie": "...", "proxy": "http://..."}, ...]
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import requests
+
+try:
+    from .bili_metrics import inc  # 作为 scripts 包导入（如 notebook）
+except ImportError:
+    from bili_metrics import inc  # 在 scripts/ 下直接运行
+
+THROTTLE_STATUS = (412, 429)
+THROTTLE_MARKERS = (b'"code":-412', b'"code":-509', b'"code": -412', b'"code": -509')
+
+DEFAULT_COOLDOWN = 60.0  # 被限流后的首次冷却秒数，窗口内每多一次 412 翻倍
+DEFAULT_MAX_COOLDOWN = 900.0
+DEFAULT_WINDOW = 600.0  # 统计“最近 412 次数”的时间窗口（秒）
+
+
+def load_identities(path: str) -> List[Dict[str, Optional[str]]]:
+    """读取身份文件，返回 [{"cookie": ..., "proxy": ...}, ...]。格式见模块说明。"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return [{"cookie": d.get("cookie"), "proxy": d.get("proxy")} for d in json.loads(text)]
+
+    identities = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        cookie, _, proxy = line.partition(" | ")
+        identities.append({"cookie": cookie.strip() or None, "proxy": proxy.strip() or None})
+    return identities
+
+
+def proxy_host(proxy: str) -> str:
+    """代理地址去掉协议和 user:pass@，只留 host:port，用于日志和指标标签，避免泄露代理密码。"""
+    return proxy.split("://", 1)[-1].rsplit("@", 1)[-1]
+
+
+class Identity:
+    """一个 Cookie（+ 代理）及其健康状态。"""
+
+    def __init__(self, name: str, cookie: Optional[str], proxy: Optional[str] = None):
+        self.name = name
+        self.cookie = cookie
+        self.proxy = proxy
+        self.in_flight = 0
+        self.ok = 0
+        self.throttled = 0
+        self.errors = 0
+        self.recent_412: deque = deque()  # 最近被限流的时间（monotonic）
+        self.cooldown_until = 0.0
+        self.last_used = 0.0
+        self.idle: List[requests.Session] = []  # 空闲的 Session，借出时取走、归还时放回
+
+    @property
+    def proxies(self) -> Optional[Dict[str, str]]:
+        return {"http": self.proxy, "https": self.proxy} if self.proxy else None
+
+    def __repr__(self) -> str:
+        return f"Identity({self.name})"
+
+
+class SessionPool:
+    """
+    identities: load_identities 的返回值，或 [{"cookie": ..., "proxy": ...}, ...]
+    build:      build(cookie, proxies) -> requests.Session，如 bili_search_scraper.build_session
+    strategy:   "round_robin" 轮询 / "least_loaded" 选在途请求最少的身份
+    cooldown / max_cooldown / window: 被限流后冷却 cooldown * 2^(window 秒内的 412 次数 - 1) 秒，不超过 max_cooldown
+
+    用法：
+        pool = SessionPool(load_identities("cookies.txt"), build=build_session)
+        crawl_bilibili_search("Python", pages=30, workers=4, pool=pool)
+        # 或手动借用
+        with pool.lease() as (session, ident):
+            r = session.get(url, params=params)
+            pool.report(ident, r.status_code)
+    """
+
+    def __init__(
+        self,
+        identities: List[Dict[str, Optional[str]]],
+        build: Callable[..., requests.Session],
+        strategy: str = "round_robin",
+        cooldown: float = DEFAULT_COOLDOWN,
+        max_cooldown: float = DEFAULT_MAX_COOLDOWN,
+        window: float = DEFAULT_WINDOW,
+    ):
+        if not identities:
+            raise ValueError("身份列表为空")
+        if strategy not in ("round_robin", "least_loaded"):
+            raise ValueError(f"未知的 strategy：{strategy}")
+        self.identities = [
+            Identity(f"#{i}" + (f"@{proxy_host(d['proxy'])}" if d.get("proxy") else ""), d.get("cookie"), d.get("proxy"))
+            for i, d in enumerate(identities)
+        ]
+        self.build = build
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.window = window
+        self._next = 0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_file(cls, path: str, build: Callable[..., requests.Session], **kwargs: Any) -> "SessionPool":
+        return cls(load_identities(path), build=build, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.identities)
+
+    # ---------- 借出 / 归还 ----------
+
+    def _pick(self, now: float) -> Optional[Identity]:
+        ready = [i for i in self.identities if i.cooldown_until <= now]
+        if not ready:
+            return None
+        if self.strategy == "least_loaded":
+            return min(ready, key=lambda i: (i.in_flight, i.last_used))
+        n = len(self.identities)
+        for k in range(n):
+            ident = self.identities[(self._next + k) % n]
+            if ident.cooldown_until <= now:
+                self._next = (self._next + k + 1) % n
+                return ident
+        return None
+
+    def acquire(self) -> Identity:
+        """选一个不在冷却中的身份（全部冷却时等待），在途数加一。"""
+        warned = False
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                ident = self._pick(now)
+                if ident is not None:
+                    ident.in_flight += 1
+                    ident.last_used = now
+                    return ident
+                wait = min(i.cooldown_until for i in self.identities) - now
+                if not warned:
+                    print(f"[WARN] 所有身份都在冷却中，等待 {wait:.0f} 秒")
+                    warned = True
+                self._cond.wait(timeout=max(wait, 0.01))
+
+    def release(self, ident: Identity) -> None:
+        with self._cond:
+            ident.in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self) -> Iterator:
+        """借出 (session, identity)，用完自动归还；同一 Session 同一时间只借给一个 worker。"""
+        ident = self.acquire()
+        with self._cond:
+            session = ident.idle.pop() if ident.idle else None
+        if session is None:
+            session = self.build(ident.cookie, proxies=ident.proxies)
+        try:
+            yield session, ident
+        finally:
+            with self._cond:
+                ident.idle.append(session)
+            self.release(ident)
+
+    # ---------- 健康状态 ----------
+
+    def report(self, ident: Identity, status: Optional[int], throttled: bool = False) -> None:
+        """
+        记录一次请求结果。status 为 None 表示网络错误。
+        412 / 429（或 throttled=True）时该身份进入冷却，冷却时间随最近的 412 次数翻倍。
+        """
+        with self._cond:
+            now = time.monotonic()
+            if throttled or status in THROTTLE_STATUS:
+                ident.throttled += 1
+                ident.recent_412.append(now)
+                while ident.recent_412 and ident.recent_412[0] < now - self.window:
+                    ident.recent_412.popleft()
+                pause = min(self.max_cooldown, self.cooldown * 2 ** (len(ident.recent_412) - 1))
+                ident.cooldown_until = max(ident.cooldown_until, now + pause)
+                print(f"[WARN] 身份 {ident.name} 被限流，冷却 {pause:.0f} 秒")
+                inc("pool_throttled", identity=ident.name)
+            elif status is None:
+                ident.errors += 1
+                # 网络错误多半是代理问题，短暂冷却
+                ident.cooldown_until = max(ident.cooldown_until, now + min(self.cooldown, 10.0))
+                inc("pool_errors", identity=ident.name)
+            else:
+                ident.ok += 1
+            self._cond.notify_all()
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        """与 requests.Session.get 相同，每次借一个身份发请求并记录结果，可直接当作 session 使用。"""
+        with self.lease() as (session, ident):
+            try:
+                r = session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.report(ident, None)
+                raise
+            self.report(ident, r.status_code, throttled=any(m in r.content[:200] for m in THROTTLE_MARKERS))
+            return r
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._cond:
+            return [
+                {
+                    "identity": i.name,
+                    "in_flight": i.in_flight,
+                    "ok": i.ok,
+                    "throttled": i.throttled,
+                    "errors": i.errors,
+                    "cooling_s": round(max(0.0, i.cooldown_until - now), 1),
+                }
+                for i in self.identities
+            ]
+
+    def print_stats(self) -> None:
+        for s in self.stats():
+            print(f"[POOL] {s['identity']}  成功 {s['ok']}  限流 {s['throttled']}  出错 {s['errors']}"
+                  + (f"  冷却剩余 {s['cooling_s']} 秒" if s["cooling_s"] else ""))
@@ -0,0 +1,80 @@
+"""
+标题分词结果缓存（SQLite）
+功能：
+1. 以「标题文本 + jieba 词典版本」的哈希作为键，缓存 jieba.cut 的原始分词结果（未过滤）
+2. 只改停用词表、搜索词等过滤条件重跑时，直接复用分词结果，只重做过滤和计数
+3. 换了 jieba 版本、词典文件，或 add_word / load_userdict 改变了词典后，键随之变化
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import jieba
+
+DEFAULT_TOKEN_CACHE_PATH = "jieba_token_cache.sqlite"
+
+
+def jieba_dict_version() -> str:
+    """jieba 版本 + 词典文件内容哈希 + 词频总数（加载自定义词典后会变化）。"""
+    jieba.initialize()
+    with jieba.dt.get_dict_file() as f:
+        digest = hashlib.md5(f.read()).hexdigest()
+    return f"{jieba.__version__}:{digest}:{jieba.dt.total}"
+
+
+class TokenCache:
+    """
+    用法：
+        cache = TokenCache()
+        hit = cache.get_many(titles)          # {title: [token, ...]}
+        cache.put_many({title: jieba.lcut(title)})
+    """
+
+    def __init__(self, path: str = DEFAULT_TOKEN_CACHE_PATH, version: Optional[str] = None):
+        self.path = path
+        self.version = version or jieba_dict_version()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS tokens (key BLOB PRIMARY KEY, tokens TEXT)")
+        self._conn.commit()
+
+    def make_key(self, title: str) -> bytes:
+        return hashlib.sha1(f"{self.version}\0{title}".encode("utf-8")).digest()
+
+    def get_many(self, titles: Iterable[str]) -> Dict[str, List[str]]:
+        """返回 {title: tokens}，只包含命中的标题。"""
+        keys = {self.make_key(t): t for t in titles}
+        items = list(keys)
+        found: Dict[str, List[str]] = {}
+        with self._lock:
+            # SQLite 单条语句的参数个数有限，分批查询
+            for start in range(0, len(items), 500):
+                chunk = items[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                for key, tokens in self._conn.execute(
+                    f"SELECT key, tokens FROM tokens WHERE key IN ({marks})", chunk
+                ):
+                    found[keys[key]] = json.loads(tokens)
+        return found
+
+    def put_many(self, tokens: Dict[str, List[str]]) -> None:
+        rows = [(self.make_key(t), json.dumps(words, ensure_ascii=False)) for t, words in tokens.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO tokens (key, tokens) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM tokens")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 与在 scripts/ 下直接运行一致：脚本之间按同级模块导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
@@ -0,0 +1,46 @@
+import sys
+
+import pandas as pd
+
+import api_comments
+
+
+def run_incremental(monkeypatch, bvid):
+    monkeypatch.setattr(sys, "argv", ["api_comments.py", "--bvid", bvid, "--incremental", "--no_cache"])
+    api_comments.main()
+
+
+def test_incremental_retries_failed_batch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    pd.DataFrame({
+        "rpid": [1, 2, 3], "mid": 1, "uname": "u", "content": ["好看", "一般", "太差了"], "like": 0, "ctime": 0,
+    }).to_csv("BVTEST_comments.csv", index=False, encoding="utf_8_sig")
+
+    # 第一次：第二条请求失败，走兜底
+    calls = []
+    def flaky(text, *args, **kwargs):
+        calls.append(text)
+        return (0, "API请求失败: 429") if text == "一般" else (1, "ok")
+    monkeypatch.setattr(api_comments, "analyze_sentiment", flaky)
+    run_incremental(monkeypatch, "BVTEST")
+    out = pd.read_csv("BVTEST_comments_with_sentiment.csv", encoding="utf_8_sig")
+    assert sorted(out["rpid"]) == [1, 3]
+
+    # 第二次：只重试失败的那条
+    calls.clear()
+    def ok(text, *args, **kwargs):
+        calls.append(text)
+        return 0, "ok"
+    monkeypatch.setattr(api_comments, "analyze_sentiment", ok)
+    run_incremental(monkeypatch, "BVTEST")
+    out = pd.read_csv("BVTEST_comments_with_sentiment.csv", encoding="utf_8_sig")
+    assert calls == ["一般"]
+    assert sorted(out["rpid"]) == [1, 2, 3]
+    assert not out["judgment_reason"].map(api_comments.is_fallback).any()
+
+
+def test_new_comments_ignores_fallback_rows():
+    df = pd.DataFrame({"rpid": [1, 2, 3], "content": ["a", "b", "c"]})
+    existing = pd.DataFrame({"rpid": [1, 2], "judgment_reason": ["ok", "异常兜底: Timeout"]})
+    assert list(api_comments.new_comments(df, existing)["rpid"]) == [2, 3]
@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+
+import bili_search_scraper as bs
+
+
+def assert_same_as_extract_rows(pages):
+    expected = pd.DataFrame([row for page, data in pages for row in bs.extract_rows("k", page, data)])
+    got = bs.normalize_search_results("k", pages)
+    for col in ["title", "author", "pub_time", "duration", "view", "link"]:
+        a = [None if pd.isna(v) else v for v in expected[col]]
+        b = [None if pd.isna(v) else v for v in got[col]]
+        assert a == b, col
+
+
+def video(**fields):
+    return dict({"title": "<em>Py</em>thon", "bvid": "BV1", "author": "up", "play": "1.2万", "duration": "61"}, **fields)
+
+
+def test_matches_extract_rows():
+    assert_same_as_extract_rows([
+        (1, [video(pubdate=1700000000), video(pubdate=None, play=30, duration="12:34"), video(author="", uname="u2")]),
+        (2, [video(bvid="", pubdate=1600000000, play=None)]),
+    ])
+
+
+@pytest.mark.parametrize("pubdates", [
+    # pubdate 混有字符串，回退到 pub_date 的整数时间戳（列里有缺失值，会被 pandas 升为 float）
+    [{"pubdate": "2023-11-14"}, {"pubdate": None, "pub_date": 1700000000}, {"pubdate": 0, "pub_date": 1600000000}],
+    [{"pubdate": "1700000000"}, {"pubdate": 1700000000}, {"pub_date": 1600000000}, {"created": "昨天"}],
+])
+def test_mixed_type_pubdate(pubdates):
+    assert_same_as_extract_rows([(1, [video(**p) for p in pubdates])])